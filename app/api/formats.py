@@ -0,0 +1,207 @@
+"""
+Response formats for the query endpoints. JSON stays the default; clients
+asking for Arrow IPC, Parquet or NDJSON (via Accept or ?format=) get the
+DuckDB result streamed as record batches instead of a materialised list.
+Request bodies for /ingest are read from JSON, NDJSON or Arrow IPC.
+"""
+
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+PARQUET = "application/vnd.apache.parquet"
+NDJSON = "application/x-ndjson"
+
+MEDIA_TYPES = {
+    "json": JSON,
+    "arrow": ARROW,
+    "arrow_file": ARROW_FILE,
+    "parquet": PARQUET,
+    "ndjson": NDJSON,
+}
+STREAMED = {ARROW, ARROW_FILE, PARQUET, NDJSON}
+
+# Other names clients commonly send for the same formats
+ALIASES = {
+    "application/x-parquet": PARQUET,
+    "application/jsonl": NDJSON,
+    "application/jsonlines": NDJSON,
+    "*/*": JSON,
+    "application/*": JSON,
+}
+
+
+def negotiate(request: Request) -> str:
+    """
+    Pick the response media type: ?format= wins, then the Accept entry with
+    the highest q-value we can produce, then JSON.
+    """
+    name = request.query_params.get("format")
+    if name:
+        if name.lower() not in MEDIA_TYPES:
+            raise HTTPException(
+                status_code=406, detail=f"Unsupported format '{name}'"
+            )
+        return MEDIA_TYPES[name.lower()]
+
+    candidates = []
+    for position, part in enumerate(request.headers.get("accept", "").split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        media_type = ALIASES.get(media_type.lower(), media_type.lower())
+        if quality > 0 and (media_type == JSON or media_type in STREAMED):
+            candidates.append((-quality, position, media_type))
+    return min(candidates)[2] if candidates else JSON
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting what the Arrow/Parquet writers emit,
+    drained after every batch so the response never holds the whole file.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_chunks(stream):
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), stream.schema) as writer:
+        yield sink.drain()
+        for batch in stream:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _arrow_file_chunks(stream):
+    # Random-access layout: the footer with the batch offsets comes last
+    sink = _ChunkSink()
+    with pa.ipc.new_file(pa.PythonFile(sink, mode="w"), stream.schema) as writer:
+        yield sink.drain()
+        for batch in stream:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _parquet_chunks(stream):
+    sink = _ChunkSink()
+    # One row group per record batch, the footer is written on close
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), stream.schema) as writer:
+        for batch in stream:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _ndjson_chunks(stream):
+    for batch in stream:
+        lines = [json.dumps(row, default=_json_value) for row in batch.to_pylist()]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+
+CHUNK_WRITERS = {
+    ARROW: _arrow_chunks,
+    ARROW_FILE: _arrow_file_chunks,
+    PARQUET: _parquet_chunks,
+    NDJSON: _ndjson_chunks,
+}
+
+
+class _TableStream:
+    """
+    Batches of an in-memory Arrow table, shaped like a QueryStream.
+    """
+
+    def __init__(self, table: pa.Table):
+        self.schema = table.schema
+        self._table = table
+
+    def __iter__(self):
+        return iter(self._table.to_batches())
+
+
+def stream_response(stream, media_type: str, headers=None) -> StreamingResponse:
+    """
+    Stream a QueryStream of record batches (or a DataFrame computed in
+    Python) in `media_type`.
+    """
+    if isinstance(stream, pd.DataFrame):
+        stream = _TableStream(pa.Table.from_pandas(stream, preserve_index=False))
+    return StreamingResponse(
+        CHUNK_WRITERS[media_type](stream),
+        media_type=media_type,
+        headers={"Vary": "Accept", **(headers or {})},
+    )
+
+
+def read_frame(body: bytes, content_type: str) -> pd.DataFrame:
+    """
+    Decode a request body by its Content-Type: a JSON array of objects (or
+    a single object), NDJSON with one object per line, or an Arrow IPC
+    stream/file. Raises ValueError for a malformed body.
+    """
+    raw_type = (content_type or JSON).split(";")[0].strip().lower() or JSON
+    media_type = ALIASES.get(raw_type, raw_type)
+    if media_type not in (JSON, NDJSON, ARROW, ARROW_FILE):
+        raise HTTPException(
+            status_code=415, detail=f"Unsupported Content-Type '{raw_type}'"
+        )
+
+    try:
+        if media_type == ARROW_FILE:
+            return pa.ipc.open_file(pa.BufferReader(body)).read_all().to_pandas()
+        if media_type == ARROW:
+            return pa.ipc.open_stream(body).read_all().to_pandas()
+        if media_type == NDJSON:
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            records = json.loads(body)
+            if isinstance(records, dict):
+                records = [records]
+    except (ValueError, pa.ArrowInvalid) as e:
+        raise ValueError(f"Malformed {media_type} body: {e}")
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError("Expected a list of reading objects")
+    return pd.DataFrame.from_records(records)
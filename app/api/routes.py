@@ -1,11 +1,25 @@
-from datetime import date, timedelta
+import asyncio
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
-from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from app.db.duck_db_utils import WeatherDB
-from app.models import MetricStatRequest, SensorQuery, WeatherMetric
+from app.api.formats import JSON, negotiate, read_frame, stream_response
+from app.core import metrics
+# Duck DB connector, shared with the app (one database instance per process)
+from app.core.config import READ_ONLY, db, ingest_queue, refresher, result_cache
+from app.core.ingest_queue import PayloadTooLarge, QueueFull, coerce_readings
+from app.db.duck_db_utils import VALID_METRICS
+from app.db.rolling import INCREMENTAL_WINDOWS, parse_window
+from app.models import (
+    MetricStatRequest,
+    RollingRequest,
+    SensorQuery,
+    TimeseriesRequest,
+    WeatherMetric,
+)
 
 from utils.logger_service import get_logger
 logger = get_logger(__name__)
@@ -13,46 +27,367 @@ logger = get_logger(__name__)
 # API Router class 
 router = APIRouter()
 
-# Duck DB connector class
-db = WeatherDB()
+
+def records(df) -> list:
+    """
+    DataFrame rows as JSON-ready dicts, NULLs (e.g. a station without an
+    elevation) as None rather than NaN.
+    """
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def require_writer():
+    """
+    Writes go to the writer process; a read-only worker answers 503.
+    """
+    if READ_ONLY:
+        raise HTTPException(
+            status_code=503,
+            detail="Read-only API worker, send writes to the writer process",
+        )
+
+
+def cached_response(
+    request: Request,
+    response: Response,
+    key,
+    compute,
+    start=None,
+    end=None,
+    stations=None,
+):
+    """
+    Serve `compute()` through the result cache with an ETag, answering a
+    matching If-None-Match with 304 and the headers already set (e.g. the
+    freshness headers of /sensors).
+    """
+    watermark = result_cache.watermark
+    entry = result_cache.get(key)
+    if entry is None:
+        entry = result_cache.put(key, compute(), watermark, start, end, stations)
+
+    response.headers["ETag"] = entry.etag
+    if request.headers.get("if-none-match") == entry.etag:
+        return Response(status_code=304, headers=dict(response.headers))
+    return entry.value
+
 
 @router.post("/sensors")
-def get_sensors(payload: SensorQuery):
+def get_sensors(payload: SensorQuery, request: Request, response: Response):
     logger.info(f"Fetching sensors for: {payload.station_ids}")
-    return db.get_sensor_details(station_ids=payload.station_ids).to_dict(
-        orient="records"
+    media_type = negotiate(request)
+    # Pure read, live data is refreshed in the background
+    freshness = refresher.freshness_headers()
+    area = dict(near=payload.near, bbox=payload.bbox)
+    if media_type != JSON:
+        return stream_response(
+            db.get_sensor_details(
+                station_ids=payload.station_ids, stream=True, **area
+            ),
+            media_type,
+            headers=freshness,
+        )
+    response.headers.update(freshness)
+    key = result_cache.make_key(
+        "sensors", sorted(payload.station_ids or []), payload.near, payload.bbox
+    )
+    return cached_response(
+        request,
+        response,
+        key,
+        lambda: records(
+            db.get_sensor_details(station_ids=payload.station_ids, **area)
+        ),
+        stations=payload.station_ids,
     )
 
 
+@router.post("/sensors/refresh")
+def refresh_sensors():
+    require_writer()
+    logger.info("Forcing a resync from the live API")
+    return refresher.refresh()
+
+
+@router.post("/ingest", status_code=202)
+async def ingest_readings(
+    request: Request,
+    response: Response,
+    wait: bool = False,
+    timeout: float = Query(30, gt=0),
+):
+    """
+    Bulk-load readings as a JSON array, NDJSON or Arrow IPC body. They are
+    queued for the batch writer (202); with ?wait=true the response waits
+    for the write (200). A full queue answers 503 with Retry-After, a body
+    larger than the whole queue 413.
+    """
+    require_writer()
+    body = await request.body()
+    content_type = request.headers.get("content-type")
+    try:
+        df = await run_in_threadpool(
+            lambda: coerce_readings(read_frame(body, content_type))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        future = ingest_queue.submit(df)
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFull as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "1"}
+        )
+    if not wait:
+        queued = ingest_queue.stats()["queued_rows"]
+        return {"accepted": len(df), "queued_rows": queued}
+
+    try:
+        # Shielded, so a timed-out request leaves its rows queued
+        written = await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), timeout
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504, detail="Readings queued but not written yet"
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {e}")
+    response.status_code = 200
+    return {"written": written}
+
+
+@router.get("/ingest/stats")
+def get_ingest_stats():
+    return ingest_queue.stats()
+
+
+@router.get("/metrics")
+def get_prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/debug/slow-queries")
+def get_slow_queries(top: int = Query(10, ge=1), profiles: bool = False):
+    """
+    Slowest query shapes captured by the slow-query log.
+    """
+    shapes = db.slow_queries.top(top)
+    if not profiles:
+        shapes = [{k: v for k, v in s.items() if k != "profile"} for s in shapes]
+    return {"threshold_ms": db.slow_queries.threshold_ms, "queries": shapes}
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    return result_cache.stats()
+
+
 @router.post("/metrics/stat")
-def get_metric_stat(payload: MetricStatRequest):
+def get_metric_stat(payload: MetricStatRequest, request: Request, response: Response):
     logger.info(f"Fetching {payload.stat} stats for: {payload.metrics}")
-    
+    media_type = negotiate(request)
+
     for metric in payload.metrics:
-        if metric not in {"Temperature", "Humidity", "WindSpeed"}:
+        if metric not in VALID_METRICS:
             logger.warning(f"Invalid metric requested: {metric}")
             raise HTTPException(
             status_code=400, detail=f"Invalid metric '{metric}'"
             )
+    start_date, end_date = db.normalize_date_range(
+        payload.start_date, payload.end_date
+    )
+    city = payload.city.lower() if payload.city else None
+    key = result_cache.make_key(
+        "metrics/stat",
+        payload.metrics,
+        payload.stat,
+        payload.mode,
+        start_date,
+        end_date,
+        city,
+        sorted(payload.station_ids or []),
+        payload.near,
+        payload.bbox,
+    )
+    area = dict(near=payload.near, bbox=payload.bbox)
+    try:
+        if media_type != JSON:
+            # Columnar/streamed formats go straight from DuckDB, uncached
+            return stream_response(
+                db.get_metric_stats(
+                    metric=payload.metrics,
+                    stat=payload.stat,
+                    start_date=start_date,
+                    end_date=end_date,
+                    station_ids=payload.station_ids,
+                    city=payload.city,
+                    stream=True,
+                    mode=payload.mode,
+                    **area,
+                ),
+                media_type,
+            )
+
+        # Every metric/stat pair comes back from a single grouped scan
+        return cached_response(
+            request,
+            response,
+            key,
+            lambda: records(
+                db.get_metric_stats(
+                    metric=payload.metrics,
+                    stat=payload.stat,
+                    start_date=start_date,
+                    end_date=end_date,
+                    station_ids=payload.station_ids,
+                    city=payload.city,
+                    mode=payload.mode,
+                    **area,
+                )
+            ),
+            start=start_date,
+            end=end_date,
+            stations=payload.station_ids,
+        )
+
+    except Exception as e:
+        logger.exception("Unexpected error during /metrics/stat processing")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/metrics/timeseries")
+def get_metric_timeseries(
+    payload: TimeseriesRequest, request: Request, response: Response
+):
+    logger.info(
+        f"Fetching {payload.interval} {payload.stat} series for: {payload.metrics}"
+    )
+    media_type = negotiate(request)
+
+    for metric in payload.metrics:
+        if metric not in VALID_METRICS:
+            logger.warning(f"Invalid metric requested: {metric}")
+            raise HTTPException(status_code=400, detail=f"Invalid metric '{metric}'")
+    start_date, end_date = db.normalize_date_range(
+        payload.start_date, payload.end_date
+    )
+
+    def compute():
+        return db.get_metric_timeseries(
+            metric=payload.metrics,
+            stat=payload.stat,
+            interval=payload.interval,
+            start_date=start_date,
+            end_date=end_date,
+            station_ids=payload.station_ids,
+            city=payload.city,
+            max_points=payload.max_points,
+            mode=payload.mode,
+            near=payload.near,
+            bbox=payload.bbox,
+        )
+
     try:
+        if media_type != JSON:
+            return stream_response(compute(), media_type)
 
-        results = []
-        for metric in payload.metrics:
-            df = db.get_metric_stats(
-                metric=metric,
-                stat=payload.stat,
-                start_date=payload.start_date,
-                end_date=payload.end_date,
-                city=payload.city,
-            )
-            results.append(df)
+        key = result_cache.make_key(
+            "metrics/timeseries",
+            payload.metrics,
+            payload.stat,
+            payload.mode,
+            payload.interval,
+            start_date,
+            end_date,
+            payload.city.lower() if payload.city else None,
+            sorted(payload.station_ids or []),
+            payload.near,
+            payload.bbox,
+            payload.max_points,
+        )
+        return cached_response(
+            request,
+            response,
+            key,
+            lambda: records(compute()),
+            start=start_date,
+            end=end_date,
+            stations=payload.station_ids,
+        )
+
+    except Exception as e:
+        logger.exception("Unexpected error during /metrics/timeseries processing")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+@router.post("/metrics/rolling")
+def get_metric_rolling(payload: RollingRequest, request: Request, response: Response):
+    logger.info(f"Fetching {payload.window} rolling stats for: {payload.metrics}")
+    media_type = negotiate(request)
 
-        from pandas import concat
+    for metric in payload.metrics:
+        if metric not in VALID_METRICS:
+            logger.warning(f"Invalid metric requested: {metric}")
+            raise HTTPException(status_code=400, detail=f"Invalid metric '{metric}'")
+    if payload.incremental and payload.window not in INCREMENTAL_WINDOWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Incremental mode supports the windows {INCREMENTAL_WINDOWS}",
+        )
+    start_date, end_date = db.normalize_date_range(
+        payload.start_date, payload.end_date
+    )
 
-        combined = concat(results, axis=1)
-        combined = combined.loc[:, ~combined.columns.duplicated()]
-        return combined.to_dict(orient="records")
+    def compute(stream=False):
+        return db.get_metric_rolling(
+            metric=payload.metrics,
+            window=payload.window,
+            start_date=start_date,
+            end_date=end_date,
+            station_ids=payload.station_ids,
+            city=payload.city,
+            z_threshold=payload.z_threshold,
+            anomalies_only=payload.anomalies_only,
+            incremental=payload.incremental,
+            stream=stream,
+            near=payload.near,
+            bbox=payload.bbox,
+        )
+
+    try:
+        if media_type != JSON:
+            return stream_response(compute(stream=True), media_type)
+
+        key = result_cache.make_key(
+            "metrics/rolling",
+            payload.metrics,
+            payload.window,
+            start_date,
+            end_date,
+            payload.city.lower() if payload.city else None,
+            sorted(payload.station_ids or []),
+            payload.near,
+            payload.bbox,
+            payload.z_threshold,
+            payload.anomalies_only,
+            payload.incremental,
+        )
+        # A write up to a window before the range still moves its statistics
+        lookback = timedelta(seconds=parse_window(payload.window))
+        return cached_response(
+            request,
+            response,
+            key,
+            lambda: records(compute()),
+            start=datetime.combine(start_date, datetime.min.time()) - lookback,
+            end=end_date,
+            stations=payload.station_ids,
+        )
 
     except Exception as e:
-        logger.exception("Unexpected error during /metrics/stat processing")
+        logger.exception("Unexpected error during /metrics/rolling processing")
         raise HTTPException(status_code=500, detail="Internal Server Error")
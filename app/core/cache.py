@@ -0,0 +1,128 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import pandas as pd
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    etag: str
+    expires_at: float
+    start: Optional[pd.Timestamp] = None
+    end: Optional[pd.Timestamp] = None
+    stations: Optional[frozenset] = None
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of query results with a TTL. Entries remember the time
+    range and stations they cover, so a write only evicts what it touches.
+
+    Every invalidation advances a watermark; a result computed before the
+    watermark moved is not cached, so a query racing a write can never
+    store stale data.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.watermark = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return json.dumps(parts, default=str, sort_keys=True)
+
+    @staticmethod
+    def make_etag(value) -> str:
+        body = json.dumps(value, default=str, sort_keys=True).encode()
+        return f'"{hashlib.sha1(body).hexdigest()}"'
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self, key, value, watermark, start=None, end=None, stations=None
+    ) -> CacheEntry:
+        """
+        Store a result computed when the watermark was `watermark`. The entry
+        is returned but not kept if a write happened in the meantime.
+        """
+        entry = CacheEntry(
+            value=value,
+            etag=self.make_etag(value),
+            expires_at=time.monotonic() + self.ttl_seconds,
+            start=pd.Timestamp(start) if start is not None else None,
+            end=pd.Timestamp(end) if end is not None else None,
+            stations=frozenset(stations) if stations else None,
+        )
+        with self._lock:
+            if watermark == self.watermark:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, stations=None, start=None, end=None):
+        """
+        Drop entries overlapping a write to `stations` between `start` and
+        `end` (None means unbounded / every station).
+        """
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        stations = set(stations) if stations else None
+        with self._lock:
+            self.watermark += 1
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if self._overlaps(entry, stations, start, end)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    @staticmethod
+    def _overlaps(entry, stations, start, end) -> bool:
+        if stations and entry.stations and not stations & entry.stations:
+            return False
+        if start is not None and entry.end is not None and entry.end < start:
+            return False
+        if end is not None and entry.start is not None and end < entry.start:
+            return False
+        return True
+
+    def clear(self):
+        with self._lock:
+            self.watermark += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "watermark": self.watermark,
+            }
@@ -1,7 +1,122 @@
+import os
+
+from app.core import metrics
+from app.core.cache import ResultCache
+from app.core.ingest_queue import IngestQueue
+from app.core.refresh import LiveRefreshService
+from app.core.snapshots import SnapshotFollower, SnapshotPublisher
 from app.db.duck_db_utils import WeatherDB
+from app.db.slow_queries import SlowQueryLog
+from app.db.snapshots import wait_for_snapshot
+from ingestion.scheduler import INGEST_CITIES_FILE, IngestScheduler, load_cities
+
+# Cities kept fresh from the live OpenWeather API
+LIVE_CITIES = [
+    {"city": "Dublin", "country": "Ireland"},
+    {"city": "Galway", "country": "Ireland"},
+]
+REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", "600"))
+LIVE_REFRESH_ENABLED = os.getenv("LIVE_REFRESH_ENABLED", "true").lower() == "true"
+# "refresh": every city each REFRESH_INTERVAL_SECONDS. "scheduler": the
+# per-endpoint cadences and plan budget of ingestion/scheduler.py, over
+# INGEST_CITIES_FILE when set.
+LIVE_INGEST = os.getenv("LIVE_INGEST", "refresh").lower()
+if LIVE_INGEST not in ("refresh", "scheduler"):
+    raise ValueError(f"❌ Unknown LIVE_INGEST '{LIVE_INGEST}'")
+# Ingest data/*.csv after the server starts accepting reads
+STARTUP_INGEST_BACKGROUND = (
+    os.getenv("STARTUP_INGEST_BACKGROUND", "false").lower() == "true"
+)
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+
+# DuckDB database file of the API (the writer's, in writer/reader serving)
+DB_PATH = os.getenv("DB_PATH", "weather_data.db")
+
+# Hive-partitioned Parquet archive for old months (scripts/archive_weather.py)
+ARCHIVE_DIR = os.getenv("WEATHER_ARCHIVE_DIR", "archive")
+
+# Read queries slower than this keep their EXPLAIN ANALYZE profile
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "50"))
+
+# POST /ingest queue: rows held before 503s, rows per upsert, max wait
+INGEST_QUEUE_MAX_ROWS = int(os.getenv("INGEST_QUEUE_MAX_ROWS", "500000"))
+INGEST_BATCH_ROWS = int(os.getenv("INGEST_BATCH_ROWS", "50000"))
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "1.0"))
+
+# "single": one process reads and writes weather_data.db. "writer": the one
+# process that ingests and publishes snapshots. "reader": any number of
+# read-only API workers serving the latest snapshot.
+SERVING_ROLE = os.getenv("SERVING_ROLE", "single").lower()
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "30"))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+# How long a reader starting before the writer waits for a first snapshot
+SNAPSHOT_WAIT_SECONDS = float(os.getenv("SNAPSHOT_WAIT_SECONDS", "120"))
+if SERVING_ROLE not in ("single", "writer", "reader"):
+    raise ValueError(f"❌ Unknown SERVING_ROLE '{SERVING_ROLE}'")
+READ_ONLY = SERVING_ROLE == "reader"
+
+if READ_ONLY:
+    snapshot = wait_for_snapshot(SNAPSHOT_DIR, SNAPSHOT_WAIT_SECONDS)
+    db = WeatherDB(
+        snapshot["path"],
+        archive_dir=ARCHIVE_DIR,
+        slow_queries=SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE),
+        read_only=True,
+    )
+else:
+    db = WeatherDB(
+        DB_PATH,
+        archive_dir=ARCHIVE_DIR,
+        slow_queries=SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE),
+    )
+
+# Stats and sensor results, evicted by writes touching their stations/range
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+db.write_listeners.append(result_cache.invalidate)
+
+# Bulk ingest requests share one writer, batched into upserts
+ingest_queue = IngestQueue(
+    db, INGEST_QUEUE_MAX_ROWS, INGEST_BATCH_ROWS, INGEST_FLUSH_SECONDS
+)
+
+metrics.DB_CURSORS.set_function(lambda: db.connections.open_cursors)
+metrics.CACHE_ENTRIES.set_function(lambda: result_cache.stats()["entries"])
+metrics.CACHE_HITS.set_function(lambda: result_cache.stats()["hits"])
+metrics.CACHE_MISSES.set_function(lambda: result_cache.stats()["misses"])
+metrics.INGEST_QUEUE_ROWS.set_function(lambda: ingest_queue.stats()["queued_rows"])
+
+refresher = LiveRefreshService(db, LIVE_CITIES, REFRESH_INTERVAL_SECONDS)
+
+# Runs in place of the refresher's loop, which still serves manual refreshes
+scheduler = None
+if LIVE_INGEST == "scheduler" and not READ_ONLY:
+    scheduler = IngestScheduler(
+        db,
+        load_cities(INGEST_CITIES_FILE) if INGEST_CITIES_FILE else LIVE_CITIES,
+        refresher=refresher,
+    )
 
-db = WeatherDB()
+snapshots = None
+if SERVING_ROLE == "writer":
+    snapshots = SnapshotPublisher(
+        db, SNAPSHOT_DIR, SNAPSHOT_INTERVAL_SECONDS, refresher=refresher
+    )
+elif READ_ONLY:
+    snapshots = SnapshotFollower(
+        db, SNAPSHOT_DIR, SNAPSHOT_POLL_SECONDS, refresher=refresher
+    )
+    snapshots.apply_metadata(snapshot)
 
 
 def shutdown_db():
+    if snapshots is not None:
+        snapshots.stop()
+    if scheduler is not None:
+        scheduler.stop()
+    refresher.stop()
+    ingest_queue.stop()
     db.close()
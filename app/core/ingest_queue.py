@@ -0,0 +1,219 @@
+"""
+In-process queue between POST /ingest and the database.
+
+Requests only validate and enqueue their readings; a single writer thread
+drains the queue as one upsert per batch, flushed once enough rows are
+waiting or the oldest has waited long enough. The queue is bounded in
+rows, so a writer that falls behind turns into 503s instead of memory.
+A failed batch is retried request by request, so one bad payload only
+fails its own caller.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import pandas as pd
+
+from app.core.metrics import INGEST_REJECTED
+from app.db.duck_db_utils import WEATHER_COLUMNS
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+NUMERIC_COLUMNS = ["Temperature", "Humidity", "WindSpeed"]
+
+
+class QueueFull(Exception):
+    """
+    The readings would take the queue past its row limit.
+    """
+
+
+class PayloadTooLarge(Exception):
+    """
+    The readings alone exceed the queue's row limit, so retrying can never
+    succeed.
+    """
+
+
+def coerce_readings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check and normalise a decoded request body to the weather columns.
+    Datetimes may be ISO strings or epoch seconds. Raises ValueError.
+    """
+    missing = [col for col in WEATHER_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    df = df[WEATHER_COLUMNS].copy()
+    if df[["station_id", "city", "country"]].isna().any().any():
+        raise ValueError("station_id, city and country are required on every row")
+
+    try:
+        if pd.api.types.is_numeric_dtype(df["Datetime"]):
+            df["Datetime"] = pd.to_datetime(df["Datetime"], unit="s", utc=True)
+        else:
+            df["Datetime"] = pd.to_datetime(df["Datetime"], utc=True)
+        for col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid reading values: {e}")
+    if df["Datetime"].isna().any():
+        raise ValueError("Datetime is required on every row")
+    return df
+
+
+class IngestQueue:
+    """
+    Bounded queue of reading batches with one writer thread. Each submit
+    gets a Future resolved with its row count once its batch is written,
+    or with the write's exception.
+    """
+
+    def __init__(
+        self,
+        db,
+        max_rows: int = 500_000,
+        batch_rows: int = 50_000,
+        flush_seconds: float = 1.0,
+        source: str = "api",
+    ):
+        self.db = db
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self.source = source
+        self._pending = deque()
+        self._rows = 0
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.batches = 0
+        self.written = 0
+        self.rejected = 0
+
+    def submit(self, df: pd.DataFrame) -> Future:
+        """
+        Queue readings for the writer. Raises QueueFull rather than
+        waiting when they do not fit, PayloadTooLarge when they never will.
+        """
+        future = Future()
+        if df.empty:
+            future.set_result(0)
+            return future
+        if len(df) > self.max_rows:
+            self.rejected += len(df)
+            INGEST_REJECTED.inc(len(df))
+            raise PayloadTooLarge(
+                f"{len(df)} readings exceed the queue limit of {self.max_rows} rows"
+            )
+        with self._cond:
+            if self._rows + len(df) > self.max_rows:
+                self.rejected += len(df)
+                INGEST_REJECTED.inc(len(df))
+                raise QueueFull(
+                    f"Ingest queue full ({self._rows} of {self.max_rows} rows)"
+                )
+            self._pending.append((df, future, time.monotonic()))
+            self._rows += len(df)
+            self._start()
+            self._cond.notify()
+        return future
+
+    def _start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(
+            target=self._run, name="ingest-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _take(self) -> list:
+        """
+        Wait for a batch to be due (enough rows, the oldest old enough, or
+        a stop) and pop it. Frames stay counted in the queue until written.
+        """
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._stop:
+                        return []
+                    self._cond.wait()
+                    continue
+                waiting = sum(len(df) for df, _, _ in self._pending)
+                age = time.monotonic() - self._pending[0][2]
+                due = waiting >= self.batch_rows or age >= self.flush_seconds
+                if due or self._stop:
+                    break
+                self._cond.wait(self.flush_seconds - age)
+
+            batch, rows = [], 0
+            while self._pending and (not batch or rows < self.batch_rows):
+                entry = self._pending.popleft()
+                batch.append(entry)
+                rows += len(entry[0])
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            rows = sum(len(df) for df, _, _ in batch)
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.info(f"Ingest batch of {rows} rows failed: {e}")
+                if len(batch) == 1:
+                    self._settle(batch, error=e)
+                else:
+                    # Coalesced requests fail alone, not with their batch
+                    for entry in batch:
+                        try:
+                            self._write([entry])
+                        except Exception as single:
+                            self._settle([entry], error=single)
+            with self._cond:
+                self._rows -= rows
+
+    def _write(self, batch):
+        self.db.upsert_metrics(
+            pd.concat([df for df, _, _ in batch], ignore_index=True),
+            source=self.source,
+        )
+        self.batches += 1
+        self.written += sum(len(df) for df, _, _ in batch)
+        self._settle(batch)
+
+    @staticmethod
+    def _settle(batch, error=None):
+        for df, future, _ in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(len(df))
+            else:
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued_rows": self._rows,
+                "max_rows": self.max_rows,
+                "batches": self.batches,
+                "written_rows": self.written,
+                "rejected_rows": self.rejected,
+            }
+
+    def stop(self, timeout: float = 30):
+        """
+        Write what is still queued, then stop the writer.
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
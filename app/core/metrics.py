@@ -0,0 +1,248 @@
+"""
+Process-wide metrics rendered in the Prometheus text exposition format.
+
+A small in-house registry rather than prometheus_client, which is not part
+of the locked dependencies. Counters, gauges and histograms take their
+label values as keyword arguments.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond lookups to long scans
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def set_function(self, function):
+        """
+        Read the (unlabelled) value from `function` at render time.
+        """
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            return [("", (), self._function())]
+        with self._lock:
+            return [("", key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, key, value, *extra in self._samples():
+            labels = _format_labels(self.labelnames, key, extra[0] if extra else ())
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+            return sum(counts)
+
+    def _samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in
+                      self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                samples.append(("_bucket", key, cumulative, le))
+            samples.append(("_sum", key, total))
+            samples.append(("_count", key, cumulative))
+        return samples
+
+
+REQUEST_LATENCY = Histogram(
+    "weather_api_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ["method", "route", "status"],
+)
+QUERY_LATENCY = Histogram(
+    "weather_db_query_duration_seconds",
+    "DuckDB query time by kind of query.",
+    ["kind"],
+)
+INGEST_ROWS = Counter(
+    "weather_ingest_rows_total",
+    "Rows offered to the weather table, written or skipped as unchanged.",
+    ["source", "city", "outcome"],
+)
+INGEST_PAYLOADS = Counter(
+    "weather_ingest_payloads_total",
+    "Scheduled OpenWeather fetches by endpoint: changed, unchanged or failed.",
+    ["endpoint", "outcome"],
+)
+OPENWEATHER_LATENCY = Histogram(
+    "weather_openweather_request_duration_seconds",
+    "OpenWeather API call latency per attempt.",
+    ["endpoint"],
+)
+OPENWEATHER_ERRORS = Counter(
+    "weather_openweather_errors_total",
+    "Failed OpenWeather API attempts by endpoint and reason.",
+    ["endpoint", "reason"],
+)
+INGEST_QUEUE_ROWS = Gauge(
+    "weather_ingest_queue_rows",
+    "Rows accepted by POST /ingest and not yet written.",
+)
+INGEST_REJECTED = Counter(
+    "weather_ingest_rejected_rows_total",
+    "Rows refused by POST /ingest because the ingest queue was full.",
+)
+DB_CURSORS = Gauge(
+    "weather_db_cursors",
+    "Thread-local DuckDB cursors currently open.",
+)
+CACHE_ENTRIES = Gauge(
+    "weather_result_cache_entries",
+    "Entries held in the query result cache.",
+)
+CACHE_HITS = Counter(
+    "weather_result_cache_hits_total",
+    "Result cache hits.",
+)
+CACHE_MISSES = Counter(
+    "weather_result_cache_misses_total",
+    "Result cache misses.",
+)
+
+
+def timed_query(kind: str):
+    """
+    Record a WeatherDB method's run time in QUERY_LATENCY under `kind`.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with QUERY_LATENCY.time(kind=kind):
+                return method(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,117 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from ingestion.fetcher import (
+    OPENWEATHER_BASE_URL,
+    OpenWeatherFetcher,
+    shared_rate_limiter,
+)
+from ingestion.ingest_openweather import ingest_cities
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+API_KEY = os.getenv("OPENWEATHER_API_KEY")
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", OPENWEATHER_BASE_URL)
+
+
+class LiveRefreshService:
+    """
+    Keeps live OpenWeather data (forecast + current) fresh in the background,
+    so read endpoints never wait on outbound HTTP calls.
+    """
+
+    def __init__(self, db, cities, interval_seconds: int = 600, fetcher=None):
+        self.db = db
+        self.cities = cities
+        self.interval_seconds = interval_seconds
+        # Charges the same plan budget as the ingest scheduler
+        self.fetcher = fetcher or OpenWeatherFetcher(
+            api_key=API_KEY, base_url=BASE_URL, rate_limiter=shared_rate_limiter()
+        )
+        self.last_refreshed = None
+        self.last_errors = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """
+        Ingest live data for every configured city. Failures are recorded per
+        city and never raised, the last successful refresh time is kept.
+        """
+        with self._lock:
+            # All cities are fetched concurrently over one connection pool
+            try:
+                errors = ingest_cities(self.cities, self.db, self.fetcher)
+            except Exception as e:
+                logger.info(f"Live refresh failed: {e}")
+                errors = {location["city"]: str(e) for location in self.cities}
+
+            if len(errors) < len(self.cities):
+                self.last_refreshed = datetime.now(timezone.utc)
+            self.last_errors = errors
+            return self.status()
+
+    def status(self):
+        """
+        Freshness summary of the live data.
+        """
+        age = None
+        if self.last_refreshed:
+            age = (datetime.now(timezone.utc) - self.last_refreshed).total_seconds()
+        return {
+            "last_refreshed": (
+                self.last_refreshed.isoformat() if self.last_refreshed else None
+            ),
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age > 2 * self.interval_seconds,
+            "errors": self.last_errors,
+        }
+
+    def freshness_headers(self):
+        status = self.status()
+        return {
+            "X-Last-Refresh": status["last_refreshed"] or "never",
+            "X-Data-Stale": str(status["stale"]).lower(),
+        }
+
+    def start(self):
+        """
+        Start the periodic refresh on a daemon thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="live-refresh", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Live refresh started, every {self.interval_seconds}s")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval_seconds)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    # Standalone worker: keeps the database fresh without the API running
+    from app.core.config import LIVE_CITIES, REFRESH_INTERVAL_SECONDS, db
+
+    service = LiveRefreshService(db, LIVE_CITIES, REFRESH_INTERVAL_SECONDS)
+    try:
+        service._run()
+    except KeyboardInterrupt:
+        service.stop()
+        db.close()
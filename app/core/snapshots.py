@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import datetime
+
+from app.db.snapshots import current_snapshot
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+# Publishes wait at least this many times the last copy's duration, so the
+# copy never takes more than a fifth of the writer's time
+PUBLISH_BACKOFF = 4
+
+
+class SnapshotPublisher:
+    """
+    Runs in the writer process: publishes a snapshot for the read-only
+    workers every `interval_seconds` when something was written since the
+    last one, along with the live refresh time for their freshness headers.
+    A copy costs time in proportion to the database size, so the interval
+    stretches to PUBLISH_BACKOFF times the last copy, and a publish asked
+    for while one is running is skipped.
+    """
+
+    def __init__(self, db, directory, interval_seconds: float = 30, refresher=None):
+        self.db = db
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.refresher = refresher
+        self.last_published = None
+        self.last_duration = 0.0
+        self._publishing = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        db.write_listeners.append(self._mark_dirty)
+
+    def _mark_dirty(self, stations=None, start=None, end=None):
+        self._dirty.set()
+
+    def publish(self):
+        """
+        Publish a snapshot and return its path, or None when another
+        publish is already running.
+        """
+        if not self._publishing.acquire(blocking=False):
+            return None
+        try:
+            self._dirty.clear()
+            refreshed = getattr(self.refresher, "last_refreshed", None)
+            started = time.perf_counter()
+            try:
+                path = self.db.publish_snapshot(
+                    self.directory,
+                    live_refreshed=refreshed.isoformat() if refreshed else None,
+                )
+            except Exception:
+                # Retried on the next tick
+                self._dirty.set()
+                raise
+            self.last_duration = time.perf_counter() - started
+            self.last_published = path
+            return path
+        finally:
+            self._publishing.release()
+
+    def next_interval(self) -> float:
+        return max(self.interval_seconds, PUBLISH_BACKOFF * self.last_duration)
+
+    def _run(self):
+        while not self._stop.wait(self.next_interval()):
+            if not self._dirty.is_set():
+                continue
+            try:
+                self.publish()
+            except Exception as e:
+                logger.info(f"Snapshot publish failed: {e}")
+
+    def start(self):
+        """
+        Publish the current state straight away, so readers can start, then
+        keep publishing on a daemon thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self.publish()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="snapshot-publisher", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Publishing snapshots to '{self.directory}'")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class SnapshotFollower:
+    """
+    Runs in each read-only worker: checks for a newer snapshot every
+    `interval_seconds` and switches the database over to it. The previous
+    snapshot stays open for `grace_seconds` so running queries can finish,
+    and after that until the last response streaming from it is done.
+    """
+
+    def __init__(
+        self,
+        db,
+        directory,
+        interval_seconds: float = 5,
+        refresher=None,
+        grace_seconds: float = 30,
+    ):
+        self.db = db
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.refresher = refresher
+        self.grace_seconds = grace_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """
+        Open the current snapshot if it is not the one being served.
+        Returns whether it switched.
+        """
+        snapshot = current_snapshot(self.directory)
+        if snapshot is None or snapshot["path"] == self.db.db_path:
+            return False
+        self.db.open_snapshot(snapshot["path"], self.grace_seconds)
+        self.apply_metadata(snapshot)
+        return True
+
+    def apply_metadata(self, snapshot: dict):
+        """
+        Mirror the writer's live refresh time, so the freshness headers of
+        this worker describe the data it serves.
+        """
+        if self.refresher is not None and snapshot.get("live_refreshed"):
+            self.refresher.last_refreshed = datetime.fromisoformat(
+                snapshot["live_refreshed"]
+            )
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.info(f"Snapshot switch failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="snapshot-follower", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Following snapshots in '{self.directory}'")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
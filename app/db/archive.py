@@ -0,0 +1,93 @@
+"""
+Cold tier for historical weather rows: a Hive-partitioned Parquet archive
+laid out as <archive_dir>/year=YYYY/month=M/city=<city>/*.parquet.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+PARTITION_COLUMNS = ["year", "month", "city"]
+
+
+def _literal(value) -> str:
+    """
+    SQL string literal of a path or timestamp. COPY ... TO takes no bound
+    parameters, and the archive scans are nested in statements that bind
+    none, so quotes are escaped instead.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def archive_copy_sql(source: str, archive_dir: str, cutoff) -> str:
+    """
+    COPY every row of `source` older than `cutoff` into the partitioned
+    archive. New files are appended next to existing ones in the same
+    partitions. Archived rows carry station_id/city/country rather than the
+    database-local station key, so the files stand on their own.
+    """
+    return f"""
+        COPY (
+            SELECT *, year(Datetime) AS year, month(Datetime) AS month
+            FROM {source}
+            WHERE Datetime < {_literal(cutoff)}
+        ) TO {_literal(archive_dir)} (
+            FORMAT parquet,
+            PARTITION_BY ({", ".join(PARTITION_COLUMNS)}),
+            APPEND,
+            FILENAME_PATTERN 'data_{{uuid}}'
+        )
+    """
+
+
+def month_dir(archive_dir: str, year: int, month: int) -> Path:
+    return Path(archive_dir) / f"year={year}" / f"month={month}"
+
+
+def archive_horizon(archive_dir):
+    """
+    First instant after the newest archived month, or None without archive.
+    Rows at or after it are always in the hot table.
+    """
+    months = []
+    for path in Path(archive_dir).glob("year=*/month=*"):
+        if any(path.rglob("*.parquet")):
+            year = int(path.parent.name.split("=", 1)[1])
+            months.append((year, int(path.name.split("=", 1)[1])))
+    if not months:
+        return None
+    year, month = max(months)
+    return pd.Timestamp(year=year, month=month, day=1) + pd.DateOffset(months=1)
+
+
+def cold_source_sql(
+    archive_dir: str, columns, start=None, end=None, city=None, files=None
+):
+    """
+    SELECT over the archive with partition filters for the date range and
+    city, so DuckDB only opens the matching year/month/city directories.
+    The city is not inlined: the query binds it as the `$city` parameter.
+    """
+    files = files or str(Path(archive_dir) / "**" / "*.parquet")
+    filters = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters.append(
+            f"(year > {start.year} OR (year = {start.year} AND month >= {start.month}))"
+        )
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters.append(
+            f"(year < {end.year} OR (year = {end.year} AND month <= {end.month}))"
+        )
+    if city:
+        filters.append("LOWER(city) = LOWER($city)")
+
+    query = (
+        f"SELECT {', '.join(columns)} "
+        f"FROM read_parquet({_literal(files)}, hive_partitioning = true, "
+        "union_by_name = true)"
+    )
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    return query
@@ -0,0 +1,168 @@
+import functools
+import threading
+
+import duckdb
+
+STREAM_BATCH_ROWS = 100_000
+
+
+class QueryStream:
+    """
+    Arrow record batches of one query result, iterable from any thread.
+    The cursor is closed once the batches are exhausted or `close()` runs,
+    which then calls `on_close`: the query only runs as batches are read.
+    """
+
+    def __init__(
+        self, cursor, result, batch_size: int = STREAM_BATCH_ROWS, on_close=None
+    ):
+        self._cursor = cursor
+        self._reader = result.fetch_record_batch(batch_size)
+        self.schema = self._reader.schema
+        self._on_close = on_close
+
+    def __iter__(self):
+        try:
+            yield from self._reader
+        finally:
+            self.close()
+
+    def read_all(self):
+        try:
+            return self._reader.read_all()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._cursor is None:
+            return
+        self._cursor.close()
+        self._cursor = None
+        if self._on_close is not None:
+            self._on_close()
+
+
+class ConnectionManager:
+    """
+    Owns the single DuckDB database instance for a file. Every thread gets its
+    own cursor (a connection to that instance with its own transaction
+    context), so reads run in parallel across FastAPI's threadpool while
+    writes are serialised through `write_lock`. A `read_only` instance can
+    share the file with other read-only processes.
+
+    Open streams are counted, so a `retire()`d instance (a replaced
+    snapshot) is closed only once the last response reading it finishes.
+    """
+
+    def __init__(self, db_path: str, read_only: bool = False):
+        self.db_path = db_path
+        self._root = duckdb.connect(db_path, read_only=read_only)
+        self._local = threading.local()
+        self._cursors = []
+        self._lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self._streams = 0
+        self._retired = False
+        self._closed = False
+
+    def cursor(self):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._root.cursor()
+            self._local.cursor = cursor
+            with self._lock:
+                self._cursors.append(cursor)
+        return cursor
+
+    @property
+    def open_cursors(self) -> int:
+        with self._lock:
+            return len(self._cursors)
+
+    def dedicated_cursor(self):
+        """
+        A cursor outside the thread-local pool; the caller closes it.
+        """
+        return self._root.cursor()
+
+    def stream(
+        self,
+        query: str,
+        params=None,
+        batch_size: int = STREAM_BATCH_ROWS,
+        on_close=None,
+    ):
+        """
+        Run `query` with its bound `params` on a cursor of its own and hand
+        back its record batches.
+        The thread-local cursor would be reused by the next request on the
+        same thread while the response is still being streamed.
+        """
+        with self._lock:
+            self._streams += 1
+
+        def closed():
+            try:
+                if on_close is not None:
+                    on_close()
+            finally:
+                self._release_stream()
+
+        try:
+            cursor = self.dedicated_cursor()
+        except Exception:
+            self._release_stream()
+            raise
+        try:
+            result = cursor.execute(query, params)
+            return QueryStream(cursor, result, batch_size, closed)
+        except Exception:
+            cursor.close()
+            self._release_stream()
+            raise
+
+    @property
+    def open_streams(self) -> int:
+        with self._lock:
+            return self._streams
+
+    def _release_stream(self):
+        with self._lock:
+            self._streams -= 1
+            idle = self._retired and self._streams == 0
+        if idle:
+            self.close()
+
+    def retire(self):
+        """
+        Close now, or once the streams still being read have finished.
+        """
+        with self._lock:
+            self._retired = True
+            idle = self._streams == 0
+        if idle:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for cursor in self._cursors:
+                cursor.close()
+            self._cursors.clear()
+        self._local = threading.local()
+        self._root.close()
+
+
+def serialized_write(method):
+    """
+    Run a WeatherDB method under the single-writer lock.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.connections.write_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
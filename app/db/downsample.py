@@ -0,0 +1,71 @@
+"""
+Largest-Triangle-Three-Buckets downsampling for time series, so charts get
+a few hundred visually faithful points instead of every bucket.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x, y, threshold: int) -> np.ndarray:
+    """
+    Indices of the `threshold` points LTTB keeps from (x, y). The first and
+    last points are always kept; each bucket in between contributes the
+    point forming the largest triangle with its neighbours.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+
+        px, py = x[previous], y[previous]
+        areas = np.abs(
+            (px - avg_x) * (y[lo:hi] - py) - (px - x[lo:hi]) * (avg_y - py)
+        )
+        previous = lo + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample_series(df, x_col, value_cols, group_cols, max_points: int):
+    """
+    Apply LTTB per group, keeping at most `max_points` whole rows. With
+    several value columns one driving series picks the rows: the mean of
+    the columns, each scaled to [0, 1] within the group, so a peak in any
+    of them pulls its row in. Rows without any value are dropped.
+    """
+    if df.empty:
+        return df
+
+    keep = np.zeros(len(df), dtype=bool)
+    x_all = pd.to_datetime(df[x_col]).astype("int64").to_numpy()
+    values_all = np.column_stack(
+        [df[c].to_numpy(dtype="float64", na_value=np.nan) for c in value_cols]
+    )
+    for positions in df.groupby(group_cols, sort=False).indices.values():
+        values = values_all[positions]
+        present = np.flatnonzero(~np.isnan(values).all(axis=1))
+        if not len(present):
+            continue
+        values = values[present]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+            scaled = (values - low) / np.where(high > low, high - low, 1.0)
+            driver = np.nanmean(scaled, axis=1)
+        chosen = lttb_indices(x_all[positions[present]], driver, max_points)
+        keep[positions[present[chosen]]] = True
+    return df[keep].reset_index(drop=True)
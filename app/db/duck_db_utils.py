@@ -1,205 +1,1293 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-import duckdb
+from pathlib import Path
 import pandas as pd
+from app.core.metrics import INGEST_ROWS, timed_query
+from app.db.archive import (
+    archive_copy_sql,
+    archive_horizon,
+    cold_source_sql,
+    month_dir,
+)
+from app.db.connection import ConnectionManager, serialized_write
+from app.db.rollups import (
+    ROLLUP_STATS,
+    create_rollup_sql,
+    merge_rollup_sql,
+    refresh_rollup_sql,
+    rollup_stats_query,
+    rollup_tables,
+    rollup_timeseries_query,
+)
+from app.db.downsample import downsample_series
+from app.db.rolling import (
+    INCREMENTAL_WINDOWS,
+    ROLLING_METRICS,
+    create_rolling_sql,
+    parse_window,
+    record_pending_sql,
+    refresh_rolling_sql,
+    rolling_columns,
+    rolling_query,
+    rolling_tables,
+    windowed_sql,
+)
+from app.db.slow_queries import SlowQueryLog
+from app.db.snapshots import (
+    copy_database,
+    new_snapshot_path,
+    prune_snapshots,
+    set_current,
+)
+from app.db.spatial import StationGrid
+from app.db.stations import (
+    FACT_COLUMNS,
+    READING_COLUMNS,
+    STATION_COLUMNS,
+    STATION_METADATA,
+    STATIONS_TABLE,
+    create_stations_sql,
+    create_weather_sql,
+    keyed_rows_sql,
+    labelled_rows_sql,
+    register_stations_sql,
+    station_filter_sql,
+    with_station_columns,
+)
+from app.db.stats import STAT_MODES, STAT_SQL, stat_sql
 from app.models import WeatherMetric
 from utils.logger_service import get_logger
-import os
-from dotenv import load_dotenv
 
 logger = get_logger(__name__)
 
-load_dotenv()
-API_KEY = os.getenv("OPENWEATHER_API_KEY")
+VALID_METRICS = ["Temperature", "Humidity", "WindSpeed"]
+VALID_STATS = list(STAT_SQL)
+VALID_INTERVALS = ["hour", "day", "week"]
+
+# Labelled CSV headers accepted for the weather columns
+CSV_COLUMN_MAP = {
+    "Temperature (°C)": "Temperature",
+    "Humidity (%)": "Humidity",
+    "Wind Speed (m/s)": "WindSpeed",
+    "Weather Description": "WeatherDescription",
+}
+
+# Files already ingested by insert_csv_if_changed
+MANIFEST_TABLE = "ingested_files"
+
+# Latest reading per station, kept up to date by every write path
+LATEST_TABLE = "latest_readings"
+
+# Columns of a reading as written by clients, CSV files and the archive
+WEATHER_COLUMNS = STATION_COLUMNS + READING_COLUMNS
 
 
 class WeatherDB:
-    def __init__(self, db_path="weather_data.db"):
+    def __init__(
+        self,
+        db_path="weather_data.db",
+        archive_dir=None,
+        slow_queries=None,
+        read_only=False,
+    ):
         self.db_path = db_path
-        self.con = duckdb.connect(self.db_path)
+        # Optional Parquet cold tier holding archived months
+        self.archive_dir = archive_dir
+        self._horizon = None
+        self._horizon_known = False
+        # Read-only instances serve a snapshot published by the writer
+        self.read_only = read_only
+        self.connections = ConnectionManager(self.db_path, read_only=read_only)
+        self._derived_ready = set()
+        # Spatial index over station coordinates, rebuilt when stations change
+        self._station_grid = (None, None)
+        # Registered station ids, so known stations skip registration
+        self._station_ids = (None, None)
+        self._stations_version = 0
+        self._stations_changed = False
+        # Called as listener(stations, start, end) after every committed write
+        self.write_listeners = []
+        # Read queries over its threshold are kept with their profiles
+        self.slow_queries = slow_queries or SlowQueryLog(threshold_ms=None)
 
-    def insert_csv(self, csv_path: str, table_name: str = "weather"):
+    @property
+    def con(self):
+        """
+        DuckDB cursor private to the calling thread.
+        """
+        return self.connections.cursor()
+
+    @serialized_write
+    @timed_query("ingest")
+    def insert_csv(self, csv_path: str, table_name: str = "weather") -> int:
         """
         Ingest sensor metrics CSV to database, The data is historical which is
-        synthetic generated.
+        synthetic generated. `csv_path` may be a glob of files; they are
+        streamed through DuckDB's CSV reader rather than loaded in memory,
+        parsed once into a temp table that the insert and the derived
+        tables read. Returns the number of new rows.
         """
-        df = pd.read_csv(csv_path)
         logger.info(f"Processing CSV: {csv_path}")
+        # The path is bound, never inlined into the SQL
+        source = "read_csv($path, union_by_name = true)"
+        params = {"path": str(csv_path)}
+
+        csv_columns = [
+            row[0]
+            for row in self.con.execute(
+                f"DESCRIBE SELECT * FROM {source}", params
+            ).fetchall()
+        ]
 
         # Assume 'Datetime' is the expected column
-        if "Datetime" not in df.columns:
+        if "Datetime" not in csv_columns:
             raise ValueError("❌ 'Datetime' column not found in the CSV.")
 
-        df["Datetime"] = pd.to_datetime(df["Datetime"], errors="coerce")
+        select = ", ".join(
+            f"{self._csv_column_sql(col, csv_columns)} AS {col}"
+            for col in WEATHER_COLUMNS
+        )
+        self.con.execute(
+            f"CREATE OR REPLACE TEMP TABLE csv_rows AS SELECT {select} FROM {source}",
+            params,
+        )
+        try:
+            parsed, unparsed = 0, {}
+            for city, valid, invalid in self.con.execute(
+                """
+                SELECT city, count(Datetime), count(*) - count(Datetime)
+                FROM csv_rows
+                GROUP BY city
+            """
+            ).fetchall():
+                parsed += valid
+                if invalid:
+                    unparsed[city] = invalid
+            if not parsed:
+                raise ValueError("❌ 'Datetime' column could not be parsed.")
+            # Rows whose Datetime does not parse are skipped
+            inserted = self._insert_rows(
+                "(SELECT * FROM csv_rows WHERE Datetime IS NOT NULL)",
+                table_name,
+                source="csv",
+            )
+            self._count_ingested({}, "csv", skipped=unparsed)
+        finally:
+            self.con.execute("DROP TABLE IF EXISTS csv_rows")
 
-        if df["Datetime"].isnull().all():
-            raise ValueError("❌ 'Datetime' column could not be parsed.")
+        logger.info(
+            f"Inserted {inserted} new row(s) into '{table_name}' from {csv_path}"
+        )
+        return inserted
 
-        # Normalize column names
-        column_map = {
-            "Temperature (°C)": "Temperature",
-            "Humidity (%)": "Humidity",
-            "Wind Speed (m/s)": "WindSpeed",
-            "Weather Description": "WeatherDescription",
-        }
-        for csv_col, db_col in column_map.items():
-            if csv_col in df.columns:
-                df[db_col] = df[csv_col]
-
-        required_columns = [
-            "station_id",
-            "city",
-            "country",
-            "Datetime",
-            "Temperature",
-            "Humidity",
-            "WindSpeed",
-            "WeatherDescription",
-        ]
-        df = df[required_columns]
+    @serialized_write
+    @timed_query("ingest")
+    def insert_query(
+        self, query: str, table_name: str = "weather", source: str = "query"
+    ) -> int:
+        """
+        Insert the rows of a SELECT returning the WEATHER_COLUMNS, e.g. a
+        generated dataset or a Parquet scan, keeping rows already stored.
+        Returns the number of new rows.
+        """
+        return self._insert_rows(f"({query})", table_name, source)
 
+    def _insert_rows(self, rows: str, table_name: str, source: str) -> int:
         self._create_table_if_not_exists(table_name)
 
-        self.con.register("df_temp", df)
+        # Existing rows win, only readings not stored yet are written
+        with self._transaction():
+            counts, cities, touched = self._write_batch(
+                rows, table_name, overwrite=False
+            )
+        inserted = counts["new"]
+
+        if inserted:
+            self._notify_write(*touched)
+        self._count_ingested(cities, source)
+        return inserted
+
+    @staticmethod
+    def _count_ingested(cities: dict, source: str, skipped=None):
+        """
+        Ingest metrics per city: written rows as inserted; rows left alone
+        (unchanged or already stored) and the `skipped` counts per city as
+        skipped.
+        """
+        skipped = skipped or {}
+        for city in set(cities) | set(skipped):
+            statuses = cities.get(city, Counter())
+            written = statuses["new"] + statuses["changed"]
+            left = statuses["same"] + skipped.get(city, 0)
+            INGEST_ROWS.inc(written, source=source, city=city, outcome="inserted")
+            INGEST_ROWS.inc(left, source=source, city=city, outcome="skipped")
 
-        # Insert new rows only
-        insert_query = f"""
-            INSERT INTO {table_name}
-            SELECT * FROM df_temp dt
-            WHERE NOT EXISTS (
-                SELECT 1 FROM {table_name} wt
-                WHERE wt.station_id = dt.station_id AND wt.Datetime = dt.Datetime
+    def _write_batch(
+        self, rows: str, table_name: str, overwrite: bool, station_ids=None
+    ):
+        """
+        Stage `rows` (denormalized readings), write the new ones, with
+        `overwrite` also the changed ones, and bring the derived tables in
+        step, inside the caller's transaction. Returns the row counts per
+        status, overall and per city, and the touched (stations, start, end).
+        `station_ids` of an in-memory batch let known stations skip
+        registration.
+        """
+        self._register_stations(rows, station_ids)
+        summary = self._stage_batch(rows, table_name, overwrite)
+        cities, counts = {}, Counter()
+        stations, start, end = set(), None, None
+        for city, status, count, lo, hi, ids in summary:
+            cities.setdefault(city, Counter())[status] = count
+            counts[status] += count
+            if status != "same":
+                stations.update(ids)
+                start = lo if start is None else min(start, lo)
+                end = hi if end is None else max(end, hi)
+
+        if counts["new"] or counts["changed"]:
+            updates = ", ".join(
+                f"{col} = excluded.{col}" for col in READING_COLUMNS[1:]
             )
+            self.con.execute(
+                f"""
+                INSERT INTO {table_name}
+                SELECT {", ".join(FACT_COLUMNS)} FROM batch_rows
+                WHERE status <> 'same'
+                ON CONFLICT (station_key, Datetime) DO UPDATE SET {updates}
+            """
+            )
+            self._update_derived(table_name, counts)
+        self.con.execute("DROP TABLE batch_rows")
+        if end is not None:
+            end += timedelta(hours=1)
+        return counts, cities, (stations, start, end)
+
+    def _stage_batch(self, rows: str, table_name: str, overwrite: bool) -> list:
         """
-        before_count = self.con.execute(
-            f"SELECT COUNT(*) FROM {table_name}"
-        ).fetchone()[0]
-        self.con.execute(insert_query)
-        after_count = self.con.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[
-            0
-        ]
+        Stage the readings of `rows` once as the temp table batch_rows, one
+        row per station and Datetime with its station_key and a status
+        against the stored reading: 'new', 'changed' (only with `overwrite`,
+        the upsert replaces it) or 'same' (left alone). Readings already in
+        the Parquet archive are left alone too, archived months are only
+        changed through restore_month. The write and the derived tables
+        then read the stage, not the source. Returns the row count, time
+        range and station ids per city and status.
+        """
+        changed = "false"
+        if overwrite:
+            changed = " OR ".join(
+                f"t.{col} IS DISTINCT FROM src.{col}" for col in READING_COLUMNS[1:]
+            )
+        readings = ", ".join(f"src.{col}" for col in READING_COLUMNS)
+        self.con.execute(
+            f"""
+            CREATE OR REPLACE TEMP TABLE batch_rows AS
+            SELECT s.station_key, {readings}, src.station_id, src.city,
+                CASE WHEN t.station_key IS NULL THEN 'new'
+                    WHEN {changed} THEN 'changed'
+                    ELSE 'same' END AS status
+            FROM (
+                SELECT * FROM {rows}
+                QUALIFY row_number() OVER (PARTITION BY station_id, Datetime) = 1
+            ) src
+            JOIN {STATIONS_TABLE} s ON s.station_id = src.station_id
+            LEFT JOIN {table_name} t
+                ON t.station_key = s.station_key AND t.Datetime = src.Datetime
+        """
+        )
+        summary_sql = """
+            SELECT city, status, count(*), min(Datetime), max(Datetime),
+                list(DISTINCT station_id)
+            FROM batch_rows
+            GROUP BY city, status
+        """
+        summary = self.con.execute(summary_sql).fetchall()
+        # Batches outside the archived months skip the cold tier lookup
+        horizon = self._archive_horizon()
+        if horizon is not None and any(
+            status != "same" and pd.Timestamp(lo) < horizon
+            for _, status, _, lo, *_ in summary
+        ):
+            self._skip_archived("batch_rows", horizon)
+            summary = self.con.execute(summary_sql).fetchall()
+        return summary
 
-        inserted = after_count - before_count
-        logger.info(
-            f"Inserted {inserted} new row(s) into '{table_name}' from {csv_path}"
+    def _skip_archived(self, stage: str, horizon):
+        """
+        Mark staged readings that the cold tier already holds as 'same', so
+        a re-delivered reading of an archived month is not stored (and
+        counted) a second time. New readings for those months still land
+        in the hot table.
+        """
+        oldest, newest = self.con.execute(
+            f"SELECT min(Datetime), max(Datetime) FROM {stage} "
+            f"WHERE Datetime < '{horizon}' AND status <> 'same'"
+        ).fetchone()
+        cold = cold_source_sql(
+            self.archive_dir, ["station_id", "Datetime"], oldest, newest
+        )
+        self.con.execute(
+            f"""
+            UPDATE {stage} SET status = 'same'
+            FROM ({cold}) c
+            JOIN {STATIONS_TABLE} s ON s.station_id = c.station_id
+            WHERE {stage}.station_key = s.station_key
+                AND {stage}.Datetime = c.Datetime
+        """
+        )
+
+    @serialized_write
+    def insert_csv_if_changed(self, csv_path: str, table_name: str = "weather"):
+        """
+        Ingest a CSV unless the manifest shows this exact file was already
+        ingested. Matching size and mtime skip without reading the file, a
+        changed mtime with an unchanged content hash only refreshes the
+        manifest. Returns the inserted row count, or None when skipped.
+        """
+        self.con.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+                path VARCHAR PRIMARY KEY,
+                size BIGINT,
+                mtime DOUBLE,
+                content_hash VARCHAR,
+                rows_inserted BIGINT,
+                ingested_at TIMESTAMP
+            );
+        """
         )
+        path = os.path.abspath(csv_path)
+        stat = os.stat(path)
+        known = self.con.execute(
+            f"SELECT size, mtime, content_hash FROM {MANIFEST_TABLE} WHERE path = ?",
+            [path],
+        ).fetchone()
+
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            logger.info(f"Skipping unchanged file: {csv_path}")
+            return None
+
+        with open(path, "rb") as f:
+            content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+
+        if known and known[2] == content_hash:
+            logger.info(f"Skipping file with unchanged content: {csv_path}")
+            self.con.execute(
+                f"UPDATE {MANIFEST_TABLE} SET size = ?, mtime = ? WHERE path = ?",
+                [stat.st_size, stat.st_mtime, path],
+            )
+            return None
+
+        inserted = self.insert_csv(path, table_name)
+        self.con.execute(
+            f"""
+            INSERT OR REPLACE INTO {MANIFEST_TABLE}
+            VALUES (?, ?, ?, ?, ?, now()::TIMESTAMP)
+        """,
+            [path, stat.st_size, stat.st_mtime, content_hash, inserted],
+        )
+        return inserted
+
+    @staticmethod
+    def _csv_column_sql(column: str, csv_columns) -> str:
+        """
+        SQL expression reading a weather column from the CSV, accepting the
+        labelled variants (e.g. "Temperature (°C)") used by some exports.
+        """
+        candidates = [column] + [
+            csv_col for csv_col, db_col in CSV_COLUMN_MAP.items() if db_col == column
+        ]
+        present = [f'"{c}"' for c in candidates if c in csv_columns]
+        if not present:
+            raise ValueError(f"❌ '{column}' column not found in the CSV.")
+        expr = present[0] if len(present) == 1 else f"COALESCE({', '.join(present)})"
+        if column == "Datetime":
+            return f"TRY_CAST({expr} AS TIMESTAMP)"
+        return expr
 
     def insert_metrics(self, metric: WeatherMetric, table_name: str = "weather"):
         """
         Insert weather metrics.
         """
+        self.upsert_metrics([metric], table_name)
+
+    @serialized_write
+    @timed_query("ingest")
+    def upsert_metrics(
+        self, rows, table_name: str = "weather", source: str = "upsert"
+    ) -> int:
+        """
+        Write a batch of readings (DataFrame, WeatherMetric or dict rows) in a
+        single INSERT ... ON CONFLICT, so re-delivered readings such as a
+        refreshed forecast overwrite the stale values. Returns the batch size.
+
+        Rows identical to the stored reading are left alone and counted as
+        skipped in the ingest metrics, per `source` and city.
+
+        Every call pays a fixed set of statements (stage, write, latest
+        readings, one rollup merge per grain, rolling log) whatever its size,
+        so a one-row call costs milliseconds: batch writes where possible,
+        as IngestQueue does for /ingest. benchmarks/bench_suite.py tracks it
+        as upsert_metrics/1_row.
+        """
+        if isinstance(rows, pd.DataFrame):
+            df = rows[WEATHER_COLUMNS].copy()
+        else:
+            records = [
+                r.model_dump() if isinstance(r, WeatherMetric) else r for r in rows
+            ]
+            df = pd.DataFrame.from_records(records, columns=WEATHER_COLUMNS)
+        if df.empty:
+            return 0
+
+        # Stored timestamps are naive UTC
+        df["Datetime"] = pd.to_datetime(df["Datetime"], utc=True).dt.tz_localize(
+            None
+        )
+        # A row can only be updated once per statement
+        df = df.drop_duplicates(subset=["station_id", "Datetime"], keep="last")
+
         self._create_table_if_not_exists(table_name)
-        df = pd.DataFrame([metric.dict()])
-        self.con.register("df_post", df)
-        self.con.execute(f"INSERT INTO {table_name} SELECT * FROM df_post")
+        self.con.register("df_batch", df)
+        try:
+            with self._transaction():
+                counts, cities, touched = self._write_batch(
+                    "df_batch",
+                    table_name,
+                    overwrite=True,
+                    station_ids=df["station_id"].dropna().unique(),
+                )
+        finally:
+            self.con.unregister("df_batch")
+        if counts["new"] or counts["changed"]:
+            self._notify_write(*touched)
 
+        self._count_ingested(cities, source)
+        return len(df)
+
+    def _notify_write(self, stations=None, start=None, end=None):
+        """
+        Tell listeners (e.g. result caches) which stations and time range a
+        committed write touched. None means everything.
+        """
+        self._commit_stations()
+        for listener in self.write_listeners:
+            try:
+                listener(stations, start, end)
+            except Exception as e:
+                logger.warning(f"Write listener failed: {e}")
+
+    def _ensure_schema(self, table_name: str):
+        """
+        Lock-free check used by reads; the first call per table creates or
+        migrates it. A read-only snapshot comes with its schema.
+        """
+        if table_name not in self._derived_ready:
+            if self.read_only:
+                self._derived_ready.add(table_name)
+                return
+            self._create_table_if_not_exists(table_name)
+
+    def _register_stations(self, source: str, station_ids=None):
+        """
+        Register the unknown stations of `source` inside the running write
+        transaction; the spatial index follows once it commits. A batch
+        whose `station_ids` are all registered skips the statement.
+        """
+        if station_ids is not None and not self._stations_changed:
+            version, known = self._station_ids
+            if version != self._stations_version or known is None:
+                version = self._stations_version
+                known = set(
+                    self.con.execute(f"SELECT station_id FROM {STATIONS_TABLE}")
+                    .fetchnumpy()["station_id"]
+                )
+                self._station_ids = (version, known)
+            if known.issuperset(station_ids):
+                return
+        if self.con.execute(register_stations_sql(source)).fetchone()[0]:
+            self._stations_changed = True
+
+    def _commit_stations(self):
+        if self._stations_changed:
+            self._stations_changed = False
+            self._stations_version += 1
+
+    def station_grid(self) -> StationGrid:
+        """
+        Grid index of the registered station coordinates, built on first
+        use and again after stations are added or moved.
+        """
+        version, grid = self._station_grid
+        if version != self._stations_version or grid is None:
+            version = self._stations_version
+            stations = self.con.execute(
+                f"SELECT station_key, lat, lon FROM {STATIONS_TABLE}"
+            ).fetchdf()
+            grid = StationGrid(
+                stations["station_key"], stations["lat"], stations["lon"]
+            )
+            self._station_grid = (version, grid)
+        return grid
+
+    def stations_in_area(self, near=None, bbox=None):
+        """
+        Station keys within `near` = (lat, lon, radius_km) and/or inside
+        `bbox` = (south, west, north, east), or None without either.
+        """
+        if near is None and bbox is None:
+            return None
+        grid = self.station_grid()
+        keys = None
+        if near is not None:
+            keys = grid.within_radius(*near)
+        if bbox is not None:
+            inside = set(grid.within_bbox(*bbox))
+            keys = sorted(inside) if keys is None else [k for k in keys if k in inside]
+        return keys
+
+    @serialized_write
     def _create_table_if_not_exists(self, table_name: str):
         """
         At startup create table "weather" in database if does'nt
-        exists.
+        exists. Databases from before the stations table are migrated.
+        """
+        if table_name in self._derived_ready:
+            return
+        for statement in create_stations_sql():
+            self.con.execute(statement)
+        self.migrate_station_keys(table_name)
+        self.con.execute(create_weather_sql(table_name))
+        self._ensure_derived_tables(table_name)
+
+    def _has_legacy_layout(self, table_name: str) -> bool:
+        return bool(
+            self.con.execute(
+                "SELECT count(*) FROM information_schema.columns "
+                f"WHERE table_name = '{table_name}' AND column_name = 'station_id'"
+            ).fetchone()[0]
+        )
+
+    @serialized_write
+    def migrate_station_keys(self, table_name: str = "weather"):
+        """
+        Convert a weather table with station_id/city/country on every row to
+        the station_key layout: register every station of the hot table and
+        the archive, rewrite the table and rebuild its derived tables.
+        Returns the number of stations, or None when there was nothing to do.
+        """
+        if not self._has_legacy_layout(table_name):
+            return None
+        for statement in create_stations_sql():
+            self.con.execute(statement)
+
+        legacy = f"{table_name}_legacy"
+        latest = self._latest_table(table_name)
+        with self._transaction():
+            self.con.execute(f"ALTER TABLE {table_name} RENAME TO {legacy}")
+            self.con.execute(register_stations_sql(legacy))
+            if self._archive_horizon() is not None:
+                cold = cold_source_sql(self.archive_dir, STATION_COLUMNS)
+                self.con.execute(register_stations_sql(f"({cold})"))
+            self.con.execute(create_weather_sql(table_name))
+            # Older tables had no unique constraint, keep one row per reading
+            self.con.execute(
+                f"""
+                INSERT INTO {table_name} SELECT * FROM {keyed_rows_sql(legacy)}
+                ON CONFLICT (station_key, Datetime) DO NOTHING
+            """
+            )
+            self.con.execute(f"DROP TABLE {legacy}")
+            for derived in [latest, *rollup_tables(table_name).values()]:
+                self.con.execute(f"DROP TABLE IF EXISTS {derived}")
+        self._stations_changed = True
+        self._commit_stations()
+
+        self._derived_ready.discard(table_name)
+        self._ensure_derived_tables(table_name)
+        stations = self.con.execute(
+            f"SELECT count(*) FROM {STATIONS_TABLE}"
+        ).fetchone()[0]
+        logger.info(f"Migrated '{table_name}' to station keys, {stations} station(s)")
+        return stations
+
+    @serialized_write
+    def update_stations(self, stations) -> int:
+        """
+        Load station metadata (name, city, country, lat, lon, elevation) from
+        a DataFrame or records keyed by station_id. Only the columns present
+        are updated and unknown stations are ignored. Returns the number of
+        stations updated.
         """
+        df = pd.DataFrame(stations)
+        if "station_id" not in df:
+            raise ValueError("❌ 'station_id' column not found in the stations.")
+        columns = [col for col in STATION_METADATA if col in df]
+        if not columns:
+            return 0
+
+        for statement in create_stations_sql():
+            self.con.execute(statement)
+        updates = ", ".join(f"{col} = m.{col}" for col in columns)
+        self.con.register("df_stations", df[["station_id", *columns]])
+        try:
+            updated = self.con.execute(
+                f"""
+                UPDATE {STATIONS_TABLE} SET {updates}
+                FROM df_stations m
+                WHERE {STATIONS_TABLE}.station_id = m.station_id
+            """
+            ).fetchone()[0]
+        finally:
+            self.con.unregister("df_stations")
+        self._stations_changed = True
+        self._notify_write()
+        logger.info(f"Updated metadata of {updated} station(s)")
+        return updated
+
+    @contextmanager
+    def _transaction(self):
+        self.con.begin()
+        try:
+            yield
+        except Exception:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    def _latest_table(self, table_name: str) -> str:
+        if table_name == "weather":
+            return LATEST_TABLE
+        return f"{table_name}_{LATEST_TABLE}"
+
+    @serialized_write
+    def _ensure_derived_tables(self, table_name: str):
+        """
+        Create the tables derived from the weather table (latest reading per
+        station and the hourly/daily rollups), backfilling them from the
+        weather table the first time they are created (e.g. older databases).
+        Rolling windows start empty and are built on their first refresh.
+        """
+        if table_name in self._derived_ready:
+            return
+        latest = self._latest_table(table_name)
+        rollups = rollup_tables(table_name)
+        existing = self._existing_tables([table_name, latest, *rollups.values()])
+        for statement in create_rolling_sql(table_name):
+            self.con.execute(statement)
+
+        if latest not in existing:
+            self.con.execute(
+                f"""
+                CREATE TABLE {latest} (
+                    station_key INTEGER PRIMARY KEY,
+                    Datetime TIMESTAMP,
+                    Temperature DOUBLE,
+                    Humidity INTEGER,
+                    WindSpeed DOUBLE,
+                    WeatherDescription VARCHAR
+                );
+            """
+            )
+            if table_name in existing:
+                self.rebuild_latest_readings(table_name)
+
+        if not set(rollups.values()) <= existing:
+            for grain in rollups:
+                self.con.execute(create_rollup_sql(table_name, grain))
+            if table_name in existing:
+                self.rebuild_rollups(table_name)
+
+        self._derived_ready.add(table_name)
+
+    def _existing_tables(self, names) -> set:
+        listed = ", ".join(f"'{name}'" for name in names)
+        return {
+            row[0]
+            for row in self.con.execute(
+                "SELECT table_name FROM information_schema.tables "
+                f"WHERE table_name IN ({listed})"
+            ).fetchall()
+        }
+
+    def _update_derived(self, table_name: str, counts: Counter):
+        """
+        Keep the latest readings and rollups in step with the written rows
+        of the staged batch, and log them for the materialized rolling
+        windows. New rows are merged into their rollup buckets; buckets
+        with an overwritten reading are recomputed from the raw rows.
+        """
+        written = "(SELECT * FROM batch_rows WHERE status <> 'same')"
+        self._update_latest(written, table_name)
+        self.con.execute(record_pending_sql(table_name, written))
+
+        changed = None
+        if counts["changed"]:
+            changed = "(SELECT * FROM batch_rows WHERE status = 'changed')"
+            raw = table_name
+            if self._archive_horizon() is not None:
+                oldest = self.con.execute(
+                    f"SELECT min(Datetime) FROM {changed}"
+                ).fetchone()[0]
+                raw = self._raw_source(table_name, start=oldest)
+            for grain in rollup_tables(table_name):
+                for statement in refresh_rollup_sql(
+                    table_name, grain, changed, raw=raw
+                ):
+                    self.con.execute(statement)
+        if counts["new"]:
+            new = "(SELECT * FROM batch_rows WHERE status = 'new')"
+            for grain in rollup_tables(table_name):
+                self.con.execute(merge_rollup_sql(table_name, grain, new, changed))
+
+    def _update_latest(self, source: str, table_name: str):
+        """
+        Fold the newest row per station of a just written batch into the
+        latest readings table. A written reading at the same Datetime
+        replaces the stored one (upsert semantics).
+        """
+        latest = self._latest_table(table_name)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in READING_COLUMNS)
+        # arg_max over the whole row keeps NULL readings of the newest one
+        readings = ", ".join(READING_COLUMNS)
         self.con.execute(
             f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                station_id VARCHAR,
-                city VARCHAR,
-                country VARCHAR,
-                Datetime TIMESTAMP,
-                Temperature DOUBLE,
-                Humidity INTEGER,
-                WindSpeed DOUBLE,
-                WeatherDescription VARCHAR,
-                UNIQUE(station_id, Datetime)
-            );
+            INSERT INTO {latest}
+            SELECT station_key, unnest(newest) FROM (
+                SELECT station_key,
+                    arg_max(struct_pack({readings}), Datetime) AS newest
+                FROM {source}
+                GROUP BY station_key
+            )
+            ON CONFLICT (station_key) DO UPDATE SET {updates}
+            WHERE excluded.Datetime >= {latest}.Datetime
         """
         )
 
-    def get_sensor_details(self, station_ids=None, table_name="weather"):
+    @serialized_write
+    def rebuild_latest_readings(self, table_name: str = "weather") -> int:
         """
-        Ingests live weather data (forecast + current) for multiple cities.
-        Then returns the latest weather record for each station (by max Datetime).
+        Recompute the latest reading per station from the full weather table.
+        Used for recovery if the table ever drifts. Returns the station count.
         """
-        from ingestion.ingest_openweather import WeatherIngestor
+        latest = self._latest_table(table_name)
+        raw = self._raw_source(table_name)
+        with self._transaction():
+            self.con.execute(f"DELETE FROM {latest}")
+            self.con.execute(
+                f"""
+                INSERT INTO {latest}
+                SELECT {", ".join(FACT_COLUMNS)} FROM {raw}
+                QUALIFY row_number() OVER (
+                    PARTITION BY station_key ORDER BY Datetime DESC
+                ) = 1
+            """
+            )
+        stations = self.con.execute(f"SELECT COUNT(*) FROM {latest}").fetchone()[0]
+        self._notify_write()
+        logger.info(f"Rebuilt '{latest}' with {stations} station(s)")
+        return stations
 
-        cities = [
-            {"city": "Dublin", "country": "Ireland"},
-            {"city": "Galway", "country": "Ireland"},
-        ]
+    @serialized_write
+    def rebuild_rollups(self, table_name: str = "weather"):
+        """
+        Recompute every hourly/daily rollup bucket from the weather table.
+        """
+        with self._transaction():
+            for grain in rollup_tables(table_name):
+                for statement in refresh_rollup_sql(
+                    table_name, grain, raw=self._raw_source(table_name)
+                ):
+                    self.con.execute(statement)
+        self._notify_write()
+        logger.info(f"Rebuilt rollups for '{table_name}'")
 
-        for location in cities:
-            try:
-                ingestor = WeatherIngestor(
-                    api_key=API_KEY,
-                    city=location["city"],
-                    country=location["country"],
+    @serialized_write
+    def refresh_rolling(self, window: str, table_name: str = "weather") -> int:
+        """
+        Bring a materialized rolling window up to date. The first refresh
+        builds it over all history, later ones recompute only the readings
+        whose window overlaps a write logged since. Returns the number of
+        stations recomputed (every station on a build).
+        """
+        if window not in INCREMENTAL_WINDOWS:
+            raise ValueError(
+                f"Window '{window}' is not materialized, expected any of "
+                f"{INCREMENTAL_WINDOWS}"
+            )
+        seconds = parse_window(window)
+        self._ensure_schema(table_name)
+        tables = rolling_tables(table_name)
+        built = window in self._built_windows(table_name)
+
+        if built:
+            oldest, touched = self.con.execute(
+                f"""
+                SELECT min(lo), count(DISTINCT station_key) FROM {tables['pending']}
+                WHERE window_seconds = {seconds}
+            """
+            ).fetchone()
+            if not touched:
+                return 0
+            lookback = oldest - timedelta(seconds=seconds)
+            raw = self._raw_source(table_name, start=lookback)
+        else:
+            raw = self._raw_source(table_name)
+            touched = self.con.execute(
+                f"SELECT count(*) FROM {self._latest_table(table_name)}"
+            ).fetchone()[0]
+
+        with self._transaction():
+            for statement in refresh_rolling_sql(
+                table_name, seconds, raw, full=not built
+            ):
+                self.con.execute(statement)
+        if not built:
+            logger.info(f"Built the {window} rolling window of '{table_name}'")
+        return touched
+
+    def _built_windows(self, table_name: str = "weather", current=False) -> list:
+        """
+        Materialized rolling windows, with `current` only those without
+        writes pending.
+        """
+        tables = rolling_tables(table_name)
+        query = f"SELECT window_seconds FROM {tables['windows']} w"
+        if current:
+            query += (
+                f" WHERE NOT EXISTS (SELECT 1 FROM {tables['pending']} p "
+                "WHERE p.window_seconds = w.window_seconds)"
+            )
+        built = {seconds for (seconds,) in self.con.execute(query).fetchall()}
+        return [w for w in INCREMENTAL_WINDOWS if parse_window(w) in built]
+
+    def _archive_horizon(self):
+        if not self.archive_dir:
+            return None
+        if not self._horizon_known:
+            self._horizon = archive_horizon(self.archive_dir)
+            self._horizon_known = True
+        return self._horizon
+
+    def _raw_source(self, table_name: str, start=None, end=None, city=None) -> str:
+        """
+        Relation holding every raw weather row: the hot table, unioned with
+        the Parquet archive (mapped to station keys) when the range reaches
+        archived months.
+        """
+        horizon = self._archive_horizon()
+        if horizon is None:
+            return table_name
+        if start is not None and pd.Timestamp(start) >= horizon:
+            return table_name
+        columns = ", ".join(FACT_COLUMNS)
+        cold = cold_source_sql(self.archive_dir, WEATHER_COLUMNS, start, end, city)
+        return (
+            f"(SELECT {columns} FROM {table_name} "
+            f"UNION ALL SELECT * FROM {keyed_rows_sql(f'({cold})')})"
+        )
+
+    @serialized_write
+    def archive_before(self, cutoff, table_name: str = "weather") -> int:
+        """
+        Move every complete month before `cutoff` from the hot table to the
+        Parquet archive. Rollups and latest readings are unaffected since
+        queries read both tiers. Returns the number of rows moved.
+        """
+        if not self.archive_dir:
+            raise ValueError("❌ No archive directory configured.")
+        cutoff = pd.Timestamp(cutoff).to_period("M").start_time
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        with self._transaction():
+            copied = self.con.execute(
+                archive_copy_sql(
+                    labelled_rows_sql(table_name), self.archive_dir, cutoff
                 )
-                ingestor.ingest_forecast()
-                ingestor.ingest_current_weather()
-            except Exception as e:
-                logger.info(f"Skipped ingestion for {location['city']}: {e}")
+            ).fetchone()[0]
+            deleted = self.con.execute(
+                f"DELETE FROM {table_name} WHERE Datetime < ?", [cutoff]
+            ).fetchone()[0]
+            if copied != deleted:
+                raise RuntimeError(f"Archived {copied} rows but deleted {deleted}")
+        self._horizon_known = False
+        # Reclaim the space of the moved rows
+        self.con.execute("CHECKPOINT")
+        logger.info(f"Archived {copied} row(s) before {cutoff.date()}")
+        return copied
 
-        # Latest row per station — NOT just MAX(Datetime) JOIN (which can be stale)
-        subquery = f"""
-            SELECT station_id, MAX(Datetime) AS latest_dt
-            FROM {table_name}
-            GROUP BY station_id
+    @serialized_write
+    def restore_month(
+        self, year: int, month: int, table_name: str = "weather"
+    ) -> int:
         """
+        Move an archived month back into the hot table. Returns the number of
+        rows restored.
+        """
+        directory = month_dir(self.archive_dir, year, month)
+        if not directory.exists():
+            raise ValueError(f"❌ {year}-{month:02d} is not archived.")
+        files = str(directory / "*" / "*.parquet")
+        cold = f"({cold_source_sql(self.archive_dir, WEATHER_COLUMNS, files=files)})"
+
+        with self._transaction():
+            self._register_stations(cold)
+            restored = self.con.execute(
+                f"""
+                INSERT INTO {table_name} SELECT * FROM {keyed_rows_sql(cold)}
+                ON CONFLICT (station_key, Datetime) DO NOTHING
+            """
+            ).fetchone()[0]
+        shutil.rmtree(directory)
+        self._horizon_known = False
+        self._commit_stations()
+        logger.info(f"Restored {restored} row(s) for {year}-{month:02d}")
+        return restored
 
-        main_query = f"""
-            SELECT w.*
-            FROM {table_name} w
-            INNER JOIN ({subquery}) latest
-            ON w.station_id = latest.station_id AND w.Datetime = latest.latest_dt
+    def publish_snapshot(self, directory, keep: int = 3, **metadata) -> Path:
         """
+        Copy the database to a new file in `directory` and make it the
+        current snapshot for read-only workers. The copy reads one
+        transaction's view, so writes carry on meanwhile. Materialized
+        rolling windows are refreshed first, readers cannot. Returns its path.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._ensure_schema("weather")
+        for window in self._built_windows():
+            self.refresh_rolling(window)
 
-        if station_ids:
-            ids = ",".join([f"'{sid}'" for sid in station_ids])
-            main_query += f" WHERE w.station_id IN ({ids})"
+        path = new_snapshot_path(directory, Path(self.db_path).stem)
+        cursor = self.connections.dedicated_cursor()
+        try:
+            copy_database(cursor, path)
+        except Exception:
+            path.unlink(missing_ok=True)
+            raise
+        finally:
+            cursor.close()
+        set_current(directory, path, **metadata)
+        prune_snapshots(directory, keep)
+        logger.info(f"Published snapshot {path.name}")
+        return path
+
+    def open_snapshot(self, path, grace_seconds: float = 30):
+        """
+        Move a read-only instance to a newer snapshot. Queries already
+        running finish on the old file: it is retired after `grace_seconds`
+        and closed once no streamed response still reads it.
+        """
+        if not self.read_only:
+            raise ValueError("❌ Only a read-only WeatherDB follows snapshots.")
+        previous = self.connections
+        self.connections = ConnectionManager(str(path), read_only=True)
+        self.db_path = str(path)
+        self._horizon_known = False
+        # Everything may have changed: station index, caches, rollups
+        self._stations_changed = True
+        self._notify_write()
+        closer = threading.Timer(grace_seconds, previous.retire)
+        closer.daemon = True
+        closer.start()
+        logger.info(f"Serving snapshot {Path(path).name}")
 
-        main_query += " ORDER BY w.station_id"
+    def _fetch(
+        self, query: str, stream: bool = False, kind: str = "query", params=None
+    ):
+        """
+        Run a read query with its bound `params` as a DataFrame, or as a
+        QueryStream of Arrow record batches for columnar/streamed responses.
+        Slow queries are handed to the slow-query log; a stream is timed
+        until it is consumed or closed, since its batches are computed as
+        they are read.
+        """
+        start = time.perf_counter()
+
+        def observe():
+            self.slow_queries.observe(
+                kind, query, time.perf_counter() - start, self.connections, params
+            )
 
-        return self.con.execute(main_query).fetchdf()
+        if stream:
+            return self.connections.stream(query, params, on_close=observe)
+        result = self.con.execute(query, params).fetchdf()
+        observe()
+        return result
 
+    @timed_query("sensor")
+    def get_sensor_details(
+        self, station_ids=None, table_name="weather", stream=False, near=None,
+        bbox=None,
+    ):
+        """
+        Returns the latest weather record for each station, read from the
+        incrementally maintained latest readings table. Live data is kept
+        fresh separately by the refresh service. Name, coordinates and
+        elevation come from the stations table, so map clients need no
+        lookup of their own.
+
+        `near` = (lat, lon, radius_km) and `bbox` = (south, west, north,
+        east) select stations by location through the spatial index.
+        """
+        self._ensure_schema(table_name)
+        latest = self._latest_table(table_name)
+        filters, params = self._station_filters(station_ids, near=near, bbox=bbox)
+        if filters:
+            latest = f"(SELECT * FROM {latest} WHERE {' AND '.join(filters)})"
+
+        readings = ", ".join(f"l.{col}" for col in READING_COLUMNS)
+        query = f"""
+            SELECT s.station_id, s.city, s.country, {readings},
+                s.name, s.lat, s.lon, s.elevation
+            FROM {latest} l
+            JOIN {STATIONS_TABLE} s ON s.station_key = l.station_key
+            ORDER BY s.station_id
+        """
+
+        return self._fetch(query, stream, kind="sensor", params=params)
+
+    @timed_query("stat")
     def get_metric_stats(
         self,
-        metric: str,
-        stat: str,
+        metric,
+        stat,
         start_date=None,
         end_date=None,
         station_ids=None,
         city=None,
         table_name="weather",
+        use_rollups=True,
+        stream=False,
+        mode="exact",
+        near=None,
+        bbox=None,
     ):
         """
         Get metrics statistics for the given sensor/station id's based
-        on city if provided.
+        on city if provided. `metric` and `stat` may each be a single name
+        or a list; every combination is computed in one grouped scan and
+        returned as `<stat>_<metric>` columns, one row per station.
+
+        Whole days/hours of the range are read from the rollup tables when
+        available, giving the same result as the raw rows (up to floating
+        point summation order). With `stream` the result comes back as a
+        QueryStream of Arrow record batches instead of a DataFrame.
+
+        `mode="approx"` computes median/percentiles with approx_quantile
+        instead of exact quantiles, for interactive queries over years of data.
+        `near`/`bbox` select stations by location, as for get_sensor_details.
         """
-        valid_stats = ["avg", "min", "max", "sum"]
-        if stat not in valid_stats:
-            raise ValueError(f"Invalid stat '{stat}'")
+        metrics, stats = self._validate_stats(metric, stat, mode)
+        start_date, end_date = self.normalize_date_range(start_date, end_date)
+        self._ensure_schema(table_name)
+        filters, params = self._station_filters(station_ids, city, near, bbox)
 
-        start_date, end_date = self._normalize_date_range(start_date, end_date)
-        query = f"""
-            SELECT station_id, city, country, {stat}({metric}) AS {stat}_{metric}
-            FROM {table_name}
-            WHERE Datetime BETWEEN '{start_date}' AND '{end_date}'
+        # Hot rows, plus the archived months the range and city can touch
+        raw = self._raw_source(table_name, start_date, end_date, city)
+
+        query = None
+        if use_rollups and all(s in ROLLUP_STATS for s in stats):
+            query = rollup_stats_query(
+                table_name, metrics, stats, start_date, end_date, filters, raw=raw
+            )
+
+        if query is None:
+            aggregates = ", ".join(
+                f"{stat_sql(s, m, mode)} AS {s}_{m}" for m in metrics for s in stats
+            )
+            query = f"""
+                SELECT station_key, {aggregates}
+                FROM {raw}
+                WHERE Datetime BETWEEN '{start_date}' AND '{end_date}'
+            """
+            if filters:
+                query += " AND " + " AND ".join(filters)
+            query = with_station_columns(query + " GROUP BY station_key")
+
+        logger.debug(f"Executing Query : {query}")
+        return self._fetch(query, stream, kind="stat", params=params)
+
+    @timed_query("timeseries")
+    def get_metric_timeseries(
+        self,
+        metric,
+        stat="avg",
+        interval="day",
+        start_date=None,
+        end_date=None,
+        station_ids=None,
+        city=None,
+        max_points=None,
+        table_name="weather",
+        use_rollups=True,
+        mode="exact",
+        near=None,
+        bbox=None,
+    ):
+        """
+        Per-station series of `<stat>_<metric>` values bucketed by `interval`
+        (hour/day/week) with DuckDB's time_bucket, one row per station and
+        bucket. With `max_points` each series is reduced with LTTB.
         """
+        metrics, stats = self._validate_stats(metric, stat, mode)
+        if interval not in VALID_INTERVALS:
+            raise ValueError(f"Invalid interval '{interval}'")
+        start_date, end_date = self.normalize_date_range(start_date, end_date)
+        self._ensure_schema(table_name)
+        filters, params = self._station_filters(station_ids, city, near, bbox)
+        raw = self._raw_source(table_name, start_date, end_date, city)
 
-        filters = []
-        if station_ids:
-            ids = ",".join([f"'{sid}'" for sid in station_ids])
-            filters.append(f"station_id IN ({ids})")
-        if city:
-            filters.append(f"LOWER(city) = LOWER('{city}')")
+        query = None
+        if use_rollups and all(s in ROLLUP_STATS for s in stats):
+            query = rollup_timeseries_query(
+                table_name,
+                metrics,
+                stats,
+                interval,
+                start_date,
+                end_date,
+                filters,
+                raw=raw,
+            )
 
-        if filters:
-            query += " AND " + " AND ".join(filters)
+        if query is None:
+            aggregates = ", ".join(
+                f"{stat_sql(s, m, mode)} AS {s}_{m}" for m in metrics for s in stats
+            )
+            bucket = f"time_bucket(INTERVAL '1 {interval}', Datetime)"
+            query = f"""
+                SELECT station_key, {bucket} AS bucket, {aggregates}
+                FROM {raw}
+                WHERE Datetime BETWEEN '{start_date}' AND '{end_date}'
+            """
+            if filters:
+                query += " AND " + " AND ".join(filters)
+            query = with_station_columns(
+                query + f" GROUP BY station_key, {bucket}",
+                order_by="station_id, bucket",
+            )
+
+        logger.debug(f"Executing Query : {query}")
+        df = self._fetch(query, kind="timeseries", params=params)
+        if max_points:
+            df = downsample_series(
+                df,
+                "bucket",
+                [f"{s}_{m}" for m in metrics for s in stats],
+                ["station_id"],
+                max_points,
+            )
+        return df
+
+    @timed_query("rolling")
+    def get_metric_rolling(
+        self,
+        metric,
+        window="24h",
+        start_date=None,
+        end_date=None,
+        station_ids=None,
+        city=None,
+        z_threshold=3.0,
+        anomalies_only=False,
+        incremental=False,
+        table_name="weather",
+        stream=False,
+        near=None,
+        bbox=None,
+    ):
+        """
+        Every reading in the range with the moving average, min and max of
+        its station over the trailing `window` (e.g. "24h", "7d") and its
+        z-score against that window as `<metric>_zscore`. `<metric>_anomaly`
+        is true where |z| >= `z_threshold`; `anomalies_only` keeps just
+        those readings.
+
+        With `incremental` the statistics are read from the materialized
+        window, first refreshed for the writes since the last call, instead
+        of re-windowing the raw rows.
+        """
+        metrics = [metric] if isinstance(metric, str) else list(metric)
+        for m in metrics:
+            if m not in ROLLING_METRICS:
+                raise ValueError(f"Invalid metric '{m}'")
+        seconds = parse_window(window)
+        start_date, end_date = self.normalize_date_range(start_date, end_date)
+        self._ensure_schema(table_name)
+        filters, params = self._station_filters(station_ids, city, near, bbox)
+        in_range = f"Datetime BETWEEN '{start_date}' AND '{end_date}'"
+
+        if incremental and self.read_only:
+            # Snapshots are refreshed by the writer before they are published
+            incremental = window in self._built_windows(table_name, current=True)
+        elif incremental:
+            self.refresh_rolling(window, table_name)
+
+        if incremental:
+            conditions = [f"window_seconds = {seconds}", in_range, *filters]
+            windowed = f"""
+                SELECT station_key, Datetime, {rolling_columns(metrics)}
+                FROM {rolling_tables(table_name)['values']}
+                WHERE {' AND '.join(conditions)}
+            """
+        else:
+            # Rows up to a window before the range feed its first windows
+            lookback = pd.Timestamp(start_date) - pd.Timedelta(seconds=seconds)
+            raw = self._raw_source(table_name, lookback, end_date, city)
+            where = [f"Datetime BETWEEN '{lookback}' AND '{end_date}'", *filters]
+            windowed = windowed_sql(raw, metrics, seconds, where, qualify=[in_range])
+
+        query = rolling_query(windowed, metrics, z_threshold, anomalies_only)
+        logger.debug(f"Executing Query : {query}")
+        return self._fetch(query, stream, kind="rolling", params=params)
 
-        query += " GROUP BY station_id, city, country"
+    @staticmethod
+    def _validate_stats(metric, stat, mode="exact"):
+        metrics = [metric] if isinstance(metric, str) else list(metric)
+        stats = [stat] if isinstance(stat, str) else list(stat)
+
+        if mode not in STAT_MODES:
+            raise ValueError(f"Invalid mode '{mode}'")
+        for s in stats:
+            if s not in VALID_STATS:
+                raise ValueError(f"Invalid stat '{s}'")
+        for m in metrics:
+            if m not in VALID_METRICS:
+                raise ValueError(f"Invalid metric '{m}'")
+        return metrics, stats
+
+    def _station_filters(self, station_ids=None, city=None, near=None, bbox=None):
+        """
+        Station conditions resolved against the small stations table, so
+        the fact and rollup scans filter on the integer key alone. Spatial
+        selections are resolved to keys in memory by the grid index.
+
+        Returns the filters and the parameters they bind: station ids and
+        city are never inlined into the SQL. `$city` is shared with the
+        archive's partition filter.
+        """
+        conditions, params = [], {}
+        if station_ids:
+            conditions.append("list_contains($station_ids, station_id)")
+            params["station_ids"] = list(station_ids)
+        if city:
+            conditions.append("LOWER(city) = LOWER($city)")
+            params["city"] = city
+        filters = [station_filter_sql(conditions)] if conditions else []
 
-        logger.info(f"Executing Query : {query}")
-        return self.con.execute(query).fetchdf()
+        keys = self.stations_in_area(near, bbox)
+        if keys is not None:
+            listed = ", ".join(str(k) for k in keys)
+            filters.append(f"station_key IN ({listed})" if keys else "FALSE")
+        return filters, params
 
-    def _normalize_date_range(self, start_date, end_date):
+    def normalize_date_range(self, start_date, end_date):
         """
         Normalise start and end dates according to the format of schema.
         """
@@ -210,4 +1298,4 @@ class WeatherDB:
         return start_date, end_date
 
     def close(self):
-        self.con.close()
+        self.connections.close()
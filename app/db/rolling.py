@@ -0,0 +1,217 @@
+"""
+Rolling-window statistics of the weather table.
+
+Every reading gets the moving average, min and max of its station's
+readings over the trailing window (the reading included), computed with
+DuckDB window functions. Its z-score against the rest of that window,
+the reading itself left out so a lone spike cannot dilute its own
+baseline, flags anomalies such as heat waves or wind spikes.
+
+Windows in INCREMENTAL_WINDOWS can be materialized. Writes then log the
+station and time range they touched, and a refresh recomputes only the
+readings whose window overlaps one of those ranges.
+"""
+
+import re
+
+from app.db.rollups import ROLLUP_METRICS, VALUE_TYPES
+from app.db.stations import with_station_columns
+
+ROLLING_METRICS = ROLLUP_METRICS
+INCREMENTAL_WINDOWS = ["24h", "7d"]
+MAX_WINDOW_SECONDS = 366 * 86400
+
+WINDOW_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(window: str) -> int:
+    """
+    Window length in seconds from e.g. "90m", "24h" or "7d".
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([mhd])\s*", str(window).lower())
+    if not match:
+        raise ValueError(f"Invalid window '{window}', expected e.g. '24h' or '7d'")
+    seconds = int(match.group(1)) * WINDOW_UNITS[match.group(2)]
+    if not 0 < seconds <= MAX_WINDOW_SECONDS:
+        raise ValueError(f"Window '{window}' must be between 1m and 366d")
+    return seconds
+
+
+def rolling_tables(table_name: str) -> dict:
+    return {
+        "values": f"{table_name}_rolling",
+        "windows": f"{table_name}_rolling_windows",
+        "pending": f"{table_name}_rolling_pending",
+    }
+
+
+def create_rolling_sql(table_name: str) -> list:
+    """
+    The materialized windows, the windows built so far, and the ranges
+    written since their last refresh.
+    """
+    tables = rolling_tables(table_name)
+    columns = ",\n".join(
+        f"{m} {VALUE_TYPES[m]}, {m}_avg DOUBLE, {m}_min {VALUE_TYPES[m]}, "
+        f"{m}_max {VALUE_TYPES[m]}, {m}_base_avg DOUBLE, {m}_base_std DOUBLE"
+        for m in ROLLING_METRICS
+    )
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {tables['values']} (
+            window_seconds INTEGER,
+            station_key INTEGER,
+            Datetime TIMESTAMP,
+            {columns},
+            PRIMARY KEY (window_seconds, station_key, Datetime)
+        );
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {tables['windows']} (
+            window_seconds INTEGER PRIMARY KEY
+        );
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {tables['pending']} (
+            window_seconds INTEGER,
+            station_key INTEGER,
+            lo TIMESTAMP,
+            hi TIMESTAMP
+        );
+        """,
+    ]
+
+
+def rolling_columns(metrics) -> str:
+    """
+    Per-metric columns of a windowed reading: its value, the window
+    avg/min/max and the baseline (window without the reading) avg/std.
+    """
+    return ", ".join(
+        f"{m}, {m}_avg, {m}_min, {m}_max, {m}_base_avg, {m}_base_std"
+        for m in metrics
+    )
+
+
+def _window_columns(metrics) -> str:
+    return ", ".join(
+        f"{m}, avg({m}) OVER w AS {m}_avg, min({m}) OVER w AS {m}_min, "
+        f"max({m}) OVER w AS {m}_max, avg({m}) OVER b AS {m}_base_avg, "
+        f"stddev_samp({m}) OVER b AS {m}_base_std"
+        for m in metrics
+    )
+
+
+def windowed_sql(raw: str, metrics, seconds: int, where=None, qualify=None) -> str:
+    """
+    Readings of `raw` with their trailing window statistics. `where` must
+    keep the window's lookback rows, `qualify` then drops them after the
+    window functions have seen them.
+    """
+    where = f"WHERE {' AND '.join(where)}" if where else ""
+    qualify = f"QUALIFY {' AND '.join(qualify)}" if qualify else ""
+    frame = (
+        "PARTITION BY station_key ORDER BY Datetime "
+        f"RANGE BETWEEN INTERVAL '{seconds} seconds' PRECEDING AND CURRENT ROW"
+    )
+    return f"""
+        SELECT station_key, Datetime, {_window_columns(metrics)}
+        FROM {raw}
+        {where}
+        WINDOW w AS ({frame}), b AS ({frame} EXCLUDE CURRENT ROW)
+        {qualify}
+    """
+
+
+def record_pending_sql(table_name: str, source: str) -> str:
+    """
+    Log the station/time range of a just written batch for every
+    materialized window. `source` may hold hour-truncated Datetimes.
+    """
+    tables = rolling_tables(table_name)
+    return f"""
+        INSERT INTO {tables['pending']}
+        SELECT w.window_seconds, b.station_key, b.lo, b.hi
+        FROM (
+            SELECT station_key, min(Datetime) AS lo,
+                max(Datetime) + INTERVAL 1 HOUR AS hi
+            FROM {source}
+            GROUP BY station_key
+        ) b
+        CROSS JOIN {tables['windows']} w
+    """
+
+
+def refresh_rolling_sql(table_name: str, seconds: int, raw: str, full: bool) -> list:
+    """
+    Statements bringing one materialized window up to date: everything
+    when `full`, otherwise the readings from each touched station's
+    oldest pending write up to a window past its newest one.
+    """
+    tables = rolling_tables(table_name)
+    rolling, pending = tables["values"], tables["pending"]
+    columns = (
+        f"window_seconds, station_key, Datetime, {rolling_columns(ROLLING_METRICS)}"
+    )
+    if full:
+        return [
+            f"DELETE FROM {rolling} WHERE window_seconds = {seconds}",
+            f"""
+            INSERT INTO {rolling} ({columns})
+            SELECT {seconds}, * FROM ({windowed_sql(raw, ROLLING_METRICS, seconds)})
+            """,
+            f"DELETE FROM {pending} WHERE window_seconds = {seconds}",
+            f"INSERT OR IGNORE INTO {tables['windows']} VALUES ({seconds})",
+        ]
+
+    span = f"INTERVAL '{seconds} seconds'"
+    windowed = windowed_sql(
+        f"(SELECT r.* FROM {raw} r JOIN rolling_touched t USING (station_key) "
+        f"WHERE r.Datetime >= t.lo - {span} AND r.Datetime <= t.hi)",
+        ROLLING_METRICS,
+        seconds,
+    )
+    return [
+        f"""
+        CREATE OR REPLACE TEMP TABLE rolling_touched AS
+        SELECT station_key, min(lo) AS lo, max(hi) + {span} AS hi
+        FROM {pending}
+        WHERE window_seconds = {seconds}
+        GROUP BY station_key
+        """,
+        f"""
+        DELETE FROM {rolling}
+        USING rolling_touched t
+        WHERE {rolling}.window_seconds = {seconds}
+            AND {rolling}.station_key = t.station_key
+            AND {rolling}.Datetime BETWEEN t.lo AND t.hi
+        """,
+        f"""
+        INSERT INTO {rolling} ({columns})
+        SELECT {seconds}, q.* FROM ({windowed}) q
+        JOIN rolling_touched t USING (station_key)
+        WHERE q.Datetime BETWEEN t.lo AND t.hi
+        """,
+        f"DELETE FROM {pending} WHERE window_seconds = {seconds}",
+        "DROP TABLE rolling_touched",
+    ]
+
+
+def rolling_query(windowed: str, metrics, z_threshold: float, anomalies_only: bool):
+    """
+    Moving average, min/max, z-score and anomaly flag per metric of the
+    windowed readings, labelled with the station columns. A reading with
+    fewer than two others in its window has no z-score and is no anomaly.
+    """
+    columns = []
+    for m in metrics:
+        z = f"({m} - {m}_base_avg) / NULLIF({m}_base_std, 0)"
+        columns.append(
+            f"{m}, {m}_avg, {m}_min, {m}_max, {z} AS {m}_zscore, "
+            f"coalesce(abs({z}) >= {z_threshold}, false) AS {m}_anomaly"
+        )
+    query = f"SELECT station_key, Datetime, {', '.join(columns)} FROM ({windowed})"
+    if anomalies_only:
+        flags = " OR ".join(f"{m}_anomaly" for m in metrics)
+        query = f"SELECT * FROM ({query}) WHERE {flags}"
+    return with_station_columns(query, order_by="station_id, Datetime")
@@ -0,0 +1,262 @@
+"""
+Pre-aggregated hourly/daily rollups of the weather table.
+
+Each rollup row holds count/sum/min/max per metric for one station key and
+bucket. Stat queries are answered from the coarsest rollup covering the
+requested range, reading raw rows only for partial buckets at the edges.
+Writes merge the partials of inserted rows into their buckets; only the
+buckets of overwritten readings are recomputed from the raw rows.
+"""
+
+import pandas as pd
+
+from app.db.stations import with_station_columns
+
+ROLLUP_METRICS = ["Temperature", "Humidity", "WindSpeed"]
+
+# (grain, rollup table suffix, pandas frequency), coarsest first
+ROLLUP_GRAINS = [("day", "daily", "D"), ("hour", "hourly", "H")]
+
+# Stats recombined from the count/sum/min/max partials
+ROLLUP_STATS = {
+    "avg": "sum({m}_sum) / NULLIF(sum({m}_count), 0)",
+    "sum": "sum({m}_sum)",
+    "min": "min({m}_min)",
+    "max": "max({m}_max)",
+    "count": "CAST(sum({m}_count) AS BIGINT)",
+}
+
+# Column types matching what the raw aggregates return
+VALUE_TYPES = {"Temperature": "DOUBLE", "Humidity": "INTEGER", "WindSpeed": "DOUBLE"}
+SUM_TYPES = {"Temperature": "DOUBLE", "Humidity": "HUGEINT", "WindSpeed": "DOUBLE"}
+
+
+def rollup_tables(table_name: str) -> dict:
+    return {grain: f"{table_name}_{suffix}" for grain, suffix, _ in ROLLUP_GRAINS}
+
+
+def create_rollup_sql(table_name: str, grain: str) -> str:
+    columns = ",\n".join(
+        f"{m}_count BIGINT, {m}_sum {SUM_TYPES[m]}, "
+        f"{m}_min {VALUE_TYPES[m]}, {m}_max {VALUE_TYPES[m]}"
+        for m in ROLLUP_METRICS
+    )
+    return f"""
+        CREATE TABLE IF NOT EXISTS {rollup_tables(table_name)[grain]} (
+            station_key INTEGER,
+            bucket TIMESTAMP,
+            {columns},
+            PRIMARY KEY (station_key, bucket)
+        );
+    """
+
+
+def _partials(metrics, alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(
+        f"count({prefix}{m}) AS {m}_count, sum({prefix}{m}) AS {m}_sum, "
+        f"min({prefix}{m}) AS {m}_min, max({prefix}{m}) AS {m}_max"
+        for m in metrics
+    )
+
+
+def refresh_rollup_sql(
+    table_name: str, grain: str, source: str = None, raw: str = None
+) -> list:
+    """
+    Statements recomputing the rollup buckets touched by the rows in `source`
+    from the raw rows (every bucket when `source` is None). Recomputing
+    whole buckets keeps min/max exact even when upserts overwrite values.
+    `raw` overrides the raw relation, e.g. hot rows plus the cold archive.
+    """
+    rollup = rollup_tables(table_name)[grain]
+    raw = raw or table_name
+    if source is None:
+        return [
+            f"DELETE FROM {rollup}",
+            f"""
+            INSERT INTO {rollup}
+            SELECT station_key, date_trunc('{grain}', Datetime) AS bucket,
+                {_partials(ROLLUP_METRICS)}
+            FROM {raw}
+            GROUP BY station_key, bucket
+            """,
+        ]
+
+    touched = (
+        f"(SELECT DISTINCT station_key, date_trunc('{grain}', Datetime) AS bucket "
+        f"FROM {source})"
+    )
+    return [
+        f"""
+        DELETE FROM {rollup}
+        USING {touched} t
+        WHERE {rollup}.station_key = t.station_key AND {rollup}.bucket = t.bucket
+        """,
+        f"""
+        INSERT INTO {rollup}
+        SELECT w.station_key, t.bucket,
+            {_partials(ROLLUP_METRICS, alias="w")}
+        FROM {raw} w
+        JOIN {touched} t
+        ON w.station_key = t.station_key
+            AND date_trunc('{grain}', w.Datetime) = t.bucket
+        WHERE w.Datetime >= (SELECT date_trunc('{grain}', min(Datetime)) FROM {source})
+            AND w.Datetime < (SELECT date_trunc('{grain}', max(Datetime)) FROM {source})
+                + INTERVAL 1 {grain}
+        GROUP BY w.station_key, t.bucket
+        """,
+    ]
+
+
+def merge_rollup_sql(
+    table_name: str, grain: str, source: str, skip: str = None
+) -> str:
+    """
+    Fold the partials of newly inserted rows in `source` into the rollup
+    buckets, creating missing ones. Count/sum/min/max of appended rows
+    merge exactly, so inserts never re-read raw rows. Buckets holding a
+    `skip` row (overwrites, recomputed from raw instead) are left alone.
+    """
+    rollup = rollup_tables(table_name)[grain]
+    bucket = f"date_trunc('{grain}', n.Datetime)"
+    where = ""
+    if skip:
+        where = f"""
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {skip} k
+                WHERE k.station_key = n.station_key
+                    AND date_trunc('{grain}', k.Datetime) = {bucket}
+            )
+        """
+    updates = ",\n".join(
+        f"{m}_count = {rollup}.{m}_count + excluded.{m}_count, "
+        f"{m}_sum = coalesce({rollup}.{m}_sum + excluded.{m}_sum, "
+        f"{rollup}.{m}_sum, excluded.{m}_sum), "
+        f"{m}_min = least({rollup}.{m}_min, excluded.{m}_min), "
+        f"{m}_max = greatest({rollup}.{m}_max, excluded.{m}_max)"
+        for m in ROLLUP_METRICS
+    )
+    return f"""
+        INSERT INTO {rollup}
+        SELECT n.station_key, {bucket} AS bucket,
+            {_partials(ROLLUP_METRICS, alias="n")}
+        FROM {source} n
+        {where}
+        GROUP BY n.station_key, bucket
+        ON CONFLICT (station_key, bucket) DO UPDATE SET {updates}
+    """
+
+
+def plan_segments(start, end, grains=ROLLUP_GRAINS) -> list:
+    """
+    Split the closed range [start, end] into (source, lo, hi, hi_closed)
+    pieces: whole days, then whole hours, then raw rows for what is left.
+    """
+    segments = []
+
+    def split(lo, hi, hi_closed, grains):
+        if lo > hi or (lo == hi and not hi_closed):
+            return
+        if not grains:
+            segments.append(("raw", lo, hi, hi_closed))
+            return
+        (grain, _, freq), finer = grains[0], grains[1:]
+        first, last = lo.ceil(freq), hi.floor(freq)
+        if first >= last:
+            split(lo, hi, hi_closed, finer)
+            return
+        split(lo, first, False, finer)
+        segments.append((grain, first, last, False))
+        split(last, hi, hi_closed, finer)
+
+    split(pd.Timestamp(start), pd.Timestamp(end), True, list(grains))
+    return segments
+
+
+def _segment_union(table_name, metrics, segments, filters, raw, bucketed=False):
+    """
+    UNION ALL of count/sum/min/max partials over every segment. With
+    `bucketed` each part keeps its hour/day as a `ts` column.
+    """
+    tables = rollup_tables(table_name)
+    extra = "".join(f" AND {f}" for f in filters)
+    columns = ", ".join(
+        f"{m}_{part}" for m in metrics for part in ("count", "sum", "min", "max")
+    )
+    keys = "station_key"
+    parts = []
+    for source, lo, hi, hi_closed in segments:
+        if source == "raw":
+            upper = "<=" if hi_closed else "<"
+            ts = ", date_trunc('hour', Datetime) AS ts" if bucketed else ""
+            parts.append(
+                f"SELECT {keys}{ts}, {_partials(metrics)} "
+                f"FROM {raw} "
+                f"WHERE Datetime >= '{lo}' AND Datetime {upper} '{hi}'{extra} "
+                f"GROUP BY {keys}{', ts' if bucketed else ''}"
+            )
+        else:
+            ts = ", bucket AS ts" if bucketed else ""
+            parts.append(
+                f"SELECT {keys}{ts}, {columns} "
+                f"FROM {tables[source]} "
+                f"WHERE bucket >= '{lo}' AND bucket < '{hi}'{extra}"
+            )
+    return "\n            UNION ALL\n            ".join(parts)
+
+
+def rollup_stats_query(table_name, metrics, stats, start, end, filters, raw=None):
+    """
+    Build the stat query over rollups plus raw edge rows, or return None when
+    no whole bucket falls in the range (the raw query is cheaper then).
+    """
+    raw = raw or table_name
+    segments = plan_segments(start, end)
+    if all(source == "raw" for source, *_ in segments):
+        return None
+
+    aggregates = ", ".join(
+        f"{ROLLUP_STATS[s].format(m=m)} AS {s}_{m}" for m in metrics for s in stats
+    )
+    union = _segment_union(table_name, metrics, segments, filters, raw)
+    return with_station_columns(
+        f"""
+        SELECT station_key, {aggregates}
+        FROM (
+            {union}
+        )
+        GROUP BY station_key
+        """
+    )
+
+
+def rollup_timeseries_query(
+    table_name, metrics, stats, interval, start, end, filters, raw=None
+):
+    """
+    Per-station series bucketed by `interval` (hour/day/week), built from
+    the rollups whose grain nests inside the interval plus raw edge rows.
+    Returns None when no whole rollup bucket falls in the range.
+    """
+    raw = raw or table_name
+    grains = [g for g in ROLLUP_GRAINS if interval != "hour" or g[0] == "hour"]
+    segments = plan_segments(start, end, grains)
+    if all(source == "raw" for source, *_ in segments):
+        return None
+
+    aggregates = ", ".join(
+        f"{ROLLUP_STATS[s].format(m=m)} AS {s}_{m}" for m in metrics for s in stats
+    )
+    union = _segment_union(table_name, metrics, segments, filters, raw, bucketed=True)
+    return with_station_columns(
+        f"""
+        SELECT station_key,
+            time_bucket(INTERVAL '1 {interval}', ts) AS bucket, {aggregates}
+        FROM (
+            {union}
+        )
+        GROUP BY station_key, time_bucket(INTERVAL '1 {interval}', ts)
+        """,
+        order_by="station_id, bucket",
+    )
@@ -0,0 +1,140 @@
+"""
+Slow-query log: queries over a threshold are kept in a ring buffer with
+their DuckDB plan and EXPLAIN ANALYZE profile, grouped by query shape.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(sql: str):
+    """
+    Split a query into its shape (literals replaced by ?, IN lists folded,
+    whitespace collapsed) and the literal parameters that were removed.
+    """
+    params = [m.group(0).strip("'") for m in _LITERAL.finditer(sql)]
+    shape = _LITERAL.sub("?", sql)
+    shape = _IN_LIST.sub("(?, ...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip(), params
+
+
+class SlowQueryLog:
+    """
+    Ring buffer of the last `size` queries slower than `threshold_ms`.
+
+    Profiles are captured by re-running the query under EXPLAIN ANALYZE on
+    a cursor of its own, in a background thread by default so the slow
+    request is not made slower; one capture runs at a time.
+    """
+
+    def __init__(
+        self, threshold_ms: float = 500, size: int = 50, background: bool = True
+    ):
+        self.threshold_ms = threshold_ms
+        self.background = background
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._capturing = threading.Semaphore(1)
+
+    def observe(
+        self, kind: str, sql: str, seconds: float, connections=None, params=None
+    ):
+        elapsed_ms = seconds * 1000
+        if self.threshold_ms is None or elapsed_ms < self.threshold_ms:
+            return None
+
+        shape, literals = normalize_query(sql)
+        entry = {
+            "kind": kind,
+            "shape": shape,
+            "params": literals,
+            "bound": params or {},
+            "elapsed_ms": round(elapsed_ms, 2),
+            "at": datetime.utcnow().isoformat(),
+            "plan": None,
+            "profile": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        logger.warning(f"Slow {kind} query ({elapsed_ms:.0f} ms): {shape}")
+
+        if connections is not None and self._capturing.acquire(blocking=False):
+            args = (entry, sql, params, connections.dedicated_cursor())
+            if self.background:
+                threading.Thread(
+                    target=self._capture, args=args, name="slow-query-profile",
+                    daemon=True,
+                ).start()
+            else:
+                self._capture(*args)
+        return entry
+
+    def _capture(self, entry, sql, params, cursor):
+        try:
+            plan = cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params).fetchall()
+            entry["plan"] = json.loads(plan[0][1])
+            start = time.perf_counter()
+            profile = cursor.execute(
+                f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params
+            ).fetchall()
+            entry["profile"] = json.loads(profile[0][1])
+            entry["profiled_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        except Exception as e:
+            entry["profile_error"] = str(e)
+        finally:
+            cursor.close()
+            self._capturing.release()
+
+    def entries(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def top(self, n: int = 10) -> list:
+        """
+        Slowest query shapes first, with how often they were slow and the
+        literals, bound parameters and profile of their slowest run.
+        """
+        shapes = {}
+        for entry in self.entries():
+            summary = shapes.setdefault(
+                (entry["kind"], entry["shape"]),
+                {"kind": entry["kind"], "shape": entry["shape"], "count": 0,
+                 "total_ms": 0.0, "slowest": entry},
+            )
+            summary["count"] += 1
+            summary["total_ms"] += entry["elapsed_ms"]
+            if entry["elapsed_ms"] > summary["slowest"]["elapsed_ms"]:
+                summary["slowest"] = entry
+
+        ranked = sorted(
+            shapes.values(), key=lambda s: s["slowest"]["elapsed_ms"], reverse=True
+        )
+        return [
+            {
+                "kind": s["kind"],
+                "shape": s["shape"],
+                "count": s["count"],
+                "max_ms": s["slowest"]["elapsed_ms"],
+                "avg_ms": round(s["total_ms"] / s["count"], 2),
+                "params": s["slowest"]["params"],
+                "bound": s["slowest"]["bound"],
+                "profile": s["slowest"]["profile"],
+            }
+            for s in ranked[:n]
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,128 @@
+"""
+Read-only snapshots of the weather database for multi-process serving.
+
+DuckDB lets one process open a database file for writing, and no other
+process can open it at the same time, not even read-only. The writer
+process copies its database to <snapshot_dir>/<name>-<ns>.db and then
+points <snapshot_dir>/CURRENT at the copy. Reader processes open the
+snapshot CURRENT names read-only and move to each newer one.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+
+CURRENT_FILE = "CURRENT"
+COPY_BATCH_ROWS = 100_000
+
+
+def copy_database(cursor, path: Path, batch_rows: int = COPY_BATCH_ROWS) -> int:
+    """
+    Copy the sequences and tables of `cursor`'s database to a new file,
+    as of one transaction, streaming each table as Arrow record batches.
+
+    The file is written by a DuckDB instance of its own rather than an
+    ATTACH: a detached file stays locked while any cursor of the writer
+    holds an older transaction open. Returns the number of tables copied.
+    """
+    target = duckdb.connect(str(path))
+    try:
+        cursor.begin()
+        try:
+            for (sql,) in cursor.execute(
+                "SELECT sql FROM duckdb_sequences() "
+                "WHERE database_name = current_database()"
+            ).fetchall():
+                target.execute(sql)
+            tables = cursor.execute(
+                "SELECT table_name, sql FROM duckdb_tables() "
+                "WHERE database_name = current_database() ORDER BY table_name"
+            ).fetchall()
+            for name, sql in tables:
+                target.execute(sql)
+                batches = cursor.execute(f"SELECT * FROM {name}").fetch_record_batch(
+                    batch_rows
+                )
+                target.register("snapshot_batches", batches)
+                target.execute(f"INSERT INTO {name} SELECT * FROM snapshot_batches")
+                target.unregister("snapshot_batches")
+        finally:
+            cursor.rollback()
+        target.execute("CHECKPOINT")
+    finally:
+        target.close()
+    return len(tables)
+
+
+def new_snapshot_path(directory, stem: str) -> Path:
+    return Path(directory) / f"{stem}-{time.time_ns()}.db"
+
+
+def set_current(directory, path: Path, **metadata):
+    """
+    Point CURRENT at `path`. The file is written aside and renamed, so a
+    reader never sees half of it.
+    """
+    current = Path(directory) / CURRENT_FILE
+    body = {
+        "snapshot": Path(path).name,
+        "published_at": datetime.now(timezone.utc).isoformat(),
+        **metadata,
+    }
+    tmp = current.with_suffix(".tmp")
+    tmp.write_text(json.dumps(body))
+    os.replace(tmp, current)
+
+
+def current_snapshot(directory):
+    """
+    CURRENT's metadata with the snapshot's full `path`, or None before the
+    first snapshot is published.
+    """
+    try:
+        body = json.loads((Path(directory) / CURRENT_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    return {**body, "path": str(Path(directory) / body["snapshot"])}
+
+
+def wait_for_snapshot(directory, timeout: float, poll_seconds: float = 0.5):
+    """
+    Block until a snapshot is published, for readers starting before the
+    writer. Raises RuntimeError after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        snapshot = current_snapshot(directory)
+        if snapshot is not None:
+            return snapshot
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"❌ No snapshot in '{directory}' after {timeout}s, is the writer "
+                "process running?"
+            )
+        time.sleep(poll_seconds)
+
+
+def prune_snapshots(directory, keep: int) -> list:
+    """
+    Delete all but the `keep` newest snapshots, never the current one.
+    Readers still on a deleted file keep it open until they move on.
+    """
+    current = current_snapshot(directory)
+    current_name = current["snapshot"] if current else None
+    snapshots = sorted(
+        Path(directory).glob("*.db"), key=lambda p: p.stat().st_mtime, reverse=True
+    )
+    removed = []
+    for path in snapshots[keep:]:
+        if path.name == current_name:
+            continue
+        for stale in (path, path.with_name(path.name + ".wal")):
+            stale.unlink(missing_ok=True)
+        removed.append(path.name)
+    return removed
@@ -0,0 +1,122 @@
+"""
+In-memory grid index over station coordinates.
+
+Stations are bucketed into fixed lat/lon cells, so a point/radius or
+bounding box selection only looks at the few cells it overlaps and
+resolves to station keys before any DuckDB query runs.
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# About 28 km north-south, a city-sized cell
+DEFAULT_CELL_DEG = 0.25
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km; NumPy arrays broadcast.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float):
+    """
+    (south, west, north, east) box enclosing the circle. `west` > `east`
+    when the box crosses the antimeridian.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if north >= 90 or south <= -90 or cos_lat <= 0:
+        return south, -180.0, north, 180.0
+    dlon = dlat / cos_lat
+    if dlon >= 180:
+        return south, -180.0, north, 180.0
+    west = (lon - dlon + 180) % 360 - 180
+    east = (lon + dlon + 180) % 360 - 180
+    return south, west, north, east
+
+
+class StationGrid:
+    """
+    Station keys bucketed by coordinate cell. Stations without coordinates
+    are left out, so they never match a spatial selection.
+    """
+
+    def __init__(self, keys, lats, lons, cell_deg: float = DEFAULT_CELL_DEG):
+        keys = np.asarray(keys)
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        located = ~(np.isnan(lats) | np.isnan(lons))
+        self.cell_deg = cell_deg
+        self.keys, self.lats, self.lons = keys[located], lats[located], lons[located]
+
+        cells = defaultdict(list)
+        rows = np.floor(self.lats / cell_deg).astype(int)
+        cols = np.floor(self.lons / cell_deg).astype(int)
+        for position, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            cells[cell].append(position)
+        self._cells = {cell: np.array(p) for cell, p in cells.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _cell(self, value: float) -> int:
+        return math.floor(value / self.cell_deg)
+
+    def _candidates(self, south, west, north, east) -> np.ndarray:
+        """
+        Positions of the stations in every cell overlapping the box.
+        """
+        if west > east:
+            return np.concatenate(
+                [
+                    self._candidates(south, west, north, 180.0),
+                    self._candidates(south, -180.0, north, east),
+                ]
+            )
+        rows = range(self._cell(south), self._cell(north) + 1)
+        cols = range(self._cell(west), self._cell(east) + 1)
+        if len(rows) * len(cols) > len(self._cells):
+            # A box wider than the occupied cells, scan the cells instead
+            found = [
+                p for (r, c), p in self._cells.items() if r in rows and c in cols
+            ]
+        else:
+            found = [
+                self._cells[(r, c)] for r in rows for c in cols if (r, c) in self._cells
+            ]
+        return np.concatenate(found) if found else np.array([], dtype=int)
+
+    def within_bbox(self, south, west, north, east) -> list:
+        """
+        Keys of the stations inside [south, west, north, east], ordered by
+        key. `west` > `east` selects across the antimeridian.
+        """
+        positions = self._candidates(south, west, north, east)
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= south) & (lats <= north)
+        if west > east:
+            inside &= (lons >= west) | (lons <= east)
+        else:
+            inside &= (lons >= west) & (lons <= east)
+        return sorted(self.keys[positions[inside]].tolist())
+
+    def within_radius(self, lat, lon, radius_km) -> list:
+        """
+        Keys of the stations within `radius_km` of the point, nearest first.
+        """
+        positions = self._candidates(*radius_bbox(lat, lon, radius_km))
+        distance = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+        inside = distance <= radius_km
+        order = np.argsort(distance[inside], kind="stable")
+        return self.keys[positions[inside][order]].tolist()
@@ -0,0 +1,129 @@
+"""
+Station dimension table.
+
+Every station gets one row with an integer surrogate key (station_key)
+that the weather table, its rollups and the latest readings reference in
+place of the repeated station_id/city/country strings. Coordinates are
+parsed from CITY_lat_lon station ids on first sight and can be corrected,
+along with the name and elevation, from a station metadata file.
+"""
+
+STATIONS_TABLE = "stations"
+STATION_KEY_SEQUENCE = "stations_key_seq"
+
+# Columns of incoming (denormalized) rows that belong to the station
+STATION_COLUMNS = ["station_id", "city", "country"]
+# Descriptive columns that can be loaded from station metadata
+STATION_METADATA = ["name", "city", "country", "lat", "lon", "elevation"]
+
+# Per-reading columns of the weather fact table, after the station key
+READING_COLUMNS = [
+    "Datetime",
+    "Temperature",
+    "Humidity",
+    "WindSpeed",
+    "WeatherDescription",
+]
+FACT_COLUMNS = ["station_key"] + READING_COLUMNS
+
+
+def create_stations_sql() -> list:
+    return [
+        f"CREATE SEQUENCE IF NOT EXISTS {STATION_KEY_SEQUENCE}",
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATIONS_TABLE} (
+            station_key INTEGER PRIMARY KEY DEFAULT nextval('{STATION_KEY_SEQUENCE}'),
+            station_id VARCHAR NOT NULL UNIQUE,
+            name VARCHAR,
+            city VARCHAR,
+            country VARCHAR,
+            lat DOUBLE,
+            lon DOUBLE,
+            elevation DOUBLE
+        );
+        """,
+    ]
+
+
+def create_weather_sql(table_name: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            station_key INTEGER,
+            Datetime TIMESTAMP,
+            Temperature DOUBLE,
+            Humidity INTEGER,
+            WindSpeed DOUBLE,
+            WeatherDescription VARCHAR,
+            UNIQUE(station_key, Datetime)
+        );
+    """
+
+
+def register_stations_sql(source: str) -> str:
+    """
+    Add the stations of `source` (rows with station_id/city/country) that
+    are not registered yet. Coordinates come from CITY_lat_lon ids.
+    """
+    return f"""
+        INSERT INTO {STATIONS_TABLE} (station_id, name, city, country, lat, lon)
+        SELECT station_id, station_id, city, country,
+            TRY_CAST(split_part(station_id, '_', -2) AS DOUBLE),
+            TRY_CAST(split_part(station_id, '_', -1) AS DOUBLE)
+        FROM (
+            SELECT DISTINCT ON (station_id) station_id, city, country
+            FROM {source}
+            WHERE station_id IS NOT NULL
+        ) src
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {STATIONS_TABLE} s WHERE s.station_id = src.station_id
+        )
+    """
+
+
+def keyed_rows_sql(source: str) -> str:
+    """
+    Denormalized rows of `source` as fact rows, station_id swapped for the
+    registered station_key.
+    """
+    readings = ", ".join(f"src.{col}" for col in READING_COLUMNS)
+    return f"""
+        (SELECT s.station_key, {readings}
+        FROM {source} src
+        JOIN {STATIONS_TABLE} s ON s.station_id = src.station_id)
+    """
+
+
+def labelled_rows_sql(source: str) -> str:
+    """
+    Fact rows of `source` with the station_id/city/country strings joined
+    back in, the layout of CSV files and the Parquet archive.
+    """
+    readings = ", ".join(f"w.{col}" for col in READING_COLUMNS)
+    return f"""
+        (SELECT s.station_id, s.city, s.country, {readings}
+        FROM {source} w
+        JOIN {STATIONS_TABLE} s ON s.station_key = w.station_key)
+    """
+
+
+def with_station_columns(query: str, order_by: str = "station_id") -> str:
+    """
+    Swap the station_key of a per-station result for station_id, city and
+    country, which lead the columns as before the dimension table existed.
+    """
+    return f"""
+        SELECT s.station_id, s.city, s.country, q.* EXCLUDE (station_key)
+        FROM ({query}) q
+        JOIN {STATIONS_TABLE} s ON s.station_key = q.station_key
+        ORDER BY {order_by}
+    """
+
+
+def station_filter_sql(conditions) -> str:
+    """
+    Filter on station_key for conditions over the stations table.
+    """
+    return (
+        f"station_key IN (SELECT station_key FROM {STATIONS_TABLE} "
+        f"WHERE {' AND '.join(conditions)})"
+    )
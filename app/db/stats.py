@@ -0,0 +1,36 @@
+"""
+SQL for every statistic the stat/timeseries queries support, as DuckDB
+aggregate templates over a metric column `{m}`.
+"""
+
+STAT_SQL = {
+    "avg": "avg({m})",
+    "min": "min({m})",
+    "max": "max({m})",
+    "sum": "sum({m})",
+    "count": "count({m})",
+    "stddev": "stddev_samp({m})",
+    "variance": "var_samp({m})",
+    "median": "quantile_cont({m}, 0.5)",
+    "p90": "quantile_cont({m}, 0.9)",
+    "p95": "quantile_cont({m}, 0.95)",
+    "p99": "quantile_cont({m}, 0.99)",
+}
+
+# Approximate mode swaps exact quantiles (which sort every value in a
+# group) for DuckDB's T-Digest sketch, bounded in memory on any range
+APPROX_STAT_SQL = {
+    "median": "approx_quantile({m}, 0.5)",
+    "p90": "approx_quantile({m}, 0.9)",
+    "p95": "approx_quantile({m}, 0.95)",
+    "p99": "approx_quantile({m}, 0.99)",
+}
+
+STAT_MODES = ["exact", "approx"]
+
+
+def stat_sql(stat: str, metric: str, mode: str = "exact") -> str:
+    template = STAT_SQL[stat]
+    if mode == "approx":
+        template = APPROX_STAT_SQL.get(stat, template)
+    return template.format(m=metric)
@@ -1,10 +1,21 @@
 import logging
+import threading
 import time
 
 from fastapi import FastAPI, Request
 
 from app.api.routes import router
-from app.core.config import db, shutdown_db
+from app.core.metrics import REQUEST_LATENCY
+from app.core.config import (
+    LIVE_REFRESH_ENABLED,
+    READ_ONLY,
+    STARTUP_INGEST_BACKGROUND,
+    db,
+    refresher,
+    scheduler,
+    shutdown_db,
+    snapshots,
+)
 from utils.logger_service import get_logger
 
 logger = get_logger(__name__)
@@ -15,24 +26,55 @@ from pathlib import Path
 app.include_router(router)
 
 
+def ingest_data_dir(csv_files):
+    """
+    Ingest new or modified CSVs, files recorded in the manifest are skipped.
+    """
+    for csv_file in csv_files:
+        try:
+            inserted = db.insert_csv_if_changed(str(csv_file))
+            if inserted is not None:
+                logger.info(f"Successfully ingested: {csv_file.name}")
+        except Exception as e:
+            logger.error(f"Failed to ingest {csv_file.name}: {e}")
+
+
 @app.on_event("startup")
 def startup():
     logger.info("Starting up the Weather Metrics API...")
 
+    if READ_ONLY:
+        # Ingestion and the live refresh belong to the writer process
+        snapshots.start()
+        return
+
     data_dir = Path(__file__).resolve().parent.parent / "data"
     csv_files = list(data_dir.glob("*.csv"))
 
     if not csv_files:
         logger.warning("No CSV files found in the data/ directory.")
-        return
 
-    for csv_file in csv_files:
-        try:
-            logger.info(f"Ingesting {csv_file.name} into DuckDB...")
-            db.insert_csv(str(csv_file))
-            logger.info(f"Successfully ingested: {csv_file.name}")
-        except Exception as e:
-            logger.error(f"Failed to ingest {csv_file.name}: {e}")
+    if STARTUP_INGEST_BACKGROUND:
+        # Serve reads straight away, new files land when they are ingested
+        threading.Thread(
+            target=ingest_data_dir,
+            args=(csv_files,),
+            name="startup-ingest",
+            daemon=True,
+        ).start()
+    else:
+        ingest_data_dir(csv_files)
+
+    # Live OpenWeather data is kept fresh off the request path
+    if LIVE_REFRESH_ENABLED:
+        if scheduler is not None:
+            scheduler.start()
+        else:
+            refresher.start()
+
+    # Writer process: read-only workers serve what it publishes
+    if snapshots is not None:
+        snapshots.start()
 
 
 # Basic middleware for logging request processing time
@@ -40,9 +82,19 @@ def startup():
 async def log_request_time(request: Request, call_next):
     start = time.time()
     response = await call_next(request)
-    process_time = round((time.time() - start) * 1000, 2)
+    elapsed = time.time() - start
+    process_time = round(elapsed * 1000, 2)
     logging.info(f"{request.method} {request.url.path} - {process_time} ms")
 
+    # Label by route template, not the raw path, to bound cardinality
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(
+        elapsed,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+
     # Optional: Add header to response for access in Streamlit
     response.headers["X-Process-Time-ms"] = str(process_time)
     return response
@@ -1,18 +1,129 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
+from app.db.rolling import parse_window
+from app.db.stats import STAT_SQL
 
-class MetricStatRequest(BaseModel):
-    metrics: List[str] = Field(..., example=["Temperature", "Humidity"])
-    stat: str = Field(..., example="avg")
+
+def _supported_stats(stats):
+    unsupported = [s for s in stats if s not in STAT_SQL]
+    if unsupported:
+        raise ValueError(
+            f"Unsupported stat(s) {unsupported}, expected any of {list(STAT_SQL)}"
+        )
+    return stats
+
+
+class StationArea(BaseModel):
+    """
+    Optional selection of stations by location: within `radius_km` of
+    `lat`/`lon`, and/or inside `bbox` given as [south, west, north, east].
+    """
+
+    lat: Optional[float] = Field(None, ge=-90, le=90, example=53.35)
+    lon: Optional[float] = Field(None, ge=-180, le=180, example=-6.26)
+    radius_km: Optional[float] = Field(None, gt=0, example=25)
+    bbox: Optional[List[float]] = Field(
+        None, min_length=4, max_length=4, example=[53.0, -6.6, 53.6, -6.0]
+    )
+
+    @model_validator(mode="after")
+    def _area_complete(self):
+        point = (self.lat, self.lon, self.radius_km)
+        if None in point and any(v is not None for v in point):
+            raise ValueError("lat, lon and radius_km must be given together")
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            if not (-90 <= south <= north <= 90):
+                raise ValueError("bbox must be [south, west, north, east]")
+            if not (-180 <= west <= 180 and -180 <= east <= 180):
+                raise ValueError("bbox longitudes must be within [-180, 180]")
+        return self
+
+    @property
+    def near(self):
+        return None if self.radius_km is None else (self.lat, self.lon, self.radius_km)
+
+
+class MetricStatRequest(StationArea):
+    metrics: List[str] = Field(..., min_length=1, example=["Temperature", "Humidity"])
+    stat: List[str] = Field(..., min_length=1, example=["avg", "p95"])
     start_date: Optional[date] = Field(None, example="2025-03-18")
     end_date: Optional[date] = Field(None, example="2025-03-21")
     city: Optional[str] = Field(None, example="Dublin")
+    station_ids: Optional[List[str]] = Field(None, example=["DUBLIN_53.33_-6.25"])
+    # "approx" answers median/percentiles from a quantile sketch
+    mode: Literal["exact", "approx"] = Field("exact", example="approx")
+
+    @field_validator("stat", mode="before")
+    @classmethod
+    def _stat_as_list(cls, value):
+        # A single stat ("avg") is still accepted for older clients
+        if isinstance(value, str):
+            return [value]
+        return value
+
+    @field_validator("stat")
+    @classmethod
+    def _stat_supported(cls, value):
+        return _supported_stats(value)
+
+
+class TimeseriesRequest(StationArea):
+    metrics: List[str] = Field(..., min_length=1, example=["Temperature"])
+    stat: List[str] = Field(["avg"], min_length=1, example=["avg"])
+    interval: Literal["hour", "day", "week"] = Field("day", example="hour")
+    start_date: Optional[date] = Field(None, example="2025-01-01")
+    end_date: Optional[date] = Field(None, example="2025-03-31")
+    city: Optional[str] = Field(None, example="Dublin")
+    station_ids: Optional[List[str]] = Field(None, example=["DUBLIN_53.33_-6.25"])
+    # LTTB downsampling target per station series, None keeps every bucket
+    max_points: Optional[int] = Field(None, ge=3, example=300)
+    mode: Literal["exact", "approx"] = Field("exact", example="exact")
+
+    @field_validator("stat", mode="before")
+    @classmethod
+    def _stat_as_list(cls, value):
+        if isinstance(value, str):
+            return [value]
+        return value
+
+    @field_validator("stat")
+    @classmethod
+    def _stat_supported(cls, value):
+        return _supported_stats(value)
+
+
+class RollingRequest(StationArea):
+    metrics: List[str] = Field(..., min_length=1, example=["Temperature", "WindSpeed"])
+    # Trailing window per reading, e.g. "24h" or "7d"
+    window: str = Field("24h", example="24h")
+    start_date: Optional[date] = Field(None, example="2025-03-01")
+    end_date: Optional[date] = Field(None, example="2025-03-31")
+    city: Optional[str] = Field(None, example="Dublin")
+    station_ids: Optional[List[str]] = Field(None, example=["DUBLIN_53.33_-6.25"])
+    z_threshold: float = Field(3.0, gt=0, example=3.0)
+    anomalies_only: bool = Field(False, example=True)
+    # Read the materialized window, refreshed for new ingests only
+    incremental: bool = Field(False, example=False)
+
+    @field_validator("window")
+    @classmethod
+    def _window_valid(cls, value):
+        parse_window(value)
+        return value
 
 
 class MetricStatResponse(BaseModel):
+    """
+    One row per station, with a `<stat>_<metric>` column for every
+    requested stat/metric pair (e.g. `max_Humidity`).
+    """
+
+    model_config = ConfigDict(extra="allow")
+
     station_id: str
     city: str
     country: str
@@ -21,7 +132,7 @@ class MetricStatResponse(BaseModel):
     avg_WindSpeed: Optional[float] = None
 
 
-class SensorQuery(BaseModel):
+class SensorQuery(StationArea):
     station_ids: Optional[List[str]] = Field(
         default=None, example=["DUBLIN_53.33_-6.25"]
     )
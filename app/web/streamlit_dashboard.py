@@ -1,32 +1,146 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 
 import folium
 import pandas as pd
 import requests
 import streamlit as st
+from folium.plugins import FastMarkerCluster
+from requests.adapters import HTTPAdapter
 from streamlit_folium import st_folium
+from urllib3.util.retry import Retry
 
-API_URL = "http://127.0.0.1:8000"
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+# Resyncs are writes, served by the writer process when reads are split off
+WRITER_API_URL = os.getenv("WRITER_API_URL", API_URL)
+MAX_CHART_POINTS = 300
+REQUEST_TIMEOUT = (3.05, 30)  # connect, read (seconds)
+# Responses kept for revalidation with If-None-Match
+CACHE_SIZE = 64
 
 st.set_page_config(page_title="Weather Metrics Dashboard", layout="wide")
 
 
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    One keep-alive connection pool shared by every rerun and fetch thread.
+    """
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ResponseCache:
+    """
+    Last body and ETag per (url, payload). Requests revalidate with
+    If-None-Match, so headers such as the processing time and data
+    freshness always come from the live response, and a 304 reuses the
+    body. Thread-safe, failures are never stored.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, data):
+        with self._lock:
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    return ResponseCache()
+
+
+def post_json(session, cache, url: str, payload_json: str):
+    """
+    POST to the API and return (data, headers, error). Takes the session
+    and cache as plain values and never calls st.*, so it can run in
+    worker threads.
+    """
+    key = (url, payload_json)
+    cached = cache.get(key)
+    headers = {"Content-Type": "application/json"}
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+    try:
+        r = session.post(
+            url, data=payload_json, headers=headers, timeout=REQUEST_TIMEOUT
+        )
+    except requests.RequestException as e:
+        return None, {}, f"❌ Request failed: {e}"
+    if r.status_code == 304 and cached is not None:
+        return cached[1], dict(r.headers), None
+    if r.status_code != 200:
+        return None, {}, f"Error {r.status_code}: {r.text}"
+    data = r.json()
+    if "ETag" in r.headers:
+        cache.put(key, r.headers["ETag"], data)
+    return data, dict(r.headers), None
+
+
 # Helper Class
 class WeatherAPI:
-    def __init__(self, base_url):
+    def __init__(self, base_url, writer_url=None):
         self.base_url = base_url
+        self.writer_url = writer_url or base_url
+
+    def post(self, endpoint, payload):
+        return post_json(
+            get_session(),
+            get_response_cache(),
+            f"{self.base_url}{endpoint}",
+            json.dumps(payload, sort_keys=True),
+        )
 
-    def fetch(self, endpoint, params=None):
+    def post_many(self, calls):
+        """
+        Run several (endpoint, payload) calls concurrently. The cached
+        session and response cache are resolved here, on the script thread;
+        the workers only get plain values.
+        """
+        session, cache = get_session(), get_response_cache()
+        prepared = [
+            (f"{self.base_url}{endpoint}", json.dumps(payload, sort_keys=True))
+            for endpoint, payload in calls
+        ]
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            return list(
+                pool.map(lambda call: post_json(session, cache, *call), prepared)
+            )
+
+    def refresh_sensors(self):
+        """
+        Ask the writer to resync from the live API. Returns an error message,
+        or None once the refresh succeeded; the API then answers with new
+        ETags, so the next requests fetch fresh bodies.
+        """
         try:
-            r = requests.get(f"{self.base_url}{endpoint}", params=params)
-            if r.status_code == 200:
-                return r.json(), r.headers
-            else:
-                st.error(f"Error {r.status_code}: {r.text}")
-                return None, {}
-        except Exception as e:
-            st.error(f"❌ Request failed: {e}")
-            return None, {}
+            get_session().post(
+                f"{self.writer_url}/sensors/refresh", timeout=REQUEST_TIMEOUT
+            ).raise_for_status()
+        except requests.RequestException as e:
+            return f"❌ Sensor refresh failed: {e}"
+        return None
 
     def compute_date_range(self, duration):
         end_date = date.today()
@@ -39,132 +153,163 @@ class WeatherAPI:
         return start_date, end_date
 
 
+def show_error(error):
+    if error:
+        st.error(error)
+
+
 class SensorDashboard:
+    # Optional filter in future: station_ids = [...]
+    payload = {"station_ids": None}
+
     def __init__(self, api):
         self.api = api
-        self._cache_key = "sensor_data"
 
-    def render(self):
+    def request(self):
+        return ("/sensors", self.payload)
+
+    def render(self, result):
         col1, col2 = st.columns([4, 1])
         with col1:
             st.subheader("🛰️ Sensor List (Latest & Forecast Readings)")
 
-        refresh = st.button("🔄 Resync from Live API")
-
-        # Optional filter in future: station_ids = [...]
-        payload = {"station_ids": None}
-
-        if refresh or self._cache_key not in st.session_state:
-            with st.spinner("Fetching sensor data..."):
-                try:
-                    response = requests.post(
-                        f"{self.api.base_url}/sensors", json=payload
-                    )
-                    if response.status_code == 200:
-                        sensors = response.json()
-                        headers = response.headers
-                        st.session_state[self._cache_key] = (sensors, headers)
-                        if refresh:
-                            st.success("✅ Sensors refreshed.")
-                    else:
-                        st.error(f"Error {response.status_code}: {response.text}")
-                        sensors, headers = [], {}
-                except Exception as e:
-                    st.error(f"❌ Failed to load sensors: {e}")
-                    sensors, headers = [], {}
-        else:
-            sensors, headers = st.session_state[self._cache_key]
+        if st.button("🔄 Resync from Live API"):
+            with st.spinner("Refreshing sensor data..."):
+                refresh_error = self.api.refresh_sensors()
+                if not refresh_error:
+                    result = self.api.post(*self.request())
+            if refresh_error:
+                st.error(refresh_error)
+            else:
+                st.success("✅ Sensors refreshed.")
+
+        sensors, headers, error = result
+        show_error(error)
 
         if "X-Process-Time-ms" in headers:
             col2.markdown(f"⏱️ {headers['X-Process-Time-ms']} ms")
+        if "X-Last-Refresh" in headers:
+            stale = " (stale)" if headers.get("X-Data-Stale") == "true" else ""
+            st.caption(f"Live data refreshed: {headers['X-Last-Refresh']}{stale}")
 
         if sensors:
             df = pd.DataFrame(sensors)
             st.dataframe(df)
 
             try:
-                city_coords = {"Dublin": [53.33, -6.25], "Galway": [53.27, -9.05]}
-                m = folium.Map(location=[53.3, -8.5], zoom_start=6)
-
-                for _, row in df.iterrows():
-                    city = row.get("city")
-                    coords = city_coords.get(city)
-                    if coords:
-                        tooltip = row["station_id"]
-                        popup = f"{city}<br>🌡️ {row.get('Temperature', '?')} °C<br>💧 {row.get('Humidity', '?')} %"
-                        folium.Marker(
-                            location=coords, tooltip=tooltip, popup=popup
-                        ).add_to(m)
-
                 st.markdown("### 🗺️ Sensor Locations")
-                st_folium(m, width=700, height=400)
+                st_folium(
+                    self.build_map(df), width=700, height=400, returned_objects=[]
+                )
             except Exception as e:
                 st.warning(f"Map rendering failed: {e}")
 
+    @staticmethod
+    def build_map(df):
+        """
+        Cluster markers client side from plain coordinate rows, so thousands
+        of stations cost one JSON array rather than a Marker object each.
+        """
+        located = df.dropna(subset=["lat", "lon"])
+        m = folium.Map(location=[53.3, -8.5], zoom_start=6)
+        if located.empty:
+            return m
+
+        popup = (
+            located["city"].astype(str)
+            + "<br>🌡️ "
+            + located["Temperature"].astype(str)
+            + " °C<br>💧 "
+            + located["Humidity"].astype(str)
+            + " %"
+        )
+        rows = pd.concat(
+            [located[["lat", "lon", "station_id"]], popup.rename("popup")], axis=1
+        )
+        FastMarkerCluster(
+            data=rows.values.tolist(),
+            callback="""
+            function (row) {
+                var marker = L.marker(new L.LatLng(row[0], row[1]));
+                marker.bindTooltip(row[2]);
+                marker.bindPopup(row[3]);
+                return marker;
+            }
+            """,
+        ).add_to(m)
+        m.fit_bounds(
+            [
+                [located["lat"].min(), located["lon"].min()],
+                [located["lat"].max(), located["lon"].max()],
+            ]
+        )
+        return m
+
+
 class MetricStats:
     def __init__(self, api):
         self.api = api
-        self._cache_key = "metric_stats"
-
-    def render(self):
-        col1, col2 = st.columns([4, 1])
-        with col1:
-            st.subheader("📉 Metric Statistics")
 
+    def controls(self):
+        """
+        Widgets for the stats query; returns the stat and timeseries calls.
+        """
         metrics = st.multiselect(
             "Select Metrics",
             ["Temperature", "Humidity", "WindSpeed"],
             default=["Temperature"],
         )
-        stat = st.selectbox("Select Stat", ["avg", "min", "max", "sum"])
+        stat = st.multiselect(
+            "Select Stats",
+            [
+                "avg", "min", "max", "sum", "count", "median",
+                "p90", "p95", "p99", "stddev", "variance",
+            ],
+            default=["avg"],
+        )
+        approx = st.checkbox("Approximate percentiles (faster on long ranges)")
         city = st.selectbox("Select City", ["All", "Dublin", "Galway"])
 
         duration = st.selectbox(
             "Date Range", ["1 Week", "1 Month", "3 Months"], key="stats_duration"
         )
-        end_date = date.today()
-        if duration == "1 Week":
-            start_date = end_date - timedelta(days=7)
-        elif duration == "1 Month":
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = end_date - timedelta(days=90)
+        start_date, end_date = self.api.compute_date_range(duration)
 
         custom = st.checkbox("Custom Date Range", key="custom_stats")
         if custom:
             start_date = st.date_input("Start Date", start_date)
             end_date = st.date_input("End Date", end_date)
 
-        should_fetch = (
-            st.button("📊 Compute Stats") or self._cache_key not in st.session_state
-        )
+        interval = st.selectbox("Chart Interval", ["hour", "day", "week"])
+
+        payload = {
+            "metrics": metrics,
+            "stat": stat,
+            "start_date": str(start_date),
+            "end_date": str(end_date),
+            "mode": "approx" if approx else "exact",
+        }
+        if city != "All":
+            payload["city"] = city
+
+        # Bucketed and downsampled server side, a few hundred points per
+        # station whatever the range
+        series = {**payload, "interval": interval, "max_points": MAX_CHART_POINTS}
+        return [("/metrics/stat", payload), ("/metrics/timeseries", series)]
+
+    def render(self, calls, results):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.subheader("📉 Metric Statistics")
+
+        if not calls:
+            st.info("Select at least one metric and stat.")
+            return
+
+        (data, headers, error), (series, _, series_error) = results
+        show_error(error)
+        show_error(series_error)
 
-        if should_fetch:
-            with st.spinner("Computing stats..."):
-                payload = {
-                    "metrics": metrics,
-                    "stat": stat,
-                    "start_date": str(start_date),
-                    "end_date": str(end_date),
-                }
-                if city != "All":
-                    payload["city"] = city
-
-                try:
-                    response = requests.post(
-                        f"{self.api.base_url}/metrics/stat", json=payload
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        st.session_state[self._cache_key] = (data, response.headers)
-                    else:
-                        st.error(f"Error {response.status_code}: {response.text}")
-                        st.session_state[self._cache_key] = ([], {})
-                except Exception as e:
-                    st.error(f"Request failed: {e}")
-                    st.session_state[self._cache_key] = ([], {})
-
-        data, headers = st.session_state.get(self._cache_key, ([], {}))
         if "X-Process-Time-ms" in headers:
             col2.markdown(f"⏱️ {headers['X-Process-Time-ms']} ms")
 
@@ -172,19 +317,35 @@ class MetricStats:
             df = pd.DataFrame(data)
             st.dataframe(df)
 
+        if series:
+            ts = pd.DataFrame(series)
+            ts["bucket"] = pd.to_datetime(ts["bucket"])
+            for column in ts.columns.drop(["station_id", "city", "country", "bucket"]):
+                st.markdown(f"#### 📈 {column}")
+                st.line_chart(
+                    ts.pivot_table(index="bucket", columns="station_id", values=column)
+                )
+
+
 # App Router
-api = WeatherAPI(API_URL)
+api = WeatherAPI(API_URL, WRITER_API_URL)
+sensors = SensorDashboard(api)
+metric_stats = MetricStats(api)
 
 st.sidebar.header("🌤️ WeatherBoard v1.0")
-tab = st.sidebar.radio(
-    "🗂️ Explore Dashboard:",
-    [
-        "🛰️ Sensors",
-        "📉 Metric Stats",
-    ],
-)
-
-if tab == "🛰️ Sensors":
-    SensorDashboard(api).render()
-elif tab == "📉 Metric Stats":
-    MetricStats(api).render()
+sensor_tab, stats_tab = st.tabs(["🛰️ Sensors", "📉 Metric Stats"])
+
+with stats_tab:
+    stat_calls = metric_stats.controls()
+    valid = all(payload["metrics"] and payload["stat"] for _, payload in stat_calls)
+    if not valid:
+        stat_calls = []
+
+# Both tabs' data is fetched concurrently, unchanged answers come back as 304s
+with st.spinner("Loading data..."):
+    results = api.post_many([sensors.request(), *stat_calls])
+
+with sensor_tab:
+    sensors.render(results[0])
+with stats_tab:
+    metric_stats.render(stat_calls, results[1:])
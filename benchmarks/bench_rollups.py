@@ -0,0 +1,96 @@
+"""
+Compare get_metric_stats over raw rows against the rollup routed path on a
+multi-year synthetic dataset.
+
+    PYTHONPATH=. python benchmarks/bench_rollups.py --years 3 --stations 50
+"""
+
+import argparse
+import logging
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.db.duck_db_utils import WeatherDB
+
+RANGES = {"1 Week": 7, "3 Months": 90, "1 Year": 365, "3 Years": 3 * 365}
+
+
+def build_dataset(db: WeatherDB, years: int, stations: int, end: date):
+    """
+    Hourly readings for every station, generated inside DuckDB.
+    """
+    start = end - timedelta(days=365 * years)
+    db.insert_query(
+        f"""
+        SELECT
+            'ST' || s AS station_id,
+            CASE WHEN s % 2 = 0 THEN 'Dublin' ELSE 'Galway' END AS city,
+            'Ireland' AS country,
+            ts AS Datetime,
+            round(10 + 8 * sin(epoch(ts) / 86400 / 58) + random() * 4, 2)
+                AS Temperature,
+            (50 + random() * 50)::INTEGER AS Humidity,
+            round(random() * 15, 2) AS WindSpeed,
+            'clear sky' AS WeatherDescription
+        FROM range(0, {stations}) t(s),
+            range(TIMESTAMP '{start}', TIMESTAMP '{end}', INTERVAL 1 HOUR) r(ts)
+    """
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Per-query INFO logging would dominate the output
+    logging.getLogger("app.db.duck_db_utils").setLevel(logging.WARNING)
+
+    end = date.today()
+    db = WeatherDB(":memory:")
+    start = time.perf_counter()
+    build_dataset(db, args.years, args.stations, end)
+    rows = db.con.execute("SELECT COUNT(*) FROM weather").fetchone()[0]
+    print(f"Built {rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+    metrics = ["Temperature", "Humidity", "WindSpeed"]
+    results = []
+    for label, days in RANGES.items():
+        if days > 365 * args.years:
+            continue
+        kwargs = dict(start_date=end - timedelta(days=days), end_date=end)
+        raw = timed(
+            lambda: db.get_metric_stats(metrics, "avg", use_rollups=False, **kwargs),
+            args.repeat,
+        )
+        rolled = timed(
+            lambda: db.get_metric_stats(metrics, "avg", **kwargs), args.repeat
+        )
+        results.append(
+            {
+                "range": label,
+                "raw_ms": round(raw, 2),
+                "rollup_ms": round(rolled, 2),
+                "speedup": round(raw / rolled, 1),
+            }
+        )
+
+    print(pd.DataFrame(results).to_string(index=False))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
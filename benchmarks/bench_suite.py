@@ -0,0 +1,430 @@
+"""
+Reproducible benchmarks for WeatherDB and the API, written as JSON.
+
+    PYTHONPATH=. python benchmarks/bench_suite.py --size small --output bench.json
+    PYTHONPATH=. python benchmarks/bench_suite.py --size small --compare bench.json
+
+Sizes: small (10k rows, 2 stations), medium (1M rows, 100 stations) and
+large (50M rows, 5,000 stations); --rows/--stations override either.
+Compare mode exits with status 1 when any result regressed past --threshold.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import duckdb
+import httpx
+import pandas as pd
+
+from app.db.duck_db_utils import WeatherDB
+from ingestion.fetcher import OpenWeatherFetcher
+from ingestion.ingest_openweather import ingest_cities
+
+SIZES = {
+    "small": {"rows": 10_000, "stations": 2},
+    "medium": {"rows": 1_000_000, "stations": 100},
+    "large": {"rows": 50_000_000, "stations": 5_000},
+}
+# Datasets end here rather than today, so every run measures the same data
+ANCHOR_DATE = date(2025, 1, 1)
+RANGES = {"1 Day": 1, "1 Week": 7, "3 Months": 90, "1 Year": 365}
+METRICS = ["Temperature", "Humidity", "WindSpeed"]
+
+# Results where a higher number is better; everything else is a latency
+THROUGHPUT_UNIT = "rows/s"
+
+
+def _noise(salt: int) -> str:
+    """
+    Pseudo-random value in [0, 1) from the station and hour. Unlike
+    random() after setseed(), it does not depend on how DuckDB splits the
+    scan across threads.
+    """
+    return f"(hash(s, ts, {salt}) % 1000000 / 1000000.0)"
+
+
+def generate_sql(stations: int, hours: int, end: date) -> str:
+    """
+    Hourly readings for every station, generated inside DuckDB. The same
+    arguments always give the same rows.
+    """
+    start = datetime.combine(end, datetime.min.time()) - timedelta(hours=hours)
+    return f"""
+        SELECT
+            'ST' || s AS station_id,
+            CASE WHEN s % 2 = 0 THEN 'Dublin' ELSE 'Galway' END AS city,
+            'Ireland' AS country,
+            ts AS Datetime,
+            round(10 + 8 * sin(epoch(ts) / 86400 / 58) + {_noise(1)} * 4, 2)
+                AS Temperature,
+            (50 + {_noise(2)} * 50)::INTEGER AS Humidity,
+            round({_noise(3)} * 15, 2) AS WindSpeed,
+            'clear sky' AS WeatherDescription
+        FROM range(0, {stations}) t(s),
+            range(TIMESTAMP '{start}', TIMESTAMP '{end}', INTERVAL 1 HOUR) r(ts)
+    """
+
+
+def timings(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def latency(samples) -> dict:
+    return {
+        "unit": "ms",
+        "value": round(statistics.median(samples) * 1000, 3),
+        "min": round(min(samples) * 1000, 3),
+        "max": round(max(samples) * 1000, 3),
+    }
+
+
+def throughput(rows: int, seconds: float) -> dict:
+    return {"unit": THROUGHPUT_UNIT, "value": round(rows / seconds, 1)}
+
+
+class FixtureFetcher(OpenWeatherFetcher):
+    """
+    Serves canned OpenWeather payloads so ingestion is measured without
+    network time.
+    """
+
+    def __init__(self, forecast_points: int = 40):
+        super().__init__("bench")
+        self.forecast_points = forecast_points
+        self.base = int(time.time()) // 3600 * 3600
+
+    def fetch_all(self, cities, endpoints=("weather", "forecast")):
+        payloads = []
+        for i, city in enumerate(cities):
+            coord = {"lat": 50 + i * 0.01, "lon": -6 - i * 0.01}
+            reading = {
+                "main": {"temp": 11.5, "humidity": 80},
+                "wind": {"speed": 4.1},
+                "weather": [{"description": "light rain"}],
+            }
+            payloads.append({
+                "weather": {"dt": self.base, "coord": coord, **reading},
+                "forecast": {
+                    "city": {"coord": coord},
+                    "list": [
+                        {"dt": self.base + k * 10800, **reading}
+                        for k in range(self.forecast_points)
+                    ],
+                },
+            })
+        return payloads
+
+
+def bench_insert_csv(rows, stations, repeat, workdir):
+    csv_path = Path(workdir) / "bench.csv"
+    hours = math.ceil(rows / stations)
+    duckdb.execute(
+        f"COPY ({generate_sql(stations, hours, ANCHOR_DATE)}) TO '{csv_path}'"
+    )
+    loaded = []
+
+    def load():
+        db = WeatherDB(":memory:")
+        loaded.append(db.insert_csv(str(csv_path)))
+        db.close()
+
+    samples = timings(load, repeat)
+    csv_path.unlink()
+    return throughput(loaded[0], statistics.median(samples))
+
+
+def bench_insert_metrics(repeat, count=200):
+    db = WeatherDB(":memory:")
+    base = datetime(2025, 3, 1)
+    offset = iter(range(count * repeat))
+
+    def insert():
+        for _ in range(count):
+            db.insert_metrics(
+                {
+                    "station_id": "BENCH",
+                    "city": "Dublin",
+                    "country": "Ireland",
+                    "Datetime": base + timedelta(minutes=next(offset)),
+                    "Temperature": 10.0,
+                    "Humidity": 70,
+                    "WindSpeed": 3.0,
+                    "WeatherDescription": "clear",
+                }
+            )
+
+    samples = timings(insert, repeat)
+    db.close()
+    return throughput(count, statistics.median(samples))
+
+
+def bench_upsert_batch(repeat, batch=10_000):
+    db = WeatherDB(":memory:")
+    frames = [
+        duckdb.execute(
+            generate_sql(10, batch // 10, date(2025, 1, 1) + timedelta(days=60 * i))
+        ).fetchdf()
+        for i in range(repeat)
+    ]
+    batches = iter(frames)
+    samples = timings(lambda: db.upsert_metrics(next(batches)), repeat)
+    db.close()
+    return throughput(batch, statistics.median(samples))
+
+
+def bench_upsert_single(repeat, count=200):
+    """
+    Per-call latency of one-reading upserts into a populated table, the
+    scheduler's and /ingest?wait=true's path, dominated by fixed costs.
+    """
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(duckdb.execute(generate_sql(10, 1000, ANCHOR_DATE)).fetchdf())
+    base = datetime.combine(ANCHOR_DATE, datetime.min.time())
+    offset = iter(range(count * repeat))
+
+    def upsert():
+        db.upsert_metrics(
+            [
+                {
+                    "station_id": "BENCH",
+                    "city": "Dublin",
+                    "country": "Ireland",
+                    "Datetime": base + timedelta(minutes=next(offset)),
+                    "Temperature": 10.0,
+                    "Humidity": 70,
+                    "WindSpeed": 3.0,
+                    "WeatherDescription": "clear",
+                }
+            ]
+        )
+
+    samples = [sample for _ in range(repeat) for sample in timings(upsert, count)]
+    db.close()
+    return latency(samples)
+
+
+def bench_ingestor(repeat, cities=50):
+    db = WeatherDB(":memory:")
+    fetcher = FixtureFetcher()
+    names = [{"city": f"City{i}", "country": "Ireland"} for i in range(cities)]
+
+    def ingest():
+        with contextlib.redirect_stdout(io.StringIO()):
+            ingest_cities(names, db, fetcher)
+
+    samples = timings(ingest, repeat)
+    db.close()
+    rows = cities * (fetcher.forecast_points + 1)
+    return throughput(rows, statistics.median(samples))
+
+
+def build_query_db(rows, stations, end):
+    db = WeatherDB(":memory:")
+    hours = math.ceil(rows / stations)
+    db.insert_query(generate_sql(stations, hours, end))
+    return db, hours
+
+
+def bench_queries(db, hours, stations, end, repeat):
+    results = {}
+    some = [f"ST{i}" for i in range(min(stations, 10))]
+    results["get_sensor_details/all"] = latency(
+        timings(lambda: db.get_sensor_details(), repeat)
+    )
+    results["get_sensor_details/10_stations"] = latency(
+        timings(lambda: db.get_sensor_details(station_ids=some), repeat)
+    )
+    for label, days in RANGES.items():
+        if days * 24 > hours:
+            continue
+        kwargs = dict(start_date=end - timedelta(days=days), end_date=end)
+        results[f"get_metric_stats/{label}"] = latency(
+            timings(lambda: db.get_metric_stats(METRICS, "avg", **kwargs), repeat)
+        )
+        results[f"get_metric_stats/{label}/raw"] = latency(
+            timings(
+                lambda: db.get_metric_stats(
+                    METRICS, "avg", use_rollups=False, **kwargs
+                ),
+                repeat,
+            )
+        )
+    return results
+
+
+def bench_api(db, end, repeat, workdir):
+    """
+    POST /metrics/stat through the ASGI app against the benchmark database,
+    with the result cache cleared before every cold request.
+    """
+    # Importing the app opens its database, keep it out of the working copy
+    os.environ["DB_PATH"] = str(Path(workdir) / "api.db")
+    from app.api import routes
+    from app.main import app
+
+    routes.db = db
+    payload = {
+        "metrics": METRICS,
+        "stat": ["avg", "max"],
+        "start_date": str(end - timedelta(days=7)),
+        "end_date": str(end),
+    }
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            async def post(cold):
+                if cold:
+                    routes.result_cache.clear()
+                start = time.perf_counter()
+                response = await client.post("/metrics/stat", json=payload)
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+            cold = [await post(True) for _ in range(repeat)]
+            warm = [await post(False) for _ in range(repeat)]
+            return cold, warm
+
+    cold, warm = asyncio.run(run())
+    return {
+        "api/metrics_stat/1 Week/cold": latency(cold),
+        "api/metrics_stat/1 Week/cached": latency(warm),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_suite(rows, stations, repeat, skip_csv=False) -> dict:
+    end = ANCHOR_DATE
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if not skip_csv:
+            results["insert_csv"] = bench_insert_csv(rows, stations, repeat, workdir)
+        results["insert_metrics"] = bench_insert_metrics(repeat)
+        results["upsert_metrics/10k_batch"] = bench_upsert_batch(repeat)
+        results["upsert_metrics/1_row"] = bench_upsert_single(repeat)
+        results["ingest_cities/50_cities"] = bench_ingestor(repeat)
+
+        db, hours = build_query_db(rows, stations, end)
+        results.update(bench_queries(db, hours, stations, end, repeat))
+        results.update(bench_api(db, end, repeat, workdir))
+        db.close()
+
+    return {
+        "meta": {
+            "rows": rows,
+            "stations": stations,
+            "repeat": repeat,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "machine": platform.machine(),
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> pd.DataFrame:
+    """
+    Relative change per result; a regression is a latency that grew or a
+    throughput that shrank by more than `threshold`.
+    """
+    rows = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        if before["value"]:
+            change = (result["value"] - before["value"]) / before["value"]
+        else:
+            # Nothing to scale against, any growth from zero is a full change
+            change = 0.0 if result["value"] == before["value"] else math.inf
+        worse = -change if result["unit"] == THROUGHPUT_UNIT else change
+        rows.append(
+            {
+                "benchmark": name,
+                "unit": result["unit"],
+                "baseline": before["value"],
+                "current": result["value"],
+                "change_%": round(change * 100, 1),
+                "regression": worse > threshold,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--rows", type=int, help="Override the dataset row count")
+    parser.add_argument("--stations", type=int, help="Override the station count")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-csv", action="store_true", help="Skip insert_csv")
+    parser.add_argument("--output", type=str, help="Write results JSON here")
+    parser.add_argument("--compare", type=str, help="Baseline results JSON")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative slowdown flagged as a regression (default 20%%)",
+    )
+    args = parser.parse_args()
+
+    # Per-query logging would dominate the run time and the output
+    logging.disable(logging.WARNING)
+
+    size = SIZES[args.size]
+    rows = args.rows or size["rows"]
+    stations = args.stations or size["stations"]
+    report = run_suite(rows, stations, args.repeat, args.skip_csv)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Wrote {len(report['results'])} result(s) to {args.output}")
+
+    table = pd.DataFrame(
+        [{"benchmark": k, **v} for k, v in report["results"].items()]
+    )
+    print(table.to_string(index=False))
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        diff = compare(report, baseline, args.threshold)
+        print(f"\nAgainst {args.compare} (revision {baseline['meta'].get('revision')}):")
+        print(diff.to_string(index=False))
+        regressions = diff[diff["regression"]] if not diff.empty else diff
+        if not regressions.empty:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,269 @@
+"""
+Generate synthetic weather readings for capacity testing.
+
+Values are computed with NumPy a time chunk at a time and streamed to a CSV
+file or a Hive-partitioned Parquet dataset (year=/month=/city=, the archive
+layout), so memory stays bounded however many rows are generated.
+
+    python data/generate_synthetic_weather.py --start 2025-01-01 --end 2025-03-31
+    python data/generate_synthetic_weather.py --start 2015-01-01 --end 2025-01-01 \\
+        --stations 2000 --format parquet --out synthetic_weather --seed 42
+"""
+
 import argparse
-import random
-from datetime import datetime, timedelta
+import time
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
+
+# The two live stations, always generated first
+DEFAULT_STATIONS = [
+    {"city": "Dublin", "country": "Ireland", "lat": 53.33, "lon": -6.25},
+    {"city": "Galway", "country": "Ireland", "lat": 53.27, "lon": -9.05},
+]
+
+# Extra stations are scattered over this box and named after the nearest city
+REGION_BBOX = (51.4, -10.5, 55.4, -5.9)  # south, west, north, east
+REGION_CITIES = {
+    "Dublin": (53.35, -6.26),
+    "Galway": (53.27, -9.05),
+    "Cork": (51.90, -8.47),
+    "Limerick": (52.66, -8.63),
+    "Waterford": (52.26, -7.11),
+    "Sligo": (54.27, -8.47),
+    "Belfast": (54.60, -5.93),
+    "Letterkenny": (54.95, -7.73),
+}
+
+WEATHER_DESCRIPTIONS = [
+    "clear sky",
+    "light rain",
+    "overcast",
+    "fog",
+    "sunny",
+    "cloudy",
+]
+
+
+def build_stations(count: int, rng, stations_file: str = None) -> pd.DataFrame:
+    """
+    Station table with coordinates: from `stations_file` (city, country,
+    lat, lon columns) when given, else the live stations plus random ones.
+    """
+    if stations_file:
+        stations = pd.read_csv(stations_file)
+    else:
+        stations = pd.DataFrame(DEFAULT_STATIONS[:count])
+        extra = count - len(stations)
+        if extra > 0:
+            south, west, north, east = REGION_BBOX
+            lat = rng.uniform(south, north, extra).round(4)
+            lon = rng.uniform(west, east, extra).round(4)
+            names = list(REGION_CITIES)
+            centres = np.array(list(REGION_CITIES.values()))
+            nearest = np.argmin(
+                (lat[:, None] - centres[:, 0]) ** 2
+                + (lon[:, None] - centres[:, 1]) ** 2,
+                axis=1,
+            )
+            stations = pd.concat(
+                [
+                    stations,
+                    pd.DataFrame(
+                        {
+                            "city": [names[i] for i in nearest],
+                            "country": "Ireland",
+                            "lat": lat,
+                            "lon": lon,
+                        }
+                    ),
+                ],
+                ignore_index=True,
+            )
+
+    if "station_id" not in stations:
+        # Live station ids use 2 decimals, random ones need 4 to stay unique
+        decimals = [2 if i < len(DEFAULT_STATIONS) else 4 for i in range(len(stations))]
+        stations["station_id"] = [
+            f"{city.upper()}_{lat:.{d}f}_{lon:.{d}f}"
+            for city, lat, lon, d in zip(
+                stations["city"], stations["lat"], stations["lon"], decimals
+            )
+        ]
+
+    # Station climate: colder north, windier on the west coast
+    stations["mean_temp"] = 10.5 - 0.6 * (stations["lat"] - 53.0)
+    stations["mean_wind"] = 5.0 + 0.8 * (-6.0 - stations["lon"]).clip(lower=0)
+    return stations.reset_index(drop=True)
+
+
+def generate_chunk(times: pd.DatetimeIndex, stations: pd.DataFrame, rng) -> pa.Table:
+    """
+    Readings for every (time, station) pair, time-major. Temperature has a
+    seasonal and a diurnal cycle plus day-to-day weather anomalies that
+    humidity and wind follow.
+    """
+    n_times, n_stations = len(times), len(stations)
+    shape = (n_times, n_stations)
+
+    day_of_year = times.dayofyear.to_numpy()[:, None]
+    # Local solar hour from the station longitude
+    hour = (
+        times.hour.to_numpy()[:, None]
+        + times.minute.to_numpy()[:, None] / 60
+        + stations["lon"].to_numpy()[None, :] / 15
+    ) % 24
+
+    seasonal = -np.cos(2 * np.pi * (day_of_year - 20) / 365.25)
+    diurnal = np.cos(2 * np.pi * (hour - 15) / 24)
+
+    # One anomaly per station and calendar day, shared by all its readings
+    days = times.normalize()
+    day_codes, unique_days = pd.factorize(days)
+    daily_temp = rng.normal(0, 2.0, (len(unique_days), n_stations))[day_codes]
+    storm = rng.normal(0, 1.0, (len(unique_days), n_stations))[day_codes]
+
+    temperature = (
+        stations["mean_temp"].to_numpy()[None, :]
+        + 5.5 * seasonal
+        + 3.0 * diurnal
+        + daily_temp
+        + rng.normal(0, 0.6, shape)
+    )
+    humidity = (
+        82
+        - 8 * diurnal
+        - 1.2 * daily_temp
+        + 5 * storm
+        + rng.normal(0, 4, shape)
+    )
+    humidity = np.clip(humidity, 30, 100).round().astype(np.int32)
+    wind = (
+        stations["mean_wind"].to_numpy()[None, :]
+        * (1 + 0.35 * storm)
+        * rng.weibull(2.0, shape)
+    )
+    wind = np.clip(wind, 0, 40)
+
+    daytime = (hour > 7) & (hour < 19)
+    description = np.select(
+        [
+            (humidity > 95) & (wind < 3),
+            humidity > 88,
+            humidity > 80,
+            humidity > 70,
+            daytime,
+        ],
+        [3, 1, 2, 5, 4],
+        default=0,
+    ).astype(np.int32)
+
+    station_index = np.tile(np.arange(n_stations, dtype=np.int32), n_times)
+    city_codes, city_names = pd.factorize(stations["city"])
+    country_codes, country_names = pd.factorize(stations["country"])
+
+    def dictionary(indices, values):
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), pa.array(list(values), pa.string())
+        )
+
+    return pa.table(
+        {
+            "station_id": dictionary(station_index, stations["station_id"]),
+            "city": dictionary(city_codes[station_index], city_names),
+            "country": dictionary(country_codes[station_index], country_names),
+            "Datetime": pa.array(
+                np.repeat(times.to_numpy().astype("datetime64[s]"), n_stations)
+            ),
+            "Temperature": temperature.ravel().round(2),
+            "Humidity": humidity.ravel(),
+            "WindSpeed": wind.ravel().round(2),
+            "WeatherDescription": dictionary(description.ravel(), WEATHER_DESCRIPTIONS),
+        }
+    )
+
+
+def generate_synthetic_weather_data(
+    start_date: str,
+    end_date: str,
+    output_file: str,
+    stations: int = 2,
+    freq: str = "H",
+    seed: int = None,
+    output_format: str = "csv",
+    chunk_rows: int = 2_000_000,
+    stations_file: str = None,
+):
+    rng = np.random.default_rng(seed)
+    station_table = build_stations(stations, rng, stations_file)
+    date_range = pd.date_range(start=start_date, end=end_date, freq=freq)
+    times_per_chunk = max(1, chunk_rows // len(station_table))
+    # Whole days per chunk, so a day's weather anomaly is drawn only once;
+    # calendar offsets (MS, W-MON) have no fixed step and are not aligned
+    step = to_offset(freq)
+    if isinstance(step, Tick):
+        steps_per_day = max(1, pd.Timedelta(days=1) // pd.Timedelta(step))
+        if times_per_chunk > steps_per_day:
+            times_per_chunk -= times_per_chunk % steps_per_day
+
+    started = time.perf_counter()
+    writer = None
+    total = 0
+    for chunk, offset in enumerate(range(0, len(date_range), times_per_chunk)):
+        table = generate_chunk(
+            date_range[offset : offset + times_per_chunk], station_table, rng
+        )
+        if output_format == "parquet":
+            times = pd.DatetimeIndex(table["Datetime"].to_numpy())
+            table = table.append_column(
+                "year", pa.array(times.year.to_numpy(np.int32))
+            ).append_column("month", pa.array(times.month.to_numpy(np.int32)))
+            pq.write_to_dataset(
+                table,
+                output_file,
+                partition_cols=["year", "month", "city"],
+                basename_template=f"synthetic_{chunk:05d}_{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+        else:
+            table = table.cast(
+                pa.schema(
+                    [
+                        pa.field(f.name, pa.string())
+                        if pa.types.is_dictionary(f.type)
+                        else f
+                        for f in table.schema
+                    ]
+                )
+            )
+            if writer is None:
+                writer = pa_csv.CSVWriter(
+                    output_file,
+                    table.schema,
+                    write_options=pa_csv.WriteOptions(quoting_style="needed"),
+                )
+            writer.write_table(table)
+        total += table.num_rows
 
+    if writer is not None:
+        writer.close()
 
-def generate_synthetic_weather_data(start_date: str, end_date: str, output_file: str):
-    date_range = pd.date_range(start=start_date, end=end_date, freq="H")
-
-    stations = [
-        {"station_id": "DUBLIN_53.33_-6.25", "city": "Dublin", "country": "Ireland"},
-        {"station_id": "GALWAY_53.27_-9.05", "city": "Galway", "country": "Ireland"},
-    ]
-
-    weather_descriptions = [
-        "clear sky",
-        "light rain",
-        "overcast",
-        "fog",
-        "sunny",
-        "cloudy",
-    ]
-
-    records = []
-    for dt in date_range:
-        for station in stations:
-            record = {
-                "station_id": station["station_id"],
-                "city": station["city"],
-                "country": station["country"],
-                "Datetime": dt,
-                "Temperature": round(random.uniform(5.0, 25.0), 2),
-                "Humidity": random.randint(50, 100),
-                "WindSpeed": round(random.uniform(0.5, 15.0), 2),
-                "WeatherDescription": random.choice(weather_descriptions),
-            }
-            records.append(record)
-
-    df = pd.DataFrame(records)
-    df.to_csv(output_file, index=False)
+    elapsed = time.perf_counter() - started
     print(
-        f"✅ Generated {len(df)} rows of synthetic weather data for {len(stations)} stations."
+        f"✅ Generated {total:,} rows of synthetic weather data for "
+        f"{len(station_table)} stations in {elapsed:.1f}s."
     )
     print(f"📄 Saved to {output_file}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Generate synthetic weather data for Dublin and Galway."
+        description="Generate synthetic weather data for any number of stations."
     )
     parser.add_argument(
         "--start", type=str, required=True, help="Start date in YYYY-MM-DD format"
@@ -56,9 +272,41 @@ if __name__ == "__main__":
         "--end", type=str, required=True, help="End date in YYYY-MM-DD format"
     )
     parser.add_argument(
-        "--out", type=str, default="synthetic_weather.csv", help="Output CSV file name"
+        "--out",
+        type=str,
+        default="synthetic_weather.csv",
+        help="Output CSV file, or dataset directory with --format parquet",
+    )
+    parser.add_argument(
+        "--stations", type=int, default=2, help="Number of stations to generate"
+    )
+    parser.add_argument(
+        "--stations-file",
+        type=str,
+        help="CSV of stations (city, country, lat, lon, optional station_id)",
+    )
+    parser.add_argument(
+        "--freq", type=str, default="H", help="Reading interval, e.g. H or 15min"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for reproducible output")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=2_000_000,
+        help="Rows generated and written per chunk (bounds memory)",
     )
 
     args = parser.parse_args()
 
-    generate_synthetic_weather_data(args.start, args.end, args.out)
+    generate_synthetic_weather_data(
+        args.start,
+        args.end,
+        args.out,
+        stations=args.stations,
+        freq=args.freq,
+        seed=args.seed,
+        output_format=args.format,
+        chunk_rows=args.chunk_rows,
+        stations_file=args.stations_file,
+    )
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from dotenv import load_dotenv
+
+from app.core.metrics import OPENWEATHER_ERRORS, OPENWEATHER_LATENCY
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
+OPENWEATHER_PLAN = os.getenv("OPENWEATHER_PLAN", "free")
+# Longest wait before a retry, whatever Retry-After the server sends
+MAX_BACKOFF_SECONDS = float(os.getenv("OPENWEATHER_MAX_BACKOFF_SECONDS", "60"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Call limits of the OpenWeather subscription plans
+OPENWEATHER_PLANS = {
+    "free": {"per_minute": 60, "per_month": 1_000_000},
+    "startup": {"per_minute": 600, "per_month": 10_000_000},
+    "developer": {"per_minute": 3_000, "per_month": 100_000_000},
+    "professional": {"per_minute": 30_000, "per_month": 1_000_000_000},
+}
+SECONDS_PER_MONTH = 30 * 24 * 3600
+
+
+class TokenBucket:
+    """
+    Call budget refilled at `rate` tokens per second up to `capacity`.
+    Callers reserve a token and sleep until it is theirs, so concurrent
+    requests queue in order. Safe across threads and event loops.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_plan(cls, plan: str = "free", **kwargs):
+        """
+        Bucket sustaining the plan's monthly quota, with a burst small
+        enough that no 60 second window exceeds its per-minute limit.
+        """
+        limits = OPENWEATHER_PLANS[plan]
+        rate = min(limits["per_minute"] / 60, limits["per_month"] / SECONDS_PER_MONTH)
+        return cls(rate, max(1.0, limits["per_minute"] - rate * 60), **kwargs)
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take `tokens` now, returning how many seconds to wait before using
+        them.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_shared_buckets = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(plan: str = OPENWEATHER_PLAN) -> TokenBucket:
+    """
+    The process's one TokenBucket for `plan`. The live refresh, manual
+    refreshes and the scheduler all call OpenWeather with the same key, so
+    they charge the same budget.
+    """
+    with _shared_lock:
+        if plan not in _shared_buckets:
+            _shared_buckets[plan] = TokenBucket.for_plan(plan)
+        return _shared_buckets[plan]
+
+
+class OpenWeatherFetcher:
+    """
+    Concurrent OpenWeather client. All requests share one keep-alive
+    connection pool, concurrency is bounded by a semaphore and 429/5xx
+    responses are retried with exponential backoff, or after the server's
+    Retry-After, never longer than `max_backoff` seconds. An optional
+    `rate_limiter` (TokenBucket) is charged for every attempt.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OPENWEATHER_BASE_URL,
+        units: str = "metric",
+        max_concurrency: int = 10,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        rate_limiter: TokenBucket = None,
+        max_backoff: float = MAX_BACKOFF_SECONDS,
+    ):
+        self.api_key = (api_key or "").strip()
+        self.base_url = base_url.rstrip("/")
+        self.units = units
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = rate_limiter
+        self.max_backoff = max_backoff
+
+    def _client(self):
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            # Full jitter keeps retries from many cities from lining up
+            delay = random.uniform(0, self.backoff_factor * (2**attempt))
+        return min(delay, self.max_backoff)
+
+    async def _get(self, client, semaphore, endpoint: str, city: str) -> dict:
+        params = {"q": city, "units": self.units, "appid": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            response = None
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            try:
+                async with semaphore:
+                    with OPENWEATHER_LATENCY.time(endpoint=endpoint):
+                        response = await client.get(f"/{endpoint}", params=params)
+                if response.is_error:
+                    OPENWEATHER_ERRORS.inc(
+                        endpoint=endpoint, reason=str(response.status_code)
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} - {response.text}",
+                    request=response.request,
+                    response=response,
+                )
+            except httpx.TransportError as e:
+                OPENWEATHER_ERRORS.inc(endpoint=endpoint, reason=type(e).__name__)
+                error = e
+
+            if attempt == self.max_retries:
+                raise error
+            delay = self._backoff(attempt, response)
+            logger.info(
+                f"Retrying {endpoint} for {city} in {delay:.2f}s ({error})"
+            )
+            await asyncio.sleep(delay)
+
+    async def fetch_all_async(self, cities, endpoints=("weather", "forecast")):
+        """
+        Fetch every endpoint for every city in parallel. Returns one
+        {endpoint: payload or exception} dict per city, in the order of
+        `cities`, so same-name cities in different countries stay apart.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as client:
+            tasks = [
+                self._get(client, semaphore, endpoint, city)
+                for city in cities
+                for endpoint in endpoints
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        results = iter(results)
+        return [
+            {endpoint: next(results) for endpoint in endpoints} for _ in cities
+        ]
+
+    def fetch_all(self, cities, endpoints=("weather", "forecast")):
+        return asyncio.run(self.fetch_all_async(cities, endpoints))
+
+    def fetch(self, endpoint: str, city: str) -> dict:
+        """
+        Fetch a single endpoint for one city, raising on failure.
+        """
+        result = self.fetch_all([city], (endpoint,))[0][endpoint]
+        if isinstance(result, Exception):
+            raise result
+        return result
@@ -2,10 +2,8 @@ import os
 import sys
 from datetime import datetime, timezone
 
-import requests
-
 from app.db.duck_db_utils import WeatherDB
-from app.models import WeatherMetric
+from ingestion.fetcher import OpenWeatherFetcher, shared_rate_limiter
 
 # Add project root to path so that the app module is found
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -20,103 +18,102 @@ CITY = "Dublin"
 COUNTRY = "Ireland"
 
 class WeatherIngestor:
-    def __init__(self, api_key: str, city: str, country: str, units: str = "metric"):
+    def __init__(
+        self,
+        api_key: str,
+        city: str,
+        country: str,
+        units: str = "metric",
+        db: WeatherDB = None,
+        fetcher: OpenWeatherFetcher = None,
+    ):
         # Basic input sanitization: strip whitespace from parameters
         self.api_key = (api_key or "").strip()
         self.city = (city or "").strip()
         self.country = (country or "").strip()
         self.units = (units or "").strip()
-        self.db = WeatherDB()
-        self.current_url = f"https://api.openweathermap.org/data/2.5/weather?q={self.city}&units={self.units}&appid={self.api_key}"
-        self.forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?q={self.city}&units={self.units}&appid={self.api_key}"
-
-    def ingest_current_weather(self):
-        print(f"🌐 Fetching Current URL: {self.current_url} for City {self.city}")
-        response = requests.get(self.current_url)
-        if response.status_code != 200:
-            print(
-                f"❌ Failed to fetch current weather data: {response.status_code} - {response.text}"
-            )
-            return
-
-        current = response.json()
+        self.db = db or WeatherDB()
+        self.fetcher = fetcher or OpenWeatherFetcher(
+            api_key=self.api_key, units=self.units, rate_limiter=shared_rate_limiter()
+        )
 
+    def parse_current(self, current: dict) -> list:
+        """
+        Turn a current weather payload into weather rows.
+        """
         # ✅ Use API 'dt' field (UTC timestamp)
         dt = datetime.fromtimestamp(current["dt"], tz=timezone.utc)
-
-        # Check if this current entry already exists
-        exists = self.db.con.execute(
-            f"SELECT COUNT(*) FROM weather WHERE Datetime = '{dt}'"
-        ).fetchone()[0]
-        if exists:
-            print(f"⏭️ Skipping current weather — entry already exists for {dt}")
-            return
-
-        # Prepare data
-        main = current["main"]
-        wind = current.get("wind", {})
-        weather_desc = current.get("weather", [{}])[0].get("description", "N/A")
-
-        print("Inhest current weather")
-        metric = WeatherMetric(
-            station_id=f"{self.city.upper()}_{current['coord']['lat']}_{current['coord']['lon']}",
-            city=self.city,
-            country=self.country,
-            Datetime=dt,
-            Temperature=main.get("temp"),
-            Humidity=main.get("humidity"),
-            WindSpeed=wind.get("speed"),
-            WeatherDescription=weather_desc,
-        )
-
-        self.db.insert_metrics(metric)
-        print(f"✅ Ingested current weather at {dt} for {self.city}")
-
-    from datetime import datetime, timezone
-
-    def ingest_forecast(self):
-        print(f"🌐 Fetching Forecast URL: {self.forecast_url} for City {self.city}")
-        response = requests.get(self.forecast_url)
-
-        if response.status_code != 200:
-            raise Exception(
-                f"❌ Failed to fetch forecast data: {response.status_code} - {response.text}"
+        coord = current["coord"]
+        station_id = f"{self.city.upper()}_{coord['lat']}_{coord['lon']}"
+        return [self._row(station_id, dt, current)]
+
+    def parse_forecast(self, weather_data: dict) -> list:
+        """
+        Turn a 5 day forecast payload into weather rows.
+        """
+        coord = weather_data.get("city", {}).get("coord", {})
+        station_id = f"{self.city.upper()}_{coord.get('lat')}_{coord.get('lon')}"
+        return [
+            self._row(
+                station_id, datetime.fromtimestamp(entry["dt"], tz=timezone.utc), entry
             )
+            for entry in weather_data.get("list", [])
+        ]
+
+    def _row(self, station_id: str, dt: datetime, entry: dict) -> dict:
+        main = entry["main"]
+        wind = entry.get("wind", {})
+        return {
+            "station_id": station_id,
+            "city": self.city,
+            "country": self.country,
+            "Datetime": dt,
+            "Temperature": main.get("temp"),
+            "Humidity": main.get("humidity"),
+            "WindSpeed": wind.get("speed"),
+            "WeatherDescription": entry.get("weather", [{}])[0].get(
+                "description", "N/A"
+            ),
+        }
+
+    def ingest_current_weather(self, current: dict = None):
+        """
+        Ingest current weather, fetching it unless an already fetched
+        payload (or the exception raised fetching it) is passed in.
+        """
+        if current is None:
+            print(f"🌐 Fetching current weather for City {self.city}")
+            try:
+                current = self.fetcher.fetch("weather", self.city)
+            except Exception as e:
+                current = e
+        if isinstance(current, Exception):
+            print(f"❌ Failed to fetch current weather data: {current}")
+            return
 
-        weather_data = response.json()
-        entries = weather_data.get("list", [])
-        if not entries:
+        rows = self.parse_current(current)
+        self.db.upsert_metrics(rows, source="openweather")
+        print(f"✅ Ingested current weather at {rows[0]['Datetime']} for {self.city}")
+
+    def ingest_forecast(self, weather_data: dict = None):
+        """
+        Ingest the 5 day forecast, fetching it unless an already fetched
+        payload (or the exception raised fetching it) is passed in.
+        """
+        if weather_data is None:
+            print(f"🌐 Fetching forecast for City {self.city}")
+            weather_data = self.fetcher.fetch("forecast", self.city)
+        if isinstance(weather_data, Exception):
+            raise Exception(f"❌ Failed to fetch forecast data: {weather_data}")
+
+        rows = self.parse_forecast(weather_data)
+        if not rows:
             print("⚠️ No forecast data found in API response.")
             return
 
-        for entry in entries:
-            # ✅ Use timezone-aware datetime (UTC)
-            dt = datetime.fromtimestamp(entry["dt"], tz=timezone.utc)
-
-            # ⛔ Skip if entry already exists (exact datetime match)
-            exists = self.db.con.execute(
-                f"SELECT COUNT(*) FROM weather WHERE Datetime = '{dt}'"
-            ).fetchone()[0]
-            if exists:
-                print(f"⏭️ Skipping forecast weather — entry already exists for {dt}")
-                return
-
-            main = entry["main"]
-            wind = entry.get("wind", {})
-            weather_desc = entry.get("weather", [{}])[0].get("description", "N/A")
-
-            metric = WeatherMetric(
-                station_id=f"{self.city.upper()}_{weather_data['city']['coord']['lat']}_{weather_data['city']['coord']['lon']}",
-                city=self.city,
-                country=self.country,
-                Datetime=dt,
-                Temperature=main.get("temp"),
-                Humidity=main.get("humidity"),
-                WindSpeed=wind.get("speed"),
-                WeatherDescription=weather_desc,
-            )
-            self.db.insert_metrics(metric)
-            print(f"✅ Ingested forecast entry at {dt.isoformat()} for {self.city}")
+        # One upsert for the whole payload, refreshed values overwrite stale ones
+        self.db.upsert_metrics(rows, source="openweather")
+        print(f"✅ Ingested {len(rows)} forecast entries for {self.city}")
 
     def run(self):
         print("🚀 Starting ingestion pipeline for current weather data...")
@@ -126,6 +123,43 @@ class WeatherIngestor:
         self.db.close()
 
 
+def ingest_cities(cities, db: WeatherDB, fetcher: OpenWeatherFetcher) -> dict:
+    """
+    Fetch current weather and forecast for all cities in parallel, then
+    write every city's rows as one batched upsert. Returns {city: error}
+    for failed cities.
+    """
+    payloads = fetcher.fetch_all([location["city"] for location in cities])
+    errors = {}
+    rows = []
+    for location, payload in zip(cities, payloads):
+        city = location["city"]
+        ingestor = WeatherIngestor(
+            api_key=fetcher.api_key,
+            city=city,
+            country=location["country"],
+            units=fetcher.units,
+            db=db,
+            fetcher=fetcher,
+        )
+        for endpoint, parse in (
+            ("forecast", ingestor.parse_forecast),
+            ("weather", ingestor.parse_current),
+        ):
+            result = payload[endpoint]
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                rows.extend(parse(result))
+            except Exception as e:
+                print(f"⏭️ Skipped {endpoint} ingestion for {city}: {e}")
+                errors[city] = str(e)
+
+    inserted = db.upsert_metrics(rows, source="openweather")
+    print(f"✅ Upserted {inserted} row(s) for {len(cities)} cities")
+    return errors
+
+
 if __name__ == "__main__":
     # Use your public API key and desired parameters
     ingestor = WeatherIngestor(
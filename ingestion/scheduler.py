@@ -0,0 +1,312 @@
+"""
+Ingestion scheduler daemon.
+
+Polls OpenWeather for a list of cities on a cadence per endpoint (current
+weather every 10 minutes, forecasts every 3 hours by default) within a
+token-bucket budget sized to the subscription plan. Each city's next poll
+is jittered so calls spread out instead of bursting, and the last raw
+payload per city and endpoint is kept on disk: a payload with the same
+version (its `dt`) is neither parsed nor written again, even after a
+restart.
+
+The API runs it in place of the live refresh with LIVE_INGEST=scheduler.
+Standalone, it opens the database itself, so only run it while the API is
+down: DuckDB allows one writer process.
+
+    PYTHONPATH=. python ingestion/scheduler.py --cities-file cities.csv
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from app.core.metrics import INGEST_PAYLOADS
+from ingestion.fetcher import (
+    OPENWEATHER_BASE_URL,
+    OpenWeatherFetcher,
+    shared_rate_limiter,
+)
+from ingestion.ingest_openweather import WeatherIngestor
+from utils.logger_service import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+API_KEY = os.getenv("OPENWEATHER_API_KEY")
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", OPENWEATHER_BASE_URL)
+CADENCES = {
+    "weather": int(os.getenv("SCHEDULE_WEATHER_SECONDS", "600")),
+    "forecast": int(os.getenv("SCHEDULE_FORECAST_SECONDS", "10800")),
+}
+SCHEDULE_JITTER = float(os.getenv("SCHEDULE_JITTER", "0.1"))
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", "ingest_cache")
+INGEST_CITIES_FILE = os.getenv("INGEST_CITIES_FILE")
+
+# A failed fetch is retried sooner than its cadence, but not hammered
+RETRY_SECONDS = 60
+
+
+def payload_version(payload: dict) -> str:
+    """
+    Version of a raw payload: its `dt` for current weather, a content hash
+    for forecasts, which carry no generation time of their own.
+    """
+    if "dt" in payload:
+        return str(payload["dt"])
+    body = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """
+    Last raw payload per endpoint and city, as
+    <directory>/<endpoint>/<city>.json, with its version.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._versions = {}
+
+    def _path(self, endpoint: str, city: str) -> Path:
+        slug = re.sub(r"[^a-z0-9]+", "_", city.lower()).strip("_")
+        return self.directory / endpoint / f"{slug}.json"
+
+    def version(self, endpoint: str, city: str):
+        key = (endpoint, city)
+        if key not in self._versions:
+            path = self._path(endpoint, city)
+            try:
+                self._versions[key] = json.loads(path.read_text())["version"]
+            except (OSError, ValueError, KeyError):
+                self._versions[key] = None
+        return self._versions[key]
+
+    def store(self, endpoint: str, city: str, version: str, payload: dict):
+        path = self._path(endpoint, city)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        body = {
+            "version": version,
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            "payload": payload,
+        }
+        # Written aside and renamed, a crash never leaves half a file
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(body))
+        os.replace(tmp, path)
+        self._versions[(endpoint, city)] = version
+
+
+def load_cities(path: str) -> list:
+    """
+    Cities to poll from a CSV (city, country columns) or a JSON list of
+    {"city": ..., "country": ...} objects.
+    """
+    if path.endswith(".json"):
+        return json.loads(Path(path).read_text())
+    return pd.read_csv(path)[["city", "country"]].to_dict(orient="records")
+
+
+class IngestScheduler:
+    """
+    Runs every (endpoint, city) poll when it falls due. One tick fetches
+    the due cities of each endpoint concurrently and writes their changed
+    rows as a single upsert; unchanged payloads only move the next poll
+    forward. A `refresher` (LiveRefreshService) given in the API gets the
+    time of each successful poll, for the freshness headers.
+    """
+
+    def __init__(
+        self,
+        db,
+        cities,
+        cadences: dict = None,
+        fetcher: OpenWeatherFetcher = None,
+        cache_dir: str = INGEST_CACHE_DIR,
+        jitter: float = SCHEDULE_JITTER,
+        rng: random.Random = None,
+        clock=time.monotonic,
+        refresher=None,
+    ):
+        self.db = db
+        self.countries = {location["city"]: location["country"] for location in cities}
+        self.cadences = cadences or CADENCES
+        self.fetcher = fetcher or OpenWeatherFetcher(
+            api_key=API_KEY,
+            base_url=BASE_URL,
+            rate_limiter=shared_rate_limiter(),
+        )
+        self.cache = ResponseCache(cache_dir)
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.refresher = refresher
+        self._stop = threading.Event()
+        self._thread = None
+
+        # First polls spread over a jitter window rather than all at once
+        now = clock()
+        self._queue = [
+            (now + self.rng.uniform(0, cadence * jitter), endpoint, city)
+            for endpoint, cadence in self.cadences.items()
+            for city in self.countries
+        ]
+        heapq.heapify(self._queue)
+        self._check_budget()
+
+    def _check_budget(self):
+        limiter = self.fetcher.rate_limiter
+        if limiter is None:
+            return
+        needed = sum(len(self.countries) / c for c in self.cadences.values())
+        if needed > limiter.rate:
+            logger.warning(
+                f"Schedule needs {needed * 60:.1f} calls/min but the plan "
+                f"sustains {limiter.rate * 60:.1f}, polls will run late"
+            )
+
+    def _next_run(self, endpoint: str, now: float) -> float:
+        cadence = self.cadences[endpoint]
+        return now + cadence * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def next_due(self) -> float:
+        return self._queue[0][0] if self._queue else float("inf")
+
+    def run_once(self) -> dict:
+        """
+        Poll everything that is due. Returns counts of fetched, changed,
+        unchanged and failed payloads and of rows written.
+        """
+        now = self.clock()
+        due = {}
+        while self._queue and self._queue[0][0] <= now:
+            _, endpoint, city = heapq.heappop(self._queue)
+            due.setdefault(endpoint, []).append(city)
+
+        summary = {"fetched": 0, "changed": 0, "unchanged": 0, "failed": 0, "rows": 0}
+        rows, fresh = [], []
+        for endpoint, cities in due.items():
+            payloads = self.fetcher.fetch_all(cities, (endpoint,))
+            for city, payload in zip(cities, payloads):
+                payload = payload[endpoint]
+                summary["fetched"] += 1
+                outcome, retry = self._collect(endpoint, city, payload, rows, fresh)
+                summary[outcome] += 1
+                INGEST_PAYLOADS.inc(endpoint=endpoint, outcome=outcome)
+                if retry:
+                    next_run = now + RETRY_SECONDS
+                else:
+                    next_run = self._next_run(endpoint, now)
+                heapq.heappush(self._queue, (next_run, endpoint, city))
+
+        if rows:
+            summary["rows"] = self.db.upsert_metrics(rows, source="openweather")
+        # Cached only once written, so a failed write is fetched again
+        for endpoint, city, version, payload in fresh:
+            self.cache.store(endpoint, city, version, payload)
+        if self.refresher is not None and summary["changed"] + summary["unchanged"]:
+            self.refresher.last_refreshed = datetime.now(timezone.utc)
+        if summary["fetched"]:
+            logger.info(f"Scheduled ingest: {summary}")
+        return summary
+
+    def _collect(self, endpoint, city, payload, rows, fresh):
+        if isinstance(payload, Exception):
+            logger.info(f"Scheduled {endpoint} fetch for {city} failed: {payload}")
+            return "failed", True
+
+        version = payload_version(payload)
+        if version == self.cache.version(endpoint, city):
+            return "unchanged", False
+
+        ingestor = WeatherIngestor(
+            api_key=self.fetcher.api_key,
+            city=city,
+            country=self.countries[city],
+            units=self.fetcher.units,
+            db=self.db,
+            fetcher=self.fetcher,
+        )
+        parse = {
+            "weather": ingestor.parse_current,
+            "forecast": ingestor.parse_forecast,
+        }[endpoint]
+        try:
+            rows.extend(parse(payload))
+        except Exception as e:
+            logger.info(f"Unparseable {endpoint} payload for {city}: {e}")
+            return "failed", True
+        fresh.append((endpoint, city, version, payload))
+        return "changed", False
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.info(f"Scheduled ingest failed: {e}")
+            self._stop.wait(max(0.0, min(self.next_due() - self.clock(), 60)))
+
+    def start(self):
+        """
+        Run the schedule on a daemon thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="ingest-scheduler", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Ingest scheduler started for {len(self.countries)} cities")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Poll OpenWeather on a schedule and ingest changed payloads. "
+        "Only while the API is down, DuckDB allows one writer process; with "
+        "the API running set LIVE_INGEST=scheduler to run this schedule in it."
+    )
+    parser.add_argument(
+        "--cities-file",
+        type=str,
+        default=INGEST_CITIES_FILE,
+        help="CSV (city, country) or JSON list of cities, default the live cities",
+    )
+    parser.add_argument("--cache-dir", type=str, default=INGEST_CACHE_DIR)
+    parser.add_argument(
+        "--once", action="store_true", help="Poll every city once and exit"
+    )
+    args = parser.parse_args()
+
+    from app.core.config import LIVE_CITIES, db
+
+    cities = load_cities(args.cities_file) if args.cities_file else LIVE_CITIES
+    scheduler = IngestScheduler(
+        db, cities, cache_dir=args.cache_dir, jitter=0 if args.once else SCHEDULE_JITTER
+    )
+    try:
+        if args.once:
+            print(f"✅ {scheduler.run_once()}")
+        else:
+            print(f"🚀 Polling {len(cities)} cities: {scheduler.cadences}")
+            scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    db.close()
@@ -0,0 +1,38 @@
+import argparse
+
+from app.db.duck_db_utils import WeatherDB
+
+
+def parse_month(value: str):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move old months between the DuckDB table and the Parquet "
+        "archive. Run it while the API is stopped, DuckDB allows one writer."
+    )
+    parser.add_argument(
+        "--db", type=str, default="weather_data.db", help="DuckDB database file"
+    )
+    parser.add_argument(
+        "--archive-dir", type=str, default="archive", help="Parquet archive root"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive = commands.add_parser("archive", help="Archive months before YYYY-MM")
+    archive.add_argument("--before", type=str, required=True)
+    restore = commands.add_parser("restore", help="Restore an archived YYYY-MM")
+    restore.add_argument("--month", type=str, required=True)
+    args = parser.parse_args()
+
+    db = WeatherDB(args.db, archive_dir=args.archive_dir)
+    if args.command == "archive":
+        year, month = parse_month(args.before)
+        moved = db.archive_before(f"{year}-{month:02d}-01")
+        print(f"Archived {moved} row(s) to {args.archive_dir}")
+    else:
+        year, month = parse_month(args.month)
+        restored = db.restore_month(year, month)
+        print(f"Restored {restored} row(s) for {year}-{month:02d}")
+    db.close()
@@ -0,0 +1,42 @@
+import argparse
+
+import pandas as pd
+
+from app.db.duck_db_utils import WeatherDB
+
+
+def migrate_stations(db_path: str, archive_dir: str = None, stations_file: str = None):
+    db = WeatherDB(db_path, archive_dir=archive_dir)
+    stations = db.migrate_station_keys()
+    if stations is None:
+        print(f"{db_path} already uses station keys")
+    else:
+        print(f"Migrated {db_path} to station keys, {stations} station(s)")
+    if stations_file:
+        updated = db.update_stations(pd.read_csv(stations_file))
+        print(f"Loaded metadata for {updated} station(s) from {stations_file}")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move a weather database to the stations dimension table. "
+        "Run it while the API is stopped, DuckDB allows one writer."
+    )
+    parser.add_argument(
+        "--db", type=str, default="weather_data.db", help="DuckDB database file"
+    )
+    parser.add_argument(
+        "--archive-dir",
+        type=str,
+        help="Parquet archive root, so archived-only stations get keys too",
+    )
+    parser.add_argument(
+        "--stations-file",
+        type=str,
+        help="CSV of station_id plus any of name, city, country, lat, lon, "
+        "elevation",
+    )
+    args = parser.parse_args()
+
+    migrate_stations(args.db, args.archive_dir, args.stations_file)
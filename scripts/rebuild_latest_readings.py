@@ -0,0 +1,28 @@
+import argparse
+
+from app.db.duck_db_utils import WeatherDB
+
+
+def rebuild_latest_readings(db_path: str, rollups: bool = False):
+    db = WeatherDB(db_path)
+    stations = db.rebuild_latest_readings()
+    print(f"latest_readings rebuilt for {stations} station(s) in {db_path}")
+    if rollups:
+        db.rebuild_rollups()
+        print(f"hourly/daily rollups rebuilt in {db_path}")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute the tables derived from the weather table."
+    )
+    parser.add_argument(
+        "--db", type=str, default="weather_data.db", help="DuckDB database file"
+    )
+    parser.add_argument(
+        "--rollups", action="store_true", help="Also rebuild hourly/daily rollups"
+    )
+    args = parser.parse_args()
+
+    rebuild_latest_readings(args.db, args.rollups)
@@ -1,3 +1,4 @@
+import argparse
 import os
 import subprocess
 import sys
@@ -8,13 +9,37 @@ import uvicorn
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+API_PORT = 8000
+WRITER_PORT = 8001
+
 
 def run_uvicorn():
     # 🚫 Don't use reload=True inside a thread
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=False)
+    uvicorn.run("app.main:app", host="127.0.0.1", port=API_PORT, reload=False)
+
 
+def start_api_processes(workers: int):
+    """
+    One writer process (ingestion, CSV loads, live refresh, snapshots) and
+    `workers` read-only API workers serving its snapshots. DuckDB allows a
+    single process to open the database for writing.
+    """
+    uvicorn_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1"
+    ]
+    writer = subprocess.Popen(
+        uvicorn_cmd + ["--port", str(WRITER_PORT)],
+        env={**os.environ, "SERVING_ROLE": "writer"},
+    )
+    # Readers wait for the writer's first snapshot before serving
+    readers = subprocess.Popen(
+        uvicorn_cmd + ["--port", str(API_PORT), "--workers", str(workers)],
+        env={**os.environ, "SERVING_ROLE": "reader"},
+    )
+    return [writer, readers]
 
-def run_streamlit():
+
+def run_streamlit(env=None):
     streamlit_script = os.path.join("app/web", "streamlit_dashboard.py")
     subprocess.run(
         [
@@ -25,15 +50,40 @@ def run_streamlit():
             "8501",
             "--server.address",
             "127.0.0.1",
-        ]
+        ],
+        env=env,
     )
 
 
 if __name__ == "__main__":
-    print("🚀 Launching FastAPI and Streamlit apps...")
+    parser = argparse.ArgumentParser(description="Run the API and the dashboard.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("API_WORKERS", "1")),
+        help="Read-only API workers; above 1 writes move to a writer process "
+        f"on port {WRITER_PORT}",
+    )
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        print("🚀 Launching FastAPI and Streamlit apps...")
 
-    uvicorn_thread = threading.Thread(target=run_uvicorn, daemon=True)
-    uvicorn_thread.start()
+        uvicorn_thread = threading.Thread(target=run_uvicorn, daemon=True)
+        uvicorn_thread.start()
 
-    sleep(1)
-    run_streamlit()
+        sleep(1)
+        run_streamlit()
+    else:
+        print(f"🚀 Launching a writer, {args.workers} API workers and Streamlit...")
+        processes = start_api_processes(args.workers)
+        try:
+            sleep(1)
+            run_streamlit(
+                {**os.environ, "WRITER_API_URL": f"http://127.0.0.1:{WRITER_PORT}"}
+            )
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
@@ -0,0 +1,44 @@
+import argparse
+import json
+
+import httpx
+
+
+def print_shapes(report: dict, show_profiles: bool):
+    queries = report["queries"]
+    print(f"Slow-query threshold: {report['threshold_ms']} ms")
+    if not queries:
+        print("No slow queries recorded.")
+        return
+    for rank, query in enumerate(queries, start=1):
+        print(
+            f"\n#{rank} [{query['kind']}] max {query['max_ms']} ms, "
+            f"avg {query['avg_ms']} ms over {query['count']} run(s)"
+        )
+        print(f"  shape:  {query['shape']}")
+        print(f"  params: {query['params']}")
+        if show_profiles and query.get("profile"):
+            print(json.dumps(query["profile"], indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the slowest query shapes recorded by a running API."
+    )
+    parser.add_argument(
+        "--url", type=str, default="http://127.0.0.1:8000", help="API base URL"
+    )
+    parser.add_argument("--top", type=int, default=10, help="Number of shapes")
+    parser.add_argument(
+        "--profiles",
+        action="store_true",
+        help="Also print the captured EXPLAIN ANALYZE profiles",
+    )
+    args = parser.parse_args()
+
+    response = httpx.get(
+        f"{args.url.rstrip('/')}/debug/slow-queries",
+        params={"top": args.top, "profiles": args.profiles},
+    )
+    response.raise_for_status()
+    print_shapes(response.json(), args.profiles)
@@ -1,11 +1,16 @@
 # tests/test_api.py
 
+from pathlib import Path
+
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+from app.main import app, ingest_data_dir
 
 client = TestClient(app)
 
+# The sample data the startup hook would load, TestClient skips startup
+ingest_data_dir(sorted((Path(__file__).parent.parent / "data").glob("*.csv")))
+
 def test_post_sensors_empty():
     response = client.post("/sensors", json={})
     assert response.status_code == 200
@@ -32,13 +37,355 @@ def test_post_metrics_stat_invalid_metric_triggers_400():
     #print("Response text:", response.text)
     assert response.status_code == 400
 
-def test_post_metrics_stat_triggers_500():
-    """Trigger 500 by sending unsupported stat"""
+def test_post_metrics_stat_unsupported_stat_triggers_422():
+    """Unsupported stats are rejected by request validation"""
     payload = {
         "metrics": ["Temperature"],
-        "stat": "median"  # not in ['avg', 'min', 'max', 'sum']
+        "stat": "geomean"  # not a supported stat
+    }
+    response = client.post("/metrics/stat", json=payload)
+    assert response.status_code == 422
+    assert "geomean" in response.text
+
+def test_empty_metrics_or_stats_trigger_422():
+    """Empty lists are rejected before any SQL is built"""
+    for path, payload in [
+        ("/metrics/stat", {"metrics": [], "stat": ["avg"]}),
+        ("/metrics/stat", {"metrics": ["Temperature"], "stat": []}),
+        ("/metrics/timeseries", {"metrics": []}),
+        ("/metrics/timeseries", {"metrics": ["Temperature"], "stat": []}),
+        ("/metrics/rolling", {"metrics": []}),
+    ]:
+        assert client.post(path, json=payload).status_code == 422
+
+def test_post_metrics_stat_percentiles_exact_and_approx():
+    payload = {
+        "metrics": ["Temperature"],
+        "stat": ["median", "p90", "p99", "stddev", "variance", "count"],
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07"
+    }
+    exact = client.post("/metrics/stat", json=payload)
+    approx = client.post("/metrics/stat", json={**payload, "mode": "approx"})
+    assert exact.status_code == 200 and approx.status_code == 200
+    for row in exact.json():
+        assert {"median_Temperature", "p90_Temperature", "count_Temperature"} <= set(row)
+
+def test_post_metrics_stat_multiple_stats():
+    payload = {
+        "metrics": ["Temperature", "WindSpeed"],
+        "stat": ["avg", "max"],
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07"
     }
     response = client.post("/metrics/stat", json=payload)
-    print("500 test response:", response.text)
-    assert response.status_code == 500
-    assert "Internal Server Error" in response.text
+    assert response.status_code == 200
+    rows = response.json()
+    assert len(rows) == len({row["station_id"] for row in rows})
+    for row in rows:
+        for key in ("avg_Temperature", "max_Temperature", "avg_WindSpeed", "max_WindSpeed"):
+            assert key in row
+
+def test_post_sensors_has_freshness_headers():
+    response = client.post("/sensors", json={})
+    assert response.status_code == 200
+    assert "X-Last-Refresh" in response.headers
+    assert response.headers["X-Data-Stale"] in ("true", "false")
+
+    again = client.post(
+        "/sensors", json={}, headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert again.status_code == 304
+    assert again.headers["X-Last-Refresh"] == response.headers["X-Last-Refresh"]
+    assert "X-Data-Stale" in again.headers
+
+def test_post_sensors_refresh_forces_resync(monkeypatch):
+    calls = []
+
+    def fake_ingest_cities(cities, db, fetcher):
+        calls.extend(location["city"] for location in cities)
+        return {}
+
+    monkeypatch.setattr("app.core.refresh.ingest_cities", fake_ingest_cities)
+    response = client.post("/sensors/refresh")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["last_refreshed"] is not None
+    assert body["stale"] is False
+    assert calls == ["Dublin", "Galway"]
+
+def test_parallel_metrics_stat_requests():
+    import asyncio
+    import httpx
+
+    payload = {
+        "metrics": ["Temperature", "Humidity", "WindSpeed"],
+        "stat": ["avg", "max"],
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07"
+    }
+
+    async def fire(n):
+        async with httpx.AsyncClient(app=app, base_url="http://test") as ac:
+            return await asyncio.gather(
+                *[ac.post("/metrics/stat", json=payload) for _ in range(n)]
+            )
+
+    responses = asyncio.run(fire(32))
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json() == responses[0].json() for r in responses)
+
+def test_post_metrics_stat_etag_and_cache_hits():
+    payload = {
+        "metrics": ["Humidity"],
+        "stat": "min",
+        "start_date": "2025-03-02",
+        "end_date": "2025-03-05"
+    }
+    first = client.post("/metrics/stat", json=payload)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    hits = client.get("/cache/stats").json()["hits"]
+
+    second = client.post("/metrics/stat", json=payload, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert client.get("/cache/stats").json()["hits"] == hits + 1
+
+def test_post_metrics_stat_filters_station_ids():
+    payload = {
+        "metrics": ["Humidity"],
+        "stat": "max",
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07"
+    }
+    everyone = client.post("/metrics/stat", json=payload).json()
+    assert len(everyone) > 1
+    chosen = everyone[0]["station_id"]
+
+    only = client.post("/metrics/stat", json={**payload, "station_ids": [chosen]})
+    assert only.status_code == 200
+    assert [row["station_id"] for row in only.json()] == [chosen]
+
+STAT_PAYLOAD = {
+    "metrics": ["Temperature", "Humidity"],
+    "stat": ["avg", "max"],
+    "start_date": "2025-03-01",
+    "end_date": "2025-03-07"
+}
+
+def test_post_metrics_stat_arrow_matches_json():
+    import pyarrow as pa
+
+    rows = client.post("/metrics/stat", json=STAT_PAYLOAD).json()
+    response = client.post(
+        "/metrics/stat",
+        json=STAT_PAYLOAD,
+        headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pylist() == rows
+
+def test_post_metrics_stat_arrow_file_format():
+    import pyarrow as pa
+
+    rows = client.post("/metrics/stat", json=STAT_PAYLOAD).json()
+    response = client.post(
+        "/metrics/stat",
+        json=STAT_PAYLOAD,
+        headers={"Accept": "application/vnd.apache.arrow.file"},
+    )
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.file"
+    reader = pa.ipc.open_file(pa.BufferReader(response.content))
+    assert reader.read_all().to_pylist() == rows
+
+    by_name = client.post("/metrics/stat?format=arrow_file", json=STAT_PAYLOAD)
+    assert by_name.content == response.content
+
+def test_post_metrics_stat_parquet_and_ndjson():
+    import json
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = client.post("/metrics/stat", json=STAT_PAYLOAD).json()
+    parquet = client.post("/metrics/stat?format=parquet", json=STAT_PAYLOAD)
+    assert parquet.status_code == 200
+    assert pq.read_table(pa.BufferReader(parquet.content)).to_pylist() == rows
+
+    ndjson = client.post(
+        "/metrics/stat", json=STAT_PAYLOAD, headers={"Accept": "application/x-ndjson"}
+    )
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in ndjson.text.splitlines()] == rows
+
+def test_post_sensors_arrow_and_unknown_format():
+    import pyarrow as pa
+
+    response = client.post(
+        "/sensors", json={}, headers={"Accept": "application/vnd.apache.arrow.stream"}
+    )
+    assert response.status_code == 200
+    assert "X-Data-Stale" in response.headers
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == len(client.post("/sensors", json={}).json())
+
+    assert client.post("/sensors?format=xml", json={}).status_code == 406
+
+def test_post_metrics_timeseries_buckets_and_downsamples():
+    payload = {
+        "metrics": ["Temperature"],
+        "stat": "avg",
+        "interval": "hour",
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07",
+        "max_points": 10
+    }
+    response = client.post("/metrics/timeseries", json=payload)
+    assert response.status_code == 200
+    rows = response.json()
+    assert all({"station_id", "bucket", "avg_Temperature"} <= set(r) for r in rows)
+    per_station = {}
+    for row in rows:
+        per_station[row["station_id"]] = per_station.get(row["station_id"], 0) + 1
+    assert all(count <= 10 for count in per_station.values())
+
+    bad = client.post("/metrics/timeseries", json={**payload, "interval": "month"})
+    assert bad.status_code == 422
+
+def test_prometheus_metrics_endpoint():
+    client.post("/sensors", json={})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'weather_api_request_duration_seconds_count{method="POST",route="/sensors",status="200"}' in text
+    assert 'weather_db_query_duration_seconds_bucket{kind="sensor"' in text
+    assert "weather_result_cache_entries" in text
+
+def test_debug_slow_queries_endpoint():
+    response = client.get("/debug/slow-queries", params={"top": 3})
+    assert response.status_code == 200
+    body = response.json()
+    assert "threshold_ms" in body and isinstance(body["queries"], list)
+
+def test_sensors_and_stats_select_by_area():
+    response = client.post("/sensors", json={"lat": 53.33, "lon": -6.25, "radius_km": 10})
+    assert response.status_code == 200
+    assert {row["city"] for row in response.json()} == {"Dublin"}
+
+    payload = {
+        "metrics": ["Temperature"],
+        "stat": "avg",
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07",
+        "bbox": [53.0, -9.5, 53.5, -8.5],
+    }
+    response = client.post("/metrics/stat", json=payload)
+    assert response.status_code == 200
+    assert {row["city"] for row in response.json()} == {"Galway"}
+
+    assert client.post("/sensors", json={"lat": 53.33}).status_code == 422
+    bad_box = dict(payload, bbox=[55.0, -9.5, 53.0, -8.5])
+    assert client.post("/metrics/stat", json=bad_box).status_code == 422
+
+def test_ingest_endpoint_accepts_json_ndjson_and_arrow(monkeypatch):
+    import json
+
+    import pandas as pd
+    import pyarrow as pa
+
+    from app.core.config import ingest_queue
+    from app.db.duck_db_utils import WeatherDB
+
+    target = WeatherDB(":memory:")
+    monkeypatch.setattr(ingest_queue, "db", target)
+    rows = [
+        {
+            "station_id": "TESTVILLE_10.0_10.0",
+            "city": "Testville",
+            "country": "Nowhere",
+            "Datetime": f"2025-03-01T0{hour}:00:00Z",
+            "Temperature": 10.0 + hour,
+            "Humidity": 80,
+            "WindSpeed": 3.5,
+            "WeatherDescription": "clear sky",
+        }
+        for hour in range(3)
+    ]
+
+    response = client.post("/ingest", params={"wait": True}, json=rows)
+    assert response.status_code == 200
+    assert response.json() == {"written": 3}
+
+    ndjson = "\n".join(json.dumps(dict(row, Temperature=0.0)) for row in rows)
+    response = client.post(
+        "/ingest",
+        params={"wait": True},
+        content=ndjson,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.json() == {"written": 3}
+
+    df = pd.DataFrame(rows[:1]).assign(Datetime=pd.Timestamp("2025-03-02", tz="UTC"))
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(df)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    response = client.post(
+        "/ingest",
+        content=sink.getvalue().to_pybytes(),
+        headers={"Content-Type": "application/vnd.apache.arrow.stream"},
+    )
+    assert response.status_code == 202
+    assert response.json()["accepted"] == 1
+    ingest_queue.stop()
+
+    stored = target.con.execute(
+        "SELECT count(*), sum(Temperature) FROM weather"
+    ).fetchone()
+    assert stored == (4, 10.0)
+    assert target.get_sensor_details(["TESTVILLE_10.0_10.0"])["lat"].tolist() == [10.0]
+
+    missing = [{k: v for k, v in rows[0].items() if k != "city"}]
+    response = client.post("/ingest", json=missing)
+    assert response.status_code == 422
+    assert "city" in response.json()["detail"]
+    response = client.post(
+        "/ingest", content=b"a,b", headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 415
+
+    monkeypatch.setattr(ingest_queue, "max_rows", 2)
+    response = client.post("/ingest", json=rows)
+    assert response.status_code == 413
+    assert "Retry-After" not in response.headers
+
+def test_post_metrics_rolling_windows_and_anomalies():
+    payload = {
+        "metrics": ["Temperature", "WindSpeed"],
+        "window": "24h",
+        "start_date": "2025-03-01",
+        "end_date": "2025-03-07",
+        "city": "Dublin",
+    }
+    response = client.post("/metrics/rolling", json=payload)
+    assert response.status_code == 200
+    rows = response.json()
+    assert rows and {row["city"] for row in rows} == {"Dublin"}
+    for column in ("Temperature_avg", "WindSpeed_max", "WindSpeed_zscore"):
+        assert column in rows[0]
+
+    incremental = client.post("/metrics/rolling", json={**payload, "incremental": True})
+    assert incremental.status_code == 200
+    assert len(incremental.json()) == len(rows)
+
+    alerts = client.post("/metrics/rolling", json={**payload, "anomalies_only": True})
+    assert all(
+        row["Temperature_anomaly"] or row["WindSpeed_anomaly"] for row in alerts.json()
+    )
+
+    assert client.post("/metrics/rolling", json={**payload, "window": "1w"}).status_code == 422
+    bad = {**payload, "window": "3h", "incremental": True}
+    assert client.post("/metrics/rolling", json=bad).status_code == 400
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pandas as pd
+
+from app.core.cache import ResultCache
+from app.db.duck_db_utils import WeatherDB
+
+
+def test_lru_evicts_oldest_entry():
+    cache = ResultCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, [key], cache.watermark)
+    assert cache.get("a") is None
+    assert cache.get("c").value == ["c"]
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_entries_miss():
+    cache = ResultCache(ttl_seconds=0)
+    cache.put("a", [1], cache.watermark)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_write_evicts_only_overlapping_entries():
+    cache = ResultCache()
+    cache.put("march", [1], cache.watermark, date(2025, 3, 1), date(2025, 3, 7))
+    cache.put("april", [2], cache.watermark, date(2025, 4, 1), date(2025, 4, 7))
+    cache.put("galway", [3], cache.watermark, stations=["GAL1"])
+
+    cache.invalidate(
+        {"DUB1"}, pd.Timestamp("2025-03-03 10:00"), pd.Timestamp("2025-03-03 12:00")
+    )
+
+    assert cache.get("march") is None
+    assert cache.get("april").value == [2]
+    assert cache.get("galway").value == [3]
+
+
+def test_result_computed_before_a_write_is_not_cached():
+    cache = ResultCache()
+    watermark = cache.watermark
+    cache.invalidate()
+    entry = cache.put("a", [1], watermark)
+    assert entry.etag
+    assert cache.get("a") is None
+
+
+def test_db_writes_notify_cache():
+    db = WeatherDB(":memory:")
+    cache = ResultCache()
+    db.write_listeners.append(cache.invalidate)
+    cache.put("march", [1], cache.watermark, date(2025, 3, 1), date(2025, 3, 7))
+
+    db.upsert_metrics([{
+        "station_id": "DUB1", "city": "Dublin", "country": "Ireland",
+        "Datetime": "2025-03-02 12:00:00", "Temperature": 10.0,
+        "Humidity": 60, "WindSpeed": 5.0, "WeatherDescription": "clear",
+    }])
+    assert cache.get("march") is None
+    assert cache.stats()["invalidations"] == 1
@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 from app.db.duck_db_utils import WeatherDB
 from datetime import date
@@ -31,7 +32,9 @@ def test_metric_stats_with_dummy_data(db):
 
 def test_invalid_stat_raises_value_error(db):
     with pytest.raises(ValueError):
-        db.get_metric_stats("Temperature", "median")
+        db.get_metric_stats("Temperature", "geomean")
+    with pytest.raises(ValueError):
+        db.get_metric_stats("Temperature", "median", mode="fuzzy")
 
 def test_out_of_range_date_returns_empty(db):
     db.con.execute("""
@@ -47,4 +50,633 @@ def test_unknown_station_id_filter(db):
         ('DUB1', 'Dublin', 'Ireland', '2025-03-01 12:00:00', 12.5, 60, 5.2, 'clear')
     """)
     df = db.get_metric_stats("Temperature", "avg", station_ids=["FAKE1"])
-    assert df.empty
\ No newline at end of file
+    assert df.empty
+
+def test_multi_metric_multi_stat_single_row_per_station(db):
+    db.con.execute("""
+        INSERT INTO weather VALUES
+        ('DUB1', 'Dublin', 'Ireland', '2025-03-01 12:00:00', 10.0, 60, 5.0, 'clear'),
+        ('DUB1', 'Dublin', 'Ireland', '2025-03-01 13:00:00', 14.0, 70, 7.0, 'clear'),
+        ('GAL1', 'Galway', 'Ireland', '2025-03-01 12:00:00', 8.0, 80, 9.0, 'fog')
+    """)
+    df = db.get_metric_stats(
+        ["Temperature", "Humidity"], ["avg", "max"],
+        start_date=date(2025, 3, 1),
+        end_date=date(2025, 3, 2)
+    )
+
+    assert list(df["station_id"]) == ["DUB1", "GAL1"]
+    assert list(df.columns[3:]) == [
+        "avg_Temperature", "max_Temperature", "avg_Humidity", "max_Humidity"
+    ]
+    dub = df.iloc[0]
+    assert dub["avg_Temperature"] == 12.0
+    assert dub["max_Humidity"] == 70
+
+
+def test_invalid_metric_raises_value_error(db):
+    with pytest.raises(ValueError):
+        db.get_metric_stats("Rainfall", "avg")
+
+
+def test_upsert_metrics_overwrites_stale_rows():
+    db = WeatherDB(":memory:")
+    row = {
+        "station_id": "DUB1", "city": "Dublin", "country": "Ireland",
+        "Datetime": "2025-03-01 12:00:00", "Temperature": 10.0,
+        "Humidity": 60, "WindSpeed": 5.0, "WeatherDescription": "clear",
+    }
+    other_station = dict(row, station_id="GAL1", city="Galway")
+    assert db.upsert_metrics([row, other_station]) == 2
+
+    db.upsert_metrics([dict(row, Temperature=13.5, WeatherDescription="fog")])
+
+    rows = db.con.execute(
+        "SELECT station_id, Temperature, WeatherDescription "
+        "FROM weather JOIN stations USING (station_key) ORDER BY station_id"
+    ).fetchall()
+    assert rows == [("DUB1", 13.5, "fog"), ("GAL1", 10.0, "clear")]
+
+
+def _reading(station_id, dt, temperature):
+    return {
+        "station_id": station_id, "city": "Dublin", "country": "Ireland",
+        "Datetime": dt, "Temperature": temperature,
+        "Humidity": 60, "WindSpeed": 5.0, "WeatherDescription": "clear",
+    }
+
+
+def test_latest_readings_follow_every_write():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics([
+        _reading("DUB1", "2025-03-01 12:00:00", 10.0),
+        _reading("DUB1", "2025-03-01 15:00:00", 11.0),
+        _reading("DUB2", "2025-03-01 12:00:00", 9.0),
+    ])
+    # Older reading must not replace the latest one
+    db.upsert_metrics([_reading("DUB1", "2025-03-01 09:00:00", 5.0)])
+    # Refreshed value at the latest timestamp overwrites it
+    db.upsert_metrics([_reading("DUB2", "2025-03-01 12:00:00", 9.5)])
+
+    df = db.get_sensor_details()
+    assert list(df["station_id"]) == ["DUB1", "DUB2"]
+    assert list(df["Temperature"]) == [11.0, 9.5]
+
+    df = db.get_sensor_details(station_ids=["DUB2"])
+    assert list(df["station_id"]) == ["DUB2"]
+
+
+def test_sensor_details_carry_coordinates():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics([_reading("GALWAY_53.27_-9.05", "2025-03-01 12:00:00", 10.0)])
+    row = db.get_sensor_details().iloc[0]
+    assert (row["lat"], row["lon"]) == (53.27, -9.05)
+
+    db.update_stations([
+        {"station_id": "GALWAY_53.27_-9.05", "name": "Galway Docks", "elevation": 12.0},
+        {"station_id": "UNKNOWN", "name": "ignored"},
+    ])
+    row = db.get_sensor_details().iloc[0]
+    assert (row["name"], row["lat"], row["elevation"]) == ("Galway Docks", 53.27, 12.0)
+
+
+def test_legacy_table_is_migrated_to_station_keys(db):
+    db.con.execute("""
+        INSERT INTO weather VALUES
+        ('DUB1', 'Dublin', 'Ireland', '2025-03-01 12:00:00', 10.0, 60, 5.0, 'clear'),
+        ('DUB1', 'Dublin', 'Ireland', '2025-03-01 12:00:00', 10.0, 60, 5.0, 'clear'),
+        ('DUB1', 'Dublin', 'Ireland', '2025-03-01 13:00:00', 14.0, 70, 7.0, 'clear'),
+        ('GAL1', 'Galway', 'Ireland', '2025-03-01 12:00:00', 8.0, 80, 9.0, 'fog')
+    """)
+    assert db.migrate_station_keys() == 2
+    assert db.migrate_station_keys() is None
+
+    columns = [row[0] for row in db.con.execute("DESCRIBE weather").fetchall()]
+    assert columns[0] == "station_key" and "station_id" not in columns
+    assert db.con.execute("SELECT COUNT(*) FROM weather").fetchone()[0] == 3
+
+    db.upsert_metrics([_reading("DUB1", "2025-03-01 14:00:00", 18.0)])
+    df = db.get_metric_stats(
+        "Temperature", ["avg", "count"],
+        start_date=date(2025, 3, 1), end_date=date(2025, 3, 2),
+    )
+    assert list(df["station_id"]) == ["DUB1", "GAL1"]
+    assert list(df["count_Temperature"]) == [3, 1]
+    assert list(db.get_sensor_details()["Temperature"]) == [18.0, 8.0]
+
+
+def test_insert_csv_updates_latest_and_rebuild_matches(tmp_path):
+    csv = tmp_path / "weather.csv"
+    csv.write_text(
+        "station_id,city,country,Datetime,Temperature,Humidity,WindSpeed,WeatherDescription\n"
+        "DUB1,Dublin,Ireland,2025-03-01 00:00:00,9.0,74,4.3,sunny\n"
+        "DUB1,Dublin,Ireland,2025-03-01 01:00:00,9.5,75,4.1,fog\n"
+    )
+    db = WeatherDB(":memory:")
+    db.insert_csv(str(csv))
+    before = db.get_sensor_details()
+    assert before.iloc[0]["Temperature"] == 9.5
+
+    db.con.execute("DELETE FROM latest_readings")
+    assert db.rebuild_latest_readings() == 1
+    assert db.get_sensor_details().equals(before)
+
+
+def test_insert_csv_latest_keeps_missing_values_of_newest_row(tmp_path):
+    csv = tmp_path / "weather.csv"
+    csv.write_text(
+        "station_id,city,country,Datetime,Temperature,Humidity,WindSpeed,WeatherDescription\n"
+        "DUB1,Dublin,Ireland,2025-03-01 02:00:00,,75,4.1,fog\n"
+        "DUB1,Dublin,Ireland,2025-03-01 00:00:00,9.0,74,4.3,sunny\n"
+        "DUB1,Dublin,Ireland,not a date,9.0,74,4.3,sunny\n"
+    )
+    db = WeatherDB(":memory:")
+    assert db.insert_csv(str(csv)) == 2
+    row = db.get_sensor_details().iloc[0]
+    assert pd.isna(row["Temperature"])
+    assert (row["Humidity"], row["WeatherDescription"]) == (75, "fog")
+
+
+def _random_readings(n=2000, seed=7):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    stations = [("DUB1", "Dublin"), ("DUB2", "Dublin"), ("GAL1", "Galway")]
+    picks = rng.integers(0, len(stations), n)
+    minutes = np.sort(rng.choice(60 * 24 * 20, n, replace=False))
+    return pd.DataFrame({
+        "station_id": [stations[i][0] for i in picks],
+        "city": [stations[i][1] for i in picks],
+        "country": "Ireland",
+        "Datetime": pd.Timestamp("2025-03-01") + pd.to_timedelta(minutes, unit="m"),
+        "Temperature": rng.normal(10, 4, n).round(2),
+        "Humidity": rng.integers(40, 100, n),
+        "WindSpeed": rng.uniform(0, 15, n).round(2),
+        "WeatherDescription": "clear",
+    })
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2025, 3, 2), date(2025, 3, 9)),
+    ("2025-03-02 05:30:00", "2025-03-11 17:45:00"),
+    ("2025-03-04 10:15:00", "2025-03-04 13:00:00"),
+    ("2025-03-04 10:15:00", "2025-03-04 10:50:00"),
+    (date(2025, 2, 1), date(2025, 4, 1)),
+])
+def test_rollup_stats_match_raw(start, end):
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    metrics = ["Temperature", "Humidity", "WindSpeed"]
+    stats = ["avg", "min", "max", "sum"]
+
+    for city in (None, "galway"):
+        raw = db.get_metric_stats(
+            metrics, stats, start_date=start, end_date=end, city=city,
+            use_rollups=False,
+        )
+        rolled = db.get_metric_stats(
+            metrics, stats, start_date=start, end_date=end, city=city
+        )
+        pd.testing.assert_frame_equal(raw, rolled, check_exact=False, rtol=1e-9)
+
+
+def test_rollups_follow_upserted_overwrites():
+    db = WeatherDB(":memory:")
+    df = _random_readings(200)
+    db.upsert_metrics(df)
+    # Overwrite a bucket's minimum with a higher value
+    coldest = df.loc[df["Temperature"].idxmin()].to_dict()
+    db.upsert_metrics([dict(coldest, Temperature=99.0)])
+
+    args = (["Temperature"], ["min", "max", "avg"], date(2025, 3, 1), date(2025, 3, 21))
+    raw = db.get_metric_stats(*args, use_rollups=False)
+    rolled = db.get_metric_stats(*args)
+    pd.testing.assert_frame_equal(raw, rolled, check_exact=False, rtol=1e-9)
+    assert rolled["max_Temperature"].max() == 99.0
+
+
+def test_merged_rollups_match_a_rebuild():
+    db = WeatherDB(":memory:")
+    df = _random_readings(600)
+    df.loc[df.index % 7 == 0, "Temperature"] = None
+    # Batches appended into buckets the previous ones already opened
+    for part in range(3):
+        db.upsert_metrics(df[df.index % 3 == part])
+    # A batch mixing new readings and overwrites in the same buckets
+    mixed = pd.concat([
+        _random_readings(50, seed=8),
+        df.iloc[::40].assign(Temperature=-30.0),
+    ])
+    db.upsert_metrics(mixed)
+    # Inserts keep the stored readings and only add the new ones
+    db.con.register("extra_df", pd.concat([df.iloc[::9], _random_readings(40, 9)]))
+    assert db.insert_query("SELECT * FROM extra_df") == 40
+
+    def rollups():
+        return {
+            table: db.con.execute(
+                f"SELECT * FROM {table} ORDER BY station_key, bucket"
+            ).fetchdf()
+            for table in ("weather_hourly", "weather_daily")
+        }
+
+    merged = rollups()
+    db.rebuild_rollups()
+    for table, rebuilt in rollups().items():
+        pd.testing.assert_frame_equal(
+            merged[table], rebuilt, check_exact=False, rtol=1e-9
+        )
+
+
+def test_insert_csv_streams_globs_and_labelled_headers(tmp_path):
+    (tmp_path / "a.csv").write_text(
+        "station_id,city,country,Datetime,Temperature,Humidity,WindSpeed,WeatherDescription\n"
+        "DUB1,Dublin,Ireland,2025-03-01 00:00:00,9.0,74,4.3,sunny\n"
+        "DUB1,Dublin,Ireland,2025-03-01 01:00:00,9.5,75,4.1,fog\n"
+    )
+    (tmp_path / "b.csv").write_text(
+        "station_id,city,country,Datetime,Temperature (°C),Humidity (%),"
+        "Wind Speed (m/s),Weather Description\n"
+        "GAL1,Galway,Ireland,2025-03-01 00:00:00,7.0,80,6.0,overcast\n"
+        "DUB1,Dublin,Ireland,2025-03-01 01:00:00,1.0,10,1.0,duplicate\n"
+    )
+    db = WeatherDB(":memory:")
+
+    assert db.insert_csv(str(tmp_path / "*.csv")) == 3
+    assert db.insert_csv(str(tmp_path / "*.csv")) == 0
+
+    rows = db.con.execute(
+        "SELECT station_id, Temperature, WeatherDescription "
+        "FROM weather JOIN stations USING (station_key) ORDER BY ALL"
+    ).fetchall()
+    assert rows == [
+        ("DUB1", 9.0, "sunny"), ("DUB1", 9.5, "fog"), ("GAL1", 7.0, "overcast")
+    ]
+    stats = db.get_metric_stats(
+        "Temperature", "sum", start_date=date(2025, 2, 28), end_date=date(2025, 3, 2)
+    )
+    assert list(stats["sum_Temperature"]) == [18.5, 7.0]
+
+
+def test_insert_csv_without_datetime_raises(tmp_path):
+    csv = tmp_path / "bad.csv"
+    csv.write_text("station_id,city\nDUB1,Dublin\n")
+    with pytest.raises(ValueError):
+        WeatherDB(":memory:").insert_csv(str(csv))
+
+
+def test_insert_csv_path_with_quotes(tmp_path):
+    folder = tmp_path / "o'brien's exports"
+    folder.mkdir()
+    csv = folder / "it's.csv"
+    pd.DataFrame([_reading("DUB1", "2025-03-01 00:00:00", 9.0)]).to_csv(
+        csv, index=False
+    )
+    db = WeatherDB(":memory:")
+    assert db.insert_csv_if_changed(str(csv)) == 1
+    assert db.insert_csv(str(folder / "*.csv")) == 0
+
+
+def test_insert_csv_if_changed_uses_manifest(tmp_path):
+    import os
+
+    csv = tmp_path / "weather.csv"
+    header = "station_id,city,country,Datetime,Temperature,Humidity,WindSpeed,WeatherDescription\n"
+    csv.write_text(header + "DUB1,Dublin,Ireland,2025-03-01 00:00:00,9.0,74,4.3,sunny\n")
+    db = WeatherDB(":memory:")
+
+    assert db.insert_csv_if_changed(str(csv)) == 1
+    assert db.insert_csv_if_changed(str(csv)) is None
+
+    # Touched but identical content is skipped on the hash
+    stat = csv.stat()
+    os.utime(csv, (stat.st_atime, stat.st_mtime + 10))
+    assert db.insert_csv_if_changed(str(csv)) is None
+
+    csv.write_text(csv.read_text() + "DUB1,Dublin,Ireland,2025-03-01 01:00:00,9.5,75,4.1,fog\n")
+    assert db.insert_csv_if_changed(str(csv)) == 1
+    manifest = db.con.execute("SELECT rows_inserted FROM ingested_files").fetchall()
+    assert manifest == [(1,)]
+
+
+def test_reads_run_alongside_serialized_writes():
+    from concurrent.futures import ThreadPoolExecutor
+
+    db = WeatherDB(":memory:")
+    df = _random_readings(500)
+    db.upsert_metrics(df.iloc[:100])
+
+    def write(i):
+        return db.upsert_metrics(df.iloc[100 + i * 50: 150 + i * 50])
+
+    def read(_):
+        return len(db.get_metric_stats(
+            "Temperature", "avg", start_date=date(2025, 3, 1), end_date=date(2025, 3, 21)
+        ))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        writes = [pool.submit(write, i) for i in range(8)]
+        reads = [pool.submit(read, i) for i in range(32)]
+        assert sum(f.result() for f in writes) == 400
+        assert all(f.result() > 0 for f in reads)
+
+    assert db.con.execute("SELECT COUNT(*) FROM weather").fetchone()[0] == 500
+
+
+def test_archived_months_stay_queryable(tmp_path):
+    db = WeatherDB(":memory:", archive_dir=str(tmp_path / "archive"))
+    df = _random_readings(3000)
+    df["Datetime"] = pd.Timestamp("2025-01-20") + (
+        df["Datetime"] - pd.Timestamp("2025-03-01")
+    ) * 3
+    df.loc[df["city"] == "Galway", "city"] = "New Galway"
+    db.upsert_metrics(df)
+
+    args = (["Temperature", "Humidity"], ["avg", "min", "max", "sum"])
+    ranges = [
+        (date(2025, 1, 1), date(2025, 4, 1)),
+        ("2025-01-25 07:30:00", "2025-02-03 10:10:00"),
+    ]
+    before = {
+        (start, city): db.get_metric_stats(
+            *args, start_date=start, end_date=end, city=city, use_rollups=False
+        )
+        for start, end in ranges for city in (None, "new galway")
+    }
+
+    moved = db.archive_before("2025-03-01")
+    hot = db.con.execute("SELECT COUNT(*) FROM weather").fetchone()[0]
+    assert moved > 0 and hot == len(df) - moved
+    assert (tmp_path / "archive" / "year=2025" / "month=2").is_dir()
+
+    for start, end in ranges:
+        for city in (None, "new galway"):
+            for use_rollups in (True, False):
+                after = db.get_metric_stats(
+                    *args, start_date=start, end_date=end, city=city,
+                    use_rollups=use_rollups,
+                )
+                pd.testing.assert_frame_equal(
+                    before[(start, city)], after, check_exact=False, rtol=1e-9
+                )
+
+    restored = db.restore_month(2025, 2)
+    assert restored > 0
+    assert not (tmp_path / "archive" / "year=2025" / "month=2").exists()
+    assert db.con.execute("SELECT COUNT(*) FROM weather").fetchone()[0] == hot + restored
+
+
+def test_reingesting_archived_readings_is_not_double_counted(tmp_path):
+    db = WeatherDB(":memory:", archive_dir=str(tmp_path / "archive"))
+    readings = [
+        _reading("DUB1", f"2025-02-10 0{h}:00:00", 10.0 * (h + 1)) for h in range(4)
+    ]
+    db.upsert_metrics(readings)
+    db.archive_before("2025-03-01")
+
+    args = ("Temperature", ["count", "sum"], date(2025, 2, 1), date(2025, 3, 1))
+
+    def totals():
+        return [
+            tuple(db.get_metric_stats(*args, use_rollups=u).iloc[0][-2:])
+            for u in (True, False)
+        ]
+
+    assert totals() == [(4, 100.0)] * 2
+
+    # Re-delivered by an upsert (even with other values), a query and a CSV
+    db.upsert_metrics([readings[0], dict(readings[1], Temperature=99.0)])
+    db.con.register("again_df", pd.DataFrame(readings))
+    assert db.insert_query("SELECT * FROM again_df") == 0
+    csv = tmp_path / "again.csv"
+    pd.DataFrame(readings).to_csv(csv, index=False)
+    assert db.insert_csv(str(csv)) == 0
+    assert totals() == [(4, 100.0)] * 2
+
+    # A reading the archive does not hold is still accepted
+    db.upsert_metrics([_reading("DUB1", "2025-02-10 05:00:00", 50.0)])
+    assert totals() == [(5, 150.0)] * 2
+
+
+def test_archive_under_a_path_with_quotes(tmp_path):
+    db = WeatherDB(":memory:", archive_dir=str(tmp_path / "o'brien's archive"))
+    db.upsert_metrics(
+        [_reading("DUB1", f"2025-02-10 0{h}:00:00", 10.0) for h in range(4)]
+        + [_reading("DUB1", "2025-03-10 00:00:00", 10.0)]
+    )
+    assert db.archive_before("2025-03-01") == 4
+
+    def count():
+        return db.get_metric_stats(
+            "Temperature", "count", date(2025, 2, 1), date(2025, 3, 31),
+            city="Dublin", use_rollups=False,
+        )["count_Temperature"].tolist()
+
+    assert count() == [5]
+    db.upsert_metrics([_reading("DUB1", "2025-02-10 00:00:00", 10.0)])
+    assert count() == [5]
+    assert db.restore_month(2025, 2) == 4
+    assert count() == [5]
+
+
+def test_station_and_city_filters_are_bound_not_inlined(tmp_path):
+    db = WeatherDB(":memory:", archive_dir=str(tmp_path / "archive"))
+    quoted = [
+        dict(_reading("O'BRIEN_1", day, 1.0), city="Port O'Neill")
+        for day in pd.date_range("2025-02-01 12:00", "2025-03-03 12:00", freq="D")
+    ]
+    db.upsert_metrics(quoted + [_reading("DUB1", "2025-02-10 12:00:00", 5.0)])
+    db.archive_before("2025-03-01")
+
+    span = dict(start_date=date(2025, 2, 1), end_date=date(2025, 3, 31))
+    for filters in ({"station_ids": ["O'BRIEN_1"]}, {"city": "port o'neill"}):
+        for use_rollups in (True, False):
+            stats = db.get_metric_stats(
+                "Temperature", "count", use_rollups=use_rollups, **span, **filters
+            )
+            assert stats["station_id"].tolist() == ["O'BRIEN_1"]
+            assert stats["count_Temperature"].tolist() == [31]
+        series = db.get_metric_timeseries(
+            "Temperature", interval="week", **span, **filters
+        )
+        assert set(series["station_id"]) == {"O'BRIEN_1"}
+        rolling = db.get_metric_rolling("Temperature", window="7d", **span, **filters)
+        assert len(rolling) == 31
+
+    assert db.get_sensor_details(["O'BRIEN_1"])["city"].tolist() == ["Port O'Neill"]
+    injected = db.get_metric_stats(
+        "Temperature", "count", station_ids=["x') OR TRUE OR ('"], **span
+    )
+    assert injected.empty
+
+
+@pytest.mark.parametrize("interval", ["hour", "day", "week"])
+def test_rollup_timeseries_match_raw(interval):
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    args = (["Temperature", "Humidity"], ["avg", "max"], interval,
+            "2025-03-02 05:30:00", "2025-03-18 17:45:00")
+
+    raw = db.get_metric_timeseries(*args, use_rollups=False)
+    rolled = db.get_metric_timeseries(*args)
+    assert len(raw) > 0
+    pd.testing.assert_frame_equal(raw, rolled, check_exact=False, rtol=1e-9)
+
+
+def test_timeseries_downsampled_with_lttb():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    full = db.get_metric_timeseries(
+        "Temperature", interval="hour", start_date=date(2025, 3, 1),
+        end_date=date(2025, 3, 21),
+    )
+    small = db.get_metric_timeseries(
+        "Temperature", interval="hour", start_date=date(2025, 3, 1),
+        end_date=date(2025, 3, 21), max_points=50,
+    )
+    for station, series in small.groupby("station_id"):
+        original = full[full["station_id"] == station]
+        assert len(series) == 50
+        # Endpoints are always kept
+        assert series["bucket"].iloc[0] == original["bucket"].iloc[0]
+        assert series["bucket"].iloc[-1] == original["bucket"].iloc[-1]
+
+
+def test_downsampling_several_metrics_keeps_max_points_rows():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    args = dict(
+        interval="hour", start_date=date(2025, 3, 1), end_date=date(2025, 3, 21)
+    )
+    metrics = ["Temperature", "Humidity", "WindSpeed"]
+    full = db.get_metric_timeseries(metrics, ["avg", "max"], **args)
+    small = db.get_metric_timeseries(metrics, ["avg", "max"], max_points=10, **args)
+    for station, series in small.groupby("station_id"):
+        assert len(series) == 10
+        original = full[full["station_id"] == station].reset_index(drop=True)
+        assert series["bucket"].iloc[0] == original["bucket"].iloc[0]
+        # Rows stay whole, every value comes from one original bucket
+        rows = original.set_index("bucket").loc[series["bucket"]]
+        pd.testing.assert_frame_equal(
+            rows.reset_index()[series.columns], series.reset_index(drop=True)
+        )
+
+
+def test_lttb_keeps_short_series_and_peaks():
+    import numpy as np
+    from app.db.downsample import lttb_indices
+
+    assert list(lttb_indices([0, 1, 2], [1, 2, 3], 10)) == [0, 1, 2]
+
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[500] = 100.0
+    chosen = lttb_indices(x, y, 20)
+    assert len(chosen) == 20
+    assert 500 in chosen
+
+
+def test_extended_stats_match_pandas():
+    import numpy as np
+
+    db = WeatherDB(":memory:")
+    df = _random_readings()
+    db.upsert_metrics(df)
+    stats = ["median", "p90", "p95", "p99", "stddev", "variance", "count"]
+    result = db.get_metric_stats(
+        "Temperature", stats, start_date=date(2025, 3, 1), end_date=date(2025, 3, 22)
+    ).set_index("station_id")
+
+    for station, rows in df.groupby("station_id"):
+        values = rows["Temperature"]
+        row = result.loc[station]
+        assert row["count_Temperature"] == len(values)
+        assert row["median_Temperature"] == pytest.approx(values.median())
+        assert row["p90_Temperature"] == pytest.approx(np.percentile(values, 90))
+        assert row["stddev_Temperature"] == pytest.approx(values.std())
+        assert row["variance_Temperature"] == pytest.approx(values.var())
+
+    approx = db.get_metric_stats(
+        "Temperature", ["median", "p95"], start_date=date(2025, 3, 1),
+        end_date=date(2025, 3, 22), mode="approx",
+    ).set_index("station_id")
+    # T-Digest estimates land close to the exact quantiles
+    spread = df["Temperature"].std()
+    for stat in ("median", "p95"):
+        error = (approx[f"{stat}_Temperature"] - result[f"{stat}_Temperature"]).abs()
+        assert (error < 0.1 * spread).all()
+
+
+def test_rollup_count_matches_raw():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    args = (["Humidity"], ["count", "avg"], "2025-03-02 05:30:00", date(2025, 3, 9))
+    pd.testing.assert_frame_equal(
+        db.get_metric_stats(*args, use_rollups=False), db.get_metric_stats(*args)
+    )
+
+
+def test_rolling_window_matches_pandas_and_flags_spikes():
+    db = WeatherDB(":memory:")
+    df = _random_readings(500)
+    db.upsert_metrics(df)
+    db.upsert_metrics([_reading("DUB1", "2025-03-10 12:00:00", 60.0)])
+
+    result = db.get_metric_rolling(
+        "Temperature", "24h", start_date=date(2025, 3, 5), end_date=date(2025, 3, 15),
+        station_ids=["DUB1"],
+    )
+    series = (
+        pd.concat([df, pd.DataFrame([_reading("DUB1", "2025-03-10 12:00:00", 60.0)])])
+        .assign(Datetime=lambda d: pd.to_datetime(d["Datetime"]))
+        .query("station_id == 'DUB1'")
+        .set_index("Datetime")["Temperature"]
+        .sort_index()
+    )
+    window = series.rolling("24h", closed="both")
+    expected = window.mean()[result["Datetime"]].to_numpy()
+    assert result["Temperature_avg"].to_numpy() == pytest.approx(expected)
+    assert result["Temperature_max"].max() == 60.0
+
+    anomalies = db.get_metric_rolling(
+        "Temperature", "24h", start_date=date(2025, 3, 5), end_date=date(2025, 3, 15),
+        z_threshold=5, anomalies_only=True,
+    )
+    assert anomalies["Temperature_anomaly"].all()
+    spike = anomalies.loc[anomalies["Temperature_zscore"].idxmax()]
+    assert (spike["station_id"], spike["Temperature"]) == ("DUB1", 60.0)
+
+
+def test_incremental_rolling_recomputes_only_touched_windows():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics(_random_readings())
+    args = (["Temperature", "WindSpeed"], "24h", date(2025, 3, 2), date(2025, 3, 20))
+
+    full = db.get_metric_rolling(*args)
+    pd.testing.assert_frame_equal(db.get_metric_rolling(*args, incremental=True), full)
+    assert db.refresh_rolling("24h") == 0
+
+    db.upsert_metrics([
+        _reading("DUB1", "2025-03-06 12:30:00", 35.0),
+        _reading("DUB1", "2025-03-20 08:00:00", 12.0),
+    ])
+    before = db.con.execute(
+        "SELECT * FROM weather_rolling WHERE station_key != "
+        "(SELECT station_key FROM stations WHERE station_id = 'DUB1')"
+        "ORDER BY station_key, Datetime"
+    ).fetchdf()
+    assert db.refresh_rolling("24h") == 1
+    after = db.con.execute(
+        "SELECT * FROM weather_rolling WHERE station_key != "
+        "(SELECT station_key FROM stations WHERE station_id = 'DUB1')"
+        "ORDER BY station_key, Datetime"
+    ).fetchdf()
+    pd.testing.assert_frame_equal(before, after)
+    pd.testing.assert_frame_equal(
+        db.get_metric_rolling(*args, incremental=True), db.get_metric_rolling(*args)
+    )
+
+    with pytest.raises(ValueError):
+        db.get_metric_rolling(*args[:1], "5h", incremental=True)
+    with pytest.raises(ValueError):
+        db.get_metric_rolling("Temperature", "fortnight")
@@ -0,0 +1,107 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from app.core.ingest_queue import (
+    IngestQueue,
+    PayloadTooLarge,
+    QueueFull,
+    coerce_readings,
+)
+
+
+def readings(n, start="2025-03-01"):
+    return pd.DataFrame(
+        {
+            "station_id": "DUB1",
+            "city": "Dublin",
+            "country": "Ireland",
+            "Datetime": pd.date_range(start, periods=n, freq="h", tz="UTC"),
+            "Temperature": 10.0,
+            "Humidity": 80,
+            "WindSpeed": 3.0,
+            "WeatherDescription": "clear sky",
+        }
+    )
+
+
+class RecordingDB:
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def upsert_metrics(self, df, source="upsert"):
+        if self.gate:
+            self.gate.wait(5)
+        if (df["station_id"] == "BAD").any():
+            raise ValueError("bad reading")
+        self.batches.append(len(df))
+        return len(df)
+
+
+def test_coerce_readings_parses_epoch_seconds_and_rejects_missing_columns():
+    df = readings(1).assign(Datetime=1740787200, Humidity="81")
+    coerced = coerce_readings(df)
+    assert coerced["Datetime"].iloc[0] == pd.Timestamp("2025-03-01", tz="UTC")
+    assert coerced["Humidity"].iloc[0] == 81
+    with pytest.raises(ValueError, match="country"):
+        coerce_readings(df.drop(columns=["country"]))
+    with pytest.raises(ValueError):
+        coerce_readings(df.assign(Temperature="warm"))
+
+
+def test_small_submits_are_flushed_together_after_the_interval():
+    db = RecordingDB()
+    queue = IngestQueue(db, batch_rows=1000, flush_seconds=0.2)
+    futures = [queue.submit(readings(10, f"2025-03-0{day}")) for day in (1, 2, 3)]
+    assert [f.result(timeout=5) for f in futures] == [10, 10, 10]
+    assert db.batches == [30]
+    queue.stop()
+
+
+def test_full_batches_flush_without_waiting():
+    db = RecordingDB()
+    queue = IngestQueue(db, batch_rows=50, flush_seconds=60)
+    assert queue.submit(readings(60)).result(timeout=5) == 60
+    assert db.batches == [60]
+    queue.stop()
+
+
+def test_full_queue_rejects_until_the_writer_catches_up():
+    gate = threading.Event()
+    db = RecordingDB(gate)
+    queue = IngestQueue(db, max_rows=100, batch_rows=10, flush_seconds=0)
+    first = queue.submit(readings(80))
+    with pytest.raises(QueueFull):
+        queue.submit(readings(30))
+    assert queue.stats()["rejected_rows"] == 30
+
+    gate.set()
+    first.result(timeout=5)
+    assert queue.submit(readings(30)).result(timeout=5) == 30
+    queue.stop()
+    assert queue.stats()["queued_rows"] == 0
+
+
+def test_payload_over_the_queue_limit_is_rejected_outright():
+    queue = IngestQueue(RecordingDB(), max_rows=100)
+    with pytest.raises(PayloadTooLarge):
+        queue.submit(readings(101))
+    assert queue.stats()["queued_rows"] == 0
+    assert queue.submit(readings(100)).result(timeout=5) == 100
+    queue.stop()
+
+
+def test_a_bad_request_fails_alone_in_its_coalesced_batch():
+    db = RecordingDB()
+    queue = IngestQueue(db, batch_rows=1000, flush_seconds=0.2)
+    good = queue.submit(readings(10))
+    bad = queue.submit(readings(5).assign(station_id="BAD"))
+    other = queue.submit(readings(10, "2025-03-02"))
+    assert good.result(timeout=5) == 10 and other.result(timeout=5) == 10
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    assert db.batches == [10, 10]
+    queue.stop()
+    assert queue.stats()["queued_rows"] == 0
@@ -0,0 +1,260 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.core.refresh import LiveRefreshService
+from app.db.duck_db_utils import WeatherDB
+from ingestion.fetcher import OpenWeatherFetcher
+from ingestion.ingest_openweather import ingest_cities
+
+COORDS = {"Dublin": (53.33, -6.25), "Galway": (53.27, -9.05)}
+
+
+def _current(city):
+    lat, lon = COORDS.get(city, (0.0, 0.0))
+    return {
+        "dt": 1742040000,
+        "coord": {"lat": lat, "lon": lon},
+        "main": {"temp": 11.5, "humidity": 80},
+        "wind": {"speed": 4.1},
+        "weather": [{"description": "light rain"}],
+    }
+
+
+def _forecast(city):
+    lat, lon = COORDS.get(city, (0.0, 0.0))
+    return {
+        "city": {"coord": {"lat": lat, "lon": lon}},
+        "list": [
+            {
+                "dt": 1742050800 + i * 10800,
+                "main": {"temp": 10.0 + i, "humidity": 70},
+                "wind": {"speed": 3.0},
+                "weather": [{"description": "overcast"}],
+            }
+            for i in range(3)
+        ],
+    }
+
+
+class StubOpenWeather(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the OpenWeather API. Every city answers its first
+    forecast request with a 429 so retries are exercised.
+    """
+
+    delay = 0.0
+    hits = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        city = parse_qs(url.query)["q"][0]
+        endpoint = url.path.rsplit("/", 1)[-1]
+        with self.lock:
+            key = (endpoint, city)
+            self.hits[key] = self.hits.get(key, 0) + 1
+            first = self.hits[key] == 1
+
+        time.sleep(self.delay)
+        if endpoint == "forecast" and first:
+            self._send(429, {"message": "slow down"}, {"Retry-After": "0"})
+        elif endpoint == "forecast":
+            self._send(200, _forecast(city))
+        elif endpoint == "weather":
+            self._send(200, _current(city))
+        else:
+            self._send(404, {"message": "not found"})
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubOpenWeather.hits = {}
+    StubOpenWeather.delay = 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenWeather)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/data/2.5"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db():
+    db = WeatherDB(":memory:")
+    db._create_table_if_not_exists("weather")
+    return db
+
+
+def test_fetch_all_retries_429(stub_server):
+    fetcher = OpenWeatherFetcher("key", base_url=stub_server, backoff_factor=0)
+    payloads = fetcher.fetch_all(["Dublin", "Galway"])
+
+    for city, payload in zip(("Dublin", "Galway"), payloads):
+        assert payload["weather"]["main"]["temp"] == 11.5
+        assert len(payload["forecast"]["list"]) == 3
+        assert StubOpenWeather.hits[("forecast", city)] == 2
+
+
+def test_fetch_all_keeps_same_name_cities_apart(stub_server):
+    fetcher = OpenWeatherFetcher("key", base_url=stub_server, backoff_factor=0)
+    # e.g. Dublin, Ireland and Dublin, Ohio
+    payloads = fetcher.fetch_all(["Dublin", "Galway", "Dublin"], ("weather",))
+
+    assert len(payloads) == 3
+    lats = [p["weather"]["coord"]["lat"] for p in payloads]
+    assert lats == [COORDS["Dublin"][0], COORDS["Galway"][0], COORDS["Dublin"][0]]
+
+
+def test_fetch_all_runs_cities_concurrently(stub_server):
+    StubOpenWeather.delay = 0.2
+    cities = [f"City{i}" for i in range(10)]
+    fetcher = OpenWeatherFetcher(
+        "key", base_url=stub_server, max_concurrency=20, backoff_factor=0
+    )
+
+    start = time.perf_counter()
+    payloads = fetcher.fetch_all(cities, endpoints=("weather",))
+    elapsed = time.perf_counter() - start
+
+    assert all(not isinstance(p["weather"], Exception) for p in payloads)
+    # Sequential fetching would take 10 x 0.2s
+    assert elapsed < 1.5
+
+
+def test_fetch_gives_up_after_max_retries(stub_server):
+    fetcher = OpenWeatherFetcher(
+        "key", base_url=stub_server, max_retries=0, backoff_factor=0
+    )
+    with pytest.raises(Exception):
+        fetcher.fetch("forecast", "Dublin")
+
+
+def test_ingest_cities_writes_both_endpoints(stub_server, db):
+    fetcher = OpenWeatherFetcher("key", base_url=stub_server, backoff_factor=0)
+    cities = [
+        {"city": "Dublin", "country": "Ireland"},
+        {"city": "Galway", "country": "Ireland"},
+    ]
+    errors = ingest_cities(cities, db, fetcher)
+
+    assert errors == {}
+    counts = dict(
+        db.con.execute(
+            "SELECT station_id, COUNT(*) FROM weather "
+            "JOIN stations USING (station_key) GROUP BY station_id"
+        ).fetchall()
+    )
+    assert counts == {"DUBLIN_53.33_-6.25": 4, "GALWAY_53.27_-9.05": 4}
+
+
+def test_ingest_cities_counts_unchanged_rows_as_skipped(stub_server, db):
+    from app.core.metrics import INGEST_ROWS
+
+    fetcher = OpenWeatherFetcher("key", base_url=stub_server, backoff_factor=0)
+    cities = [{"city": "Galway", "country": "Ireland"}]
+    labels = dict(source="openweather", city="Galway")
+    inserted = INGEST_ROWS.value(outcome="inserted", **labels)
+    skipped = INGEST_ROWS.value(outcome="skipped", **labels)
+
+    ingest_cities(cities, db, fetcher)
+    ingest_cities(cities, db, fetcher)
+
+    assert INGEST_ROWS.value(outcome="inserted", **labels) == inserted + 4
+    assert INGEST_ROWS.value(outcome="skipped", **labels) == skipped + 4
+
+
+def test_token_bucket_spaces_calls_to_the_budget():
+    from ingestion.fetcher import TokenBucket
+
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 2.0
+    assert bucket.reserve() == 0.0
+
+    free = TokenBucket.for_plan("free")
+    # 1M calls a month sustained, no minute over 60 calls
+    assert free.rate * 30 * 24 * 3600 == pytest.approx(1_000_000)
+    assert free.capacity + free.rate * 60 <= 60
+
+
+def test_fetch_paths_share_one_rate_budget(db, tmp_path):
+    from ingestion.scheduler import IngestScheduler
+
+    cities = [{"city": "Dublin", "country": "Ireland"}]
+    manual = LiveRefreshService(db, cities).fetcher.rate_limiter
+    scheduled = IngestScheduler(db, cities, cache_dir=str(tmp_path)).fetcher
+
+    assert manual is not None
+    assert manual is scheduled.rate_limiter
+
+
+def test_backoff_caps_retry_after():
+    import httpx
+
+    fetcher = OpenWeatherFetcher("key", max_backoff=30)
+    response = httpx.Response(429, headers={"Retry-After": "3600"})
+    assert fetcher._backoff(0, response) == 30
+    assert fetcher._backoff(20) <= 30
+
+
+def test_scheduler_polls_on_cadence_and_skips_unchanged(stub_server, db, tmp_path):
+    from ingestion.scheduler import IngestScheduler
+
+    now = [1000.0]
+    cities = [
+        {"city": "Dublin", "country": "Ireland"},
+        {"city": "Galway", "country": "Ireland"},
+    ]
+
+    refresher = LiveRefreshService(db, cities)
+
+    def scheduler():
+        return IngestScheduler(
+            db,
+            cities,
+            cadences={"weather": 600, "forecast": 10800},
+            fetcher=OpenWeatherFetcher("key", base_url=stub_server, backoff_factor=0),
+            cache_dir=str(tmp_path),
+            jitter=0,
+            clock=lambda: now[0],
+            refresher=refresher,
+        )
+
+    first = scheduler()
+    summary = first.run_once()
+    assert summary == {
+        "fetched": 4, "changed": 4, "unchanged": 0, "failed": 0, "rows": 8
+    }
+    assert (tmp_path / "weather" / "dublin.json").exists()
+    # The API's freshness headers follow the scheduled polls
+    assert refresher.status()["stale"] is False
+    assert first.run_once()["fetched"] == 0
+
+    # Only current weather is due again, and its `dt` has not moved
+    now[0] += 600
+    assert first.run_once() == {
+        "fetched": 2, "changed": 0, "unchanged": 2, "failed": 0, "rows": 0
+    }
+    assert StubOpenWeather.hits[("forecast", "Dublin")] == 2
+
+    # A restarted daemon remembers what it already wrote
+    assert scheduler().run_once()["unchanged"] == 4
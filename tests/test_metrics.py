@@ -0,0 +1,63 @@
+from app.core.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = Counter("requests_total", "Requests.", ["route"], registry=registry)
+    latency = Histogram(
+        "latency_seconds", "Latency.", ["route"], buckets=(0.1, 1.0),
+        registry=registry,
+    )
+    entries = Gauge("entries", "Entries.", registry=registry)
+    entries.set_function(lambda: 7)
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    latency.observe(0.05, route="/x")
+    latency.observe(0.5, route="/x")
+    latency.observe(5, route="/x")
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a\\"b"} 3' in text
+    assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/x",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{route="/x",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/x"} 3' in text
+    assert "entries 7" in text
+
+
+def test_wrong_labels_raise():
+    import pytest
+
+    counter = Counter("c_total", "C.", ["city"], registry=Registry())
+    with pytest.raises(ValueError):
+        counter.inc(town="Dublin")
+
+
+def test_csv_ingest_counts_rows_per_city(tmp_path):
+    from app.core.metrics import INGEST_ROWS
+    from app.db.duck_db_utils import WeatherDB
+
+    csv = tmp_path / "weather.csv"
+    csv.write_text(
+        "station_id,city,country,Datetime,Temperature,Humidity,WindSpeed,WeatherDescription\n"
+        "M1,Metricville,Ireland,2025-03-01 00:00:00,9.0,74,4.3,sunny\n"
+        "M1,Metricville,Ireland,2025-03-01 01:00:00,9.5,75,4.1,fog\n"
+        "M1,Metricville,Ireland,soon,9.5,75,4.1,fog\n"
+        "M2,Countham,Ireland,2025-03-01 00:00:00,8.0,70,3.0,clear\n"
+    )
+
+    def counts(city):
+        return [
+            INGEST_ROWS.value(source="csv", city=city, outcome=outcome)
+            for outcome in ("inserted", "skipped")
+        ]
+
+    before = {city: counts(city) for city in ("Metricville", "Countham")}
+    db = WeatherDB(":memory:")
+    db.insert_csv(str(csv))
+    db.insert_csv(str(csv))
+
+    for city, expected in (("Metricville", [2, 4]), ("Countham", [1, 1])):
+        assert [a - b for a, b in zip(counts(city), before[city])] == expected
@@ -0,0 +1,80 @@
+from datetime import date
+
+from app.db.duck_db_utils import WeatherDB
+from app.db.slow_queries import SlowQueryLog, normalize_query
+
+
+def test_normalize_query_folds_literals_and_in_lists():
+    shape, params = normalize_query(
+        "SELECT avg(Temperature) FROM weather\n"
+        "WHERE Datetime BETWEEN '2025-03-01' AND '2025-03-07'"
+        " AND station_id IN ('A', 'B', 'C') AND Humidity > 40"
+    )
+    assert shape == (
+        "SELECT avg(Temperature) FROM weather WHERE Datetime BETWEEN ? AND ?"
+        " AND station_id IN (?, ...) AND Humidity > ?"
+    )
+    assert params == ["2025-03-01", "2025-03-07", "A", "B", "C", "40"]
+
+
+def test_slow_queries_keep_profiles_and_rank_shapes():
+    log = SlowQueryLog(threshold_ms=0, size=5, background=False)
+    db = WeatherDB(":memory:", slow_queries=log)
+    db._create_table_if_not_exists("weather")
+
+    for day in (1, 2, 3):
+        db.get_metric_stats(
+            "Temperature", "avg", start_date=date(2025, 3, day),
+            end_date=date(2025, 3, day + 1), use_rollups=False,
+        )
+    db.get_sensor_details()
+
+    top = log.top(10)
+    stats = [q for q in top if q["kind"] == "stat"]
+    assert len(stats) == 1 and stats[0]["count"] == 3
+    assert {q["kind"] for q in top} == {"stat", "sensor"}
+    assert all(e["profile"] is not None for e in log.entries())
+
+    # Older entries fall out of the ring buffer
+    for _ in range(5):
+        db.get_sensor_details()
+    assert len(log.entries()) == 5
+    assert {q["kind"] for q in log.top(10)} == {"sensor"}
+
+
+def test_slow_queries_profile_with_bound_filters():
+    log = SlowQueryLog(threshold_ms=0, background=False)
+    db = WeatherDB(":memory:", slow_queries=log)
+    db._create_table_if_not_exists("weather")
+    db.get_metric_stats("Temperature", "avg", station_ids=["O'BRIEN_1"], city="Cork")
+
+    (entry,) = log.entries()
+    assert "O'BRIEN_1" not in entry["shape"]
+    assert entry["bound"] == {"station_ids": ["O'BRIEN_1"], "city": "Cork"}
+    assert entry["profile"] is not None and "profile_error" not in entry
+
+
+def test_streamed_queries_are_timed_until_consumed():
+    log = SlowQueryLog(threshold_ms=0, background=False)
+    db = WeatherDB(":memory:", slow_queries=log)
+    db._create_table_if_not_exists("weather")
+
+    stream = db.get_metric_stats("Temperature", "avg", stream=True)
+    assert log.entries() == []
+    stream.read_all()
+    (entry,) = log.entries()
+    assert entry["kind"] == "stat" and entry["profile"] is not None
+
+    # Abandoned streams are logged when closed, and only once
+    stream = db.get_sensor_details(stream=True)
+    stream.close()
+    stream.close()
+    assert [e["kind"] for e in log.entries()] == ["stat", "sensor"]
+
+
+def test_fast_queries_are_not_logged():
+    log = SlowQueryLog(threshold_ms=60_000, background=False)
+    db = WeatherDB(":memory:", slow_queries=log)
+    db._create_table_if_not_exists("weather")
+    db.get_sensor_details()
+    assert log.entries() == []
@@ -0,0 +1,90 @@
+import time
+
+import duckdb
+import pandas as pd
+import pytest
+
+from app.core.snapshots import SnapshotFollower, SnapshotPublisher
+from app.db.duck_db_utils import WeatherDB
+from app.db.snapshots import current_snapshot, wait_for_snapshot
+
+
+def _readings(station_id, start, n):
+    return pd.DataFrame({
+        "station_id": station_id,
+        "city": "Dublin",
+        "country": "Ireland",
+        "Datetime": pd.date_range(start, periods=n, freq="h"),
+        "Temperature": 10.0,
+        "Humidity": 70,
+        "WindSpeed": 4.0,
+        "WeatherDescription": "clear",
+    })
+
+
+def test_readers_follow_published_snapshots(tmp_path):
+    snapshots = tmp_path / "snapshots"
+    writer = WeatherDB(str(tmp_path / "weather.db"))
+    writer.upsert_metrics(_readings("DUB1", "2025-03-01", 48))
+    publisher = SnapshotPublisher(writer, snapshots)
+    publisher.publish()
+
+    reader = WeatherDB(wait_for_snapshot(snapshots, 1)["path"], read_only=True)
+    follower = SnapshotFollower(reader, snapshots, grace_seconds=0)
+    assert list(reader.get_sensor_details()["station_id"]) == ["DUB1"]
+    assert not follower.check()
+    with pytest.raises(duckdb.Error):
+        reader.upsert_metrics(_readings("DUB2", "2025-03-01", 1))
+
+    # A window materialized by the writer is refreshed before publishing
+    writer.refresh_rolling("24h")
+    writer.upsert_metrics(_readings("DUB2", "2025-03-01", 48))
+    writer.upsert_metrics(_readings("DUB1", "2025-03-03", 2))
+    publisher.publish()
+    assert follower.check()
+    assert list(reader.get_sensor_details()["station_id"]) == ["DUB1", "DUB2"]
+
+    args = ("Temperature", "24h", "2025-03-01", "2025-03-04")
+    pd.testing.assert_frame_equal(
+        reader.get_metric_rolling(*args, incremental=True),
+        writer.get_metric_rolling(*args),
+    )
+    stats = reader.get_metric_stats("Temperature", "count", "2025-03-01", "2025-03-04")
+    assert list(stats["count_Temperature"]) == [50, 48]
+
+    for _ in range(4):
+        writer.upsert_metrics(_readings("DUB3", "2025-03-01", 1))
+        publisher.publish()
+    assert len(list(snapshots.glob("*.db"))) == 3
+    assert current_snapshot(snapshots)["path"] == str(publisher.last_published)
+
+
+def test_replaced_snapshot_stays_open_for_running_streams(tmp_path):
+    snapshots = tmp_path / "snapshots"
+    writer = WeatherDB(str(tmp_path / "weather.db"))
+    writer.upsert_metrics(_readings("DUB1", "2025-03-01", 48))
+    publisher = SnapshotPublisher(writer, snapshots, interval_seconds=0.01)
+    publisher.publish()
+    assert publisher.next_interval() >= 4 * publisher.last_duration > 0
+
+    reader = WeatherDB(wait_for_snapshot(snapshots, 1)["path"], read_only=True)
+    follower = SnapshotFollower(reader, snapshots, grace_seconds=0)
+    old = reader.connections
+    stream = reader.get_sensor_details(stream=True)
+
+    writer.upsert_metrics(_readings("DUB2", "2025-03-01", 1))
+    publisher.publish()
+    assert follower.check()
+    deadline = time.monotonic() + 5
+    while not old._retired and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Retired, but the response still reading it keeps it open
+    assert old.open_streams == 1 and not old._closed
+    assert stream.read_all().column("station_id").to_pylist() == ["DUB1"]
+    assert old._closed
+    assert list(reader.get_sensor_details()["station_id"]) == ["DUB1", "DUB2"]
+
+    # A publish asked for while one is running is skipped
+    with publisher._publishing:
+        assert publisher.publish() is None
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from datetime import date
+
+from app.db.duck_db_utils import WeatherDB
+from app.db.spatial import StationGrid, haversine_km
+
+
+@pytest.fixture(scope="module")
+def stations():
+    rng = np.random.default_rng(3)
+    n = 5000
+    lats = rng.uniform(-80, 80, n)
+    lons = rng.uniform(-180, 180, n)
+    lats[:5] = np.nan  # stations without coordinates never match
+    return np.arange(n), lats, lons
+
+
+def test_radius_matches_brute_force(stations):
+    keys, lats, lons = stations
+    grid = StationGrid(keys, lats, lons)
+    assert len(grid) == len(keys) - 5
+    for lat, lon, radius in [(53.3, -6.2, 800), (10, 179.5, 1500), (-75, 0, 2000)]:
+        distance = haversine_km(lat, lon, lats, lons)
+        expected = keys[distance <= radius]
+        found = grid.within_radius(lat, lon, radius)
+        assert sorted(found) == sorted(expected.tolist())
+        assert list(np.diff(haversine_km(lat, lon, lats[found], lons[found])) >= 0) \
+            == [True] * (len(found) - 1)
+
+
+def test_bbox_matches_brute_force_and_crosses_antimeridian(stations):
+    keys, lats, lons = stations
+    grid = StationGrid(keys, lats, lons, cell_deg=1.0)
+    for south, west, north, east in [(50, -10, 56, -5), (-20, 170, 20, -170)]:
+        inside = (lats >= south) & (lats <= north)
+        if west > east:
+            inside &= (lons >= west) | (lons <= east)
+        else:
+            inside &= (lons >= west) & (lons <= east)
+        assert grid.within_bbox(south, west, north, east) == keys[inside].tolist()
+
+
+def _reading(station_id, city):
+    return {
+        "station_id": station_id, "city": city, "country": "Ireland",
+        "Datetime": "2025-03-01 12:00:00", "Temperature": 10.0,
+        "Humidity": 60, "WindSpeed": 5.0, "WeatherDescription": "clear",
+    }
+
+
+def test_queries_select_stations_by_area():
+    db = WeatherDB(":memory:")
+    db.upsert_metrics([
+        _reading("DUBLIN_53.33_-6.25", "Dublin"),
+        _reading("HOWTH_53.38_-6.07", "Dublin"),
+        _reading("GALWAY_53.27_-9.05", "Galway"),
+    ])
+    near_dublin = (53.35, -6.26, 25)
+    df = db.get_sensor_details(near=near_dublin)
+    assert list(df["station_id"]) == ["DUBLIN_53.33_-6.25", "HOWTH_53.38_-6.07"]
+
+    df = db.get_metric_stats(
+        "Temperature", "avg", start_date=date(2025, 3, 1), end_date=date(2025, 3, 2),
+        bbox=(53.0, -10.0, 53.5, -6.2),
+    )
+    assert list(df["station_id"]) == ["DUBLIN_53.33_-6.25", "GALWAY_53.27_-9.05"]
+    assert db.get_sensor_details(near=(0, 0, 10)).empty
+
+    # Stations registered later are picked up by the index
+    db.upsert_metrics([_reading("SWORDS_53.46_-6.22", "Dublin")])
+    assert len(db.get_sensor_details(near=near_dublin)) == 3
+    db.update_stations([{"station_id": "HOWTH_53.38_-6.07", "lat": 60.0}])
+    assert len(db.get_sensor_details(near=near_dublin)) == 2
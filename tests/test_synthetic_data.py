@@ -0,0 +1,50 @@
+import pandas as pd
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from app.db.duck_db_utils import WeatherDB
+from data.generate_synthetic_weather import generate_synthetic_weather_data
+
+
+def test_generated_csv_is_reproducible_and_ingestible(tmp_path):
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    for path in (first, second):
+        generate_synthetic_weather_data(
+            "2025-01-01", "2025-01-10", str(path), stations=25, seed=11,
+            chunk_rows=1000,
+        )
+    assert first.read_bytes() == second.read_bytes()
+
+    db = WeatherDB(":memory:")
+    assert db.insert_csv(str(first)) == 25 * (9 * 24 + 1)
+    stats = db.get_metric_stats(
+        ["Temperature", "Humidity", "WindSpeed"], ["min", "max"],
+        start_date="2025-01-01", end_date="2025-01-10",
+    )
+    assert len(stats) == 25
+    assert stats["min_Humidity"].min() >= 30 and stats["max_Humidity"].max() <= 100
+    assert stats["min_WindSpeed"].min() >= 0
+
+
+def test_generated_parquet_uses_archive_partitions(tmp_path):
+    out = tmp_path / "dataset"
+    generate_synthetic_weather_data(
+        "2024-12-30", "2025-01-02", str(out), stations=3, freq="30min", seed=5,
+        output_format="parquet",
+    )
+    assert sorted(p.name for p in out.iterdir()) == ["year=2024", "year=2025"]
+    table = pq.read_table(out)
+    assert table.num_rows == 3 * (3 * 48 + 1)
+
+
+def test_generator_handles_coarse_and_calendar_frequencies(tmp_path):
+    # Steps longer than a day and calendar offsets have no whole-day chunking
+    for freq in ("2D", "W", "MS"):
+        out = tmp_path / f"{freq}.csv"
+        generate_synthetic_weather_data(
+            "2025-01-01", "2025-03-10", str(out), stations=2, freq=freq, seed=3,
+            chunk_rows=4,
+        )
+        expected = pd.date_range("2025-01-01", "2025-03-10", freq=freq)
+        table = pa_csv.read_csv(out)
+        assert table.num_rows == 2 * len(expected)